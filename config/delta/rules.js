@@ -211,6 +211,44 @@ export default [
       ignoreFromSelf: true
     }
   },
+  // Incremental unification of LDES datasets (INCREMENTAL_LDES_UNIFICATION: "true" on content-unification
+  // and vocab-fetch). LDES members carry the timestamp the watermark of their dataset is read from
+  // (dct:modified or dct:date, see vocab-fetch), changesets with these are forwarded and content-unification
+  // picks out the changes in LDES dataset graphs. It ignores them while the mode is disabled.
+  {
+    match: {
+      predicate: {
+        type: 'uri',
+        value: 'http://purl.org/dc/terms/modified'
+      }
+    },
+    callback: {
+      url: 'http://content-unification/ldes-delta',
+      method: 'POST'
+    },
+    options: {
+      resourceFormat: 'v0.0.1',
+      gracePeriod: 5000,
+      ignoreFromSelf: true
+    }
+  },
+  {
+    match: {
+      predicate: {
+        type: 'uri',
+        value: 'http://purl.org/dc/terms/date'
+      }
+    },
+    callback: {
+      url: 'http://content-unification/ldes-delta',
+      method: 'POST'
+    },
+    options: {
+      resourceFormat: 'v0.0.1',
+      gracePeriod: 5000,
+      ignoreFromSelf: true
+    }
+  },
   {
     match: {
       predicate: {
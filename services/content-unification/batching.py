@@ -0,0 +1,68 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from helpers import logger
+
+
+class AdaptiveBatchSize:
+    """
+    Batch size controller for unification.
+    The batch grows as long as a batch (query + update) finishes under the target latency
+    and is halved when the triplestore becomes slower. While batches stay too slow,
+    an exponentially increasing backoff is applied before the next batch.
+    Every batch size and its latency are kept, so they can be recorded with the job.
+    Latencies may be recorded from several threads (e.g. the lanes of a `SparqlWriter`),
+    recording never waits: the backoff is applied by `measure` (or `wait`) in the thread
+    that produces the next batch, so a slow write doesn't stall the other queued writes.
+    """
+
+    def __init__(self, initial, minimum, maximum, target_latency_ms, max_backoff_ms):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = max(minimum, min(initial, maximum))
+        self.target_latency_ms = target_latency_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.backoff_ms = 0
+        self.samples = []  # (batch size, latency in ms)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def measure(self):
+        """ Wait for the current backoff, then time the batch run in the block """
+        self.wait()
+        start = time.time()
+        yield self.size
+        self.record((time.time() - start) * 1000)
+
+    def wait(self):
+        with self.lock:
+            backoff_ms = self.backoff_ms
+        if backoff_ms:
+            time.sleep(backoff_ms / 1000)
+
+    def record(self, latency_ms):
+        with self.lock:
+            self.samples.append((self.size, round(latency_ms)))
+            if latency_ms <= self.target_latency_ms:
+                self.backoff_ms = 0
+                self.size = min(self.maximum, max(self.size + 1, int(self.size * 1.5)))
+                return
+            # backoff starts at the target latency and doubles while the store stays slow
+            self.backoff_ms = min(self.max_backoff_ms, self.backoff_ms * 2 or self.target_latency_ms)
+            self.size = max(self.minimum, self.size // 2)
+            backoff_ms = self.backoff_ms
+        logger.info(f"Batch took {round(latency_ms)} ms, shrinking batch size to {self.size} "
+                    f"and waiting for {backoff_ms} ms before the next batch")
+
+    def summary(self):
+        if not self.samples:
+            return {"batches": 0}
+        latencies = [latency for _, latency in self.samples]
+        return {
+            "batches": len(self.samples),
+            "min_batch_size": min(size for size, _ in self.samples),
+            "max_batch_size": max(size for size, _ in self.samples),
+            "mean_latency_ms": round(sum(latencies) / len(latencies)),
+            "max_latency_ms": max(latencies),
+        }
@@ -23,10 +23,55 @@ STATUS_BUSY = "http://redpencil.data.gift/id/concept/JobStatus/busy"
 STATUS_SCHEDULED = "http://redpencil.data.gift/id/concept/JobStatus/scheduled"
 STATUS_SUCCESS = "http://redpencil.data.gift/id/concept/JobStatus/success"
 STATUS_FAILED = "http://redpencil.data.gift/id/concept/JobStatus/failed"
+# creator of the jobs vocab-fetch schedules to refresh dataset dumps
+SCHEDULED_DUMP_CREATOR = "http://mu.semte.ch/vocabularies/ext/vocab-fetch/scheduled-dump"
 
 RELATIVE_STORAGE_PATH = os.environ.get("MU_APPLICATION_FILE_STORAGE_PATH", "").rstrip("/")
 STORAGE_PATH = f"/share/{RELATIVE_STORAGE_PATH}"
 
-UNIFICATION_BATCH_SIZE = 10
-SLEEP_MS_BETWEEN_QUERIES_UNIFY = int(os.environ.get("SLEEP_MS_BETWEEN_QUERIES_UNIFY", "1000")) # in miliseconds
+UNIFICATION_STATISTICS_URI_PREFIX = "http://my-application.com/unification-statistics/"
 
+# The unification batch size adapts to the triplestore response times,
+# growing while batches stay under the target latency and shrinking (with backoff) otherwise
+UNIFICATION_BATCH_SIZE = int(os.environ.get("UNIFICATION_BATCH_SIZE", "10")) # initial batch size
+UNIFICATION_BATCH_SIZE_MIN = int(os.environ.get("UNIFICATION_BATCH_SIZE_MIN", "5"))
+UNIFICATION_BATCH_SIZE_MAX = int(os.environ.get("UNIFICATION_BATCH_SIZE_MAX", "500"))
+UNIFICATION_TARGET_LATENCY_MS = int(os.environ.get("UNIFICATION_TARGET_LATENCY_MS", "2000")) # in miliseconds
+UNIFICATION_MAX_BACKOFF_MS = int(os.environ.get("UNIFICATION_MAX_BACKOFF_MS", "30000")) # in miliseconds
+
+# "keyset" walks the source subjects in a stable order, "rescan" re-runs the full
+# un-unified scan for every batch (the original behaviour), "diff" reads the expected and
+# existing unified triples once and only writes the difference
+UNIFICATION_MODE = os.environ.get("UNIFICATION_MODE", "keyset")
+
+# Number of tasks of each operation that may run at the same time. Tasks on the same
+# vocabulary never run concurrently, regardless of these limits.
+UNIFICATION_CONCURRENCY = int(os.environ.get("UNIFICATION_CONCURRENCY", "2"))
+FILTER_COUNT_CONCURRENCY = int(os.environ.get("FILTER_COUNT_CONCURRENCY", "2"))
+VOCAB_DELETE_CONCURRENCY = int(os.environ.get("VOCAB_DELETE_CONCURRENCY", "1"))
+VOCAB_DELETE_WAIT_CONCURRENCY = int(os.environ.get("VOCAB_DELETE_WAIT_CONCURRENCY", "4"))
+SCHEDULED_TASKS_PAGE_SIZE = 50
+
+# Scheduled tasks are started by priority class, and by creation date within a class.
+# Interactive tasks (the frontend waits for them) go before everything else.
+PRIORITY_CLASSES = [
+    ("interactive", [FILTER_COUNT_OPERATION]),
+    ("normal", [CONT_UN_OPERATION, VOCAB_DELETE_OPERATION]),
+    ("background", [VOCAB_DELETE_WAIT_OPERATION]),
+]
+
+# Filter counts on graph-based datasets can be run within the request (`inline` form field).
+# When the count takes longer, it is scheduled as a task instead.
+FILTER_COUNT_INLINE_TIMEOUT_S = int(os.environ.get("FILTER_COUNT_INLINE_TIMEOUT_S", "10"))
+
+# Loaded data dumps are kept in temp graphs for reuse while the dump is unchanged.
+# Unused graphs are dropped after the TTL, or when all together exceed the triple limit.
+TEMP_GRAPH_CACHE_MAX_TRIPLES = int(os.environ.get("TEMP_GRAPH_CACHE_MAX_TRIPLES", "5000000"))
+TEMP_GRAPH_CACHE_TTL_S = int(os.environ.get("TEMP_GRAPH_CACHE_TTL_S", "3600"))
+# How often expired temp graphs are looked for, also when the service is idle
+TEMP_GRAPH_CACHE_SWEEP_INTERVAL_S = int(os.environ.get("TEMP_GRAPH_CACHE_SWEEP_INTERVAL_S", "300"))
+
+# Re-unify only the subjects LDES consumers changed, as reported by the delta-notifier,
+# instead of a full unification of the vocabulary after every nightly LDES download.
+INCREMENTAL_LDES_UNIFICATION = os.environ.get("INCREMENTAL_LDES_UNIFICATION", "false").lower() == "true"
+LDES_DELTA_FLUSH_DELAY_S = int(os.environ.get("LDES_DELTA_FLUSH_DELAY_S", "60"))
@@ -11,7 +11,7 @@ PREFIX foaf: <http://xmlns.com/foaf/0.1/>
 PREFIX dct: <http://purl.org/dc/terms/>
 PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
 
-SELECT DISTINCT ?format ?download_url ?data_dump ?creation_date ?dataset_graph
+SELECT DISTINCT ?format ?download_url ?data_dump ?creation_date ?staging_graph ?dataset_graph
 WHERE {
     GRAPH $graph {
         $dataset
@@ -24,6 +24,7 @@ WHERE {
         OPTIONAL {
             $dataset void:dataDump ?data_dump .
             ?data_dump dct:created ?creation_date .
+            OPTIONAL { ?data_dump ext:stagingGraph ?staging_graph . }
         }
         OPTIONAL {
             $dataset ext:datasetGraph ?dataset_graph .
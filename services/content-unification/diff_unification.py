@@ -0,0 +1,217 @@
+from string import Template
+
+from more_itertools import batched
+from rdflib.graph import Graph
+from rdflib.namespace import RDF
+from rdflib.term import URIRef
+
+from escape_helpers import sparql_escape_uri, sparql_escape_string
+from helpers import logger
+from sudo_query import query_sudo, auth_update_sudo as update_sudo
+from sparql_util import json_to_term, BATCH_SIZE
+from sparql_writer import SparqlWriter
+from unification import get_source_values_page, source_subjects_values, unified_subject_uri, delete_subjects
+
+PROV_WAS_DERIVED_FROM = URIRef("http://www.w3.org/ns/prov#wasDerivedFrom")
+DCT_SOURCE = URIRef("http://purl.org/dc/terms/source")
+
+# Set-based unification: instead of running a delete loop and an insert loop per property path,
+# the expected unified triples of a vocabulary are read once from the sources (per property path)
+# and the existing unified triples once from the target graph. The difference is computed locally
+# and only the delta is written. Re-unifying an unchanged vocabulary thus costs two streaming reads
+# and no writes.
+# Note that both sides are held in memory for the duration of the diff.
+
+# Size of the VALUES block restricting a diff to changed source subjects
+SOURCE_SUBJECTS_PER_DIFF = 200
+
+def get_unified_triples_page(source_datasets,
+                             dest_classes,
+                             dest_predicates,
+                             target_graph,
+                             after_subject,
+                             batch_size,
+                             source_subjects=None):
+    # Only the triples written by unification are returned (e.g. mu:uuid is left out),
+    # so that the diff never touches triples other services added to the unified subjects.
+    query_template = Template("""
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX prov: <http://www.w3.org/ns/prov#>
+
+SELECT DISTINCT ?s ?p ?o
+WHERE {
+    {
+        SELECT DISTINCT ?s
+        WHERE {
+            VALUES ?sourceDataset {
+                $source_datasets
+            }
+            GRAPH $target_graph {
+                ?s prov:wasDerivedFrom ?sourceSubject ;
+                    dct:source ?sourceDataset .
+            }
+            $source_subjects_values
+            $after_subject_filter
+        }
+        ORDER BY STR(?s)
+        LIMIT $batch_size
+    }
+    VALUES ?p {
+        rdf:type prov:wasDerivedFrom dct:source $dest_predicates
+    }
+    GRAPH $target_graph {
+        ?s ?p ?o .
+    }
+    FILTER(?p != rdf:type || ?o IN ($dest_classes))
+}
+ORDER BY STR(?s)
+""")
+    if after_subject:
+        after_subject_filter = f"FILTER(STR(?s) > {sparql_escape_string(after_subject)})"
+    else:
+        after_subject_filter = ""
+    query_string = query_template.substitute(
+        source_datasets="\n                ".join([sparql_escape_uri(source_dataset) for source_dataset in source_datasets]),
+        dest_classes=", ".join([sparql_escape_uri(dest_class) for dest_class in dest_classes]),
+        dest_predicates=" ".join([sparql_escape_uri(dest_predicate) for dest_predicate in dest_predicates]),
+        target_graph=sparql_escape_uri(target_graph),
+        source_subjects_values=source_subjects_values(source_subjects),
+        after_subject_filter=after_subject_filter,
+        batch_size=batch_size,
+    )
+    return query_string
+
+
+def add_unified_triples(g, vocab_uri, source_datasets, dest_class, dest_predicate, source_subject, source_value):
+    """ Add the triples unification derives from one source subject and value to `g` """
+    internal_subject = URIRef(unified_subject_uri(vocab_uri, source_subject))
+    g.add((internal_subject, PROV_WAS_DERIVED_FROM, URIRef(source_subject)))
+    g.add((internal_subject, RDF.type, dest_class))
+    g.add((internal_subject, dest_predicate, source_value))
+    for source_dataset in source_datasets:
+        g.add((internal_subject, DCT_SOURCE, source_dataset))
+    return internal_subject
+
+
+def read_source_values(path_props, source_graphs, batch_size, source_subjects=None):
+    """ Yield (source subject, source value) pages of a property path, see `get_source_values_page` """
+    last_subject = None
+    while True:
+        # only the query is timed, not the processing of the page by the consumer
+        with batch_size.measure() as size:
+            bindings = query_sudo(get_source_values_page(
+                source_class=path_props["sourceClass"]["value"],
+                source_path_string=path_props["sourcePathString"]["value"],  # !
+                source_filter=path_props.get("sourceFilter", {}).get("value") or '',
+                source_graphs=source_graphs,
+                after_subject=last_subject,
+                batch_size=size,
+                source_subjects=source_subjects,
+            ))["results"]["bindings"]
+        if bindings:
+            last_subject = bindings[-1]["sourceSubject"]["value"]
+            yield [(b["sourceSubject"]["value"], json_to_term(b["sourceValue"])) for b in bindings]
+        if len(set(b["sourceSubject"]["value"] for b in bindings)) < size:
+            break
+
+
+def read_expected_unification(vocab_uri, source_datasets, prop_paths, source_graphs, batch_size, source_subjects=None):
+    expected = Graph()
+    datasets = [URIRef(source_dataset) for source_dataset in source_datasets]
+    for path_props in prop_paths:
+        dest_class = URIRef(path_props["destClass"]["value"])
+        dest_predicate = URIRef(path_props["destPath"]["value"])
+        for page in read_source_values(path_props, source_graphs, batch_size, source_subjects):
+            for source_subject, source_value in page:
+                add_unified_triples(expected, vocab_uri, datasets, dest_class, dest_predicate,
+                                    source_subject, source_value)
+    return expected
+
+
+def drop_foreign_subjects(existing, vocab_uri):
+    """
+    Remove the subjects another vocabulary unified from the same source datasets from `existing`.
+    Only subjects whose URI is derived from this vocabulary (see `unified_subject_uri`) are ours to diff.
+    """
+    foreign_subjects = set(existing.subjects()) - set(
+        s for (s, source_subject) in existing.subject_objects(PROV_WAS_DERIVED_FROM)
+        if str(s) == unified_subject_uri(vocab_uri, str(source_subject))
+    )
+    for s in foreign_subjects:
+        existing.remove((s, None, None))
+    return existing
+
+
+def read_existing_unification(vocab_uri, source_datasets, prop_paths, target_graph, batch_size, source_subjects=None):
+    existing = Graph()
+    dest_classes = set(path_props["destClass"]["value"] for path_props in prop_paths)
+    dest_predicates = set(path_props["destPath"]["value"] for path_props in prop_paths)
+    last_subject = None
+    while True:
+        with batch_size.measure() as size:
+            bindings = query_sudo(get_unified_triples_page(
+                source_datasets=source_datasets,
+                dest_classes=dest_classes,
+                dest_predicates=dest_predicates,
+                target_graph=target_graph,
+                after_subject=last_subject,
+                batch_size=size,
+                source_subjects=source_subjects,
+            ))["results"]["bindings"]
+        for binding in bindings:
+            existing.add((
+                URIRef(binding["s"]["value"]),
+                URIRef(binding["p"]["value"]),
+                json_to_term(binding["o"])
+            ))
+        if bindings:
+            last_subject = bindings[-1]["s"]["value"]
+        if len(set(binding["s"]["value"] for binding in bindings)) < size:
+            break
+    return drop_foreign_subjects(existing, vocab_uri)
+
+
+def write_unification_diff(expected, existing, target_graph, batch_size=None):
+    to_insert = expected - existing
+    to_delete = existing - expected
+
+    # subjects that are no longer derived from any source are removed completely,
+    # including the triples that were added to them by other services (e.g. mu:uuid)
+    obsolete_subjects = set(existing.subjects()) - set(expected.subjects())
+    for (s, p, o) in list(to_delete):
+        if s in obsolete_subjects:
+            to_delete.remove((s, p, o))
+
+    logger.info(f"Unification diff: {len(to_insert)} triples to insert, {len(to_delete)} to delete, "
+                f"{len(obsolete_subjects)} obsolete subjects")
+
+    obsolete_subjects = sorted(obsolete_subjects)
+    for i in range(0, len(obsolete_subjects), 100):
+        update_sudo(delete_subjects(obsolete_subjects[i:i + 100], target_graph))
+    # deleted and inserted triples are disjoint, so their batches can be written in any order
+    with SparqlWriter(update_sudo, latency=batch_size) as writer:
+        writer.write(batched(to_delete, BATCH_SIZE), target_graph, "DELETE")
+        writer.write(batched(to_insert, BATCH_SIZE), target_graph, "INSERT")
+
+
+def run_diff_unification(vocab_uri, source_datasets, prop_paths, source_graphs, target_graph, batch_size,
+                         source_subjects=None):
+    """
+    Unify the vocabulary by writing the difference between the expected and existing unified triples.
+    With `source_subjects`, only the unification of those source subjects is updated, a few
+    subjects at a time (see `SOURCE_SUBJECTS_PER_DIFF`).
+    """
+    if source_subjects is not None:
+        for subjects in batched(sorted(source_subjects), SOURCE_SUBJECTS_PER_DIFF):
+            logger.info(f"Unifying {len(subjects)} changed source subjects for {vocab_uri}")
+            expected = read_expected_unification(vocab_uri, source_datasets, prop_paths, source_graphs,
+                                                 batch_size, subjects)
+            existing = read_existing_unification(vocab_uri, source_datasets, prop_paths, target_graph, batch_size, subjects)
+            write_unification_diff(expected, existing, target_graph, batch_size)
+        return
+    expected = read_expected_unification(vocab_uri, source_datasets, prop_paths, source_graphs, batch_size)
+    logger.info(f"Read {len(expected)} expected unified triples for {vocab_uri}")
+    existing = read_existing_unification(vocab_uri, source_datasets, prop_paths, target_graph, batch_size)
+    logger.info(f"Read {len(existing)} existing unified triples for {vocab_uri}")
+    write_unification_diff(expected, existing, target_graph, batch_size)
@@ -0,0 +1,80 @@
+import threading
+from collections import defaultdict
+from string import Template
+
+from escape_helpers import sparql_escape_uri
+from helpers import logger
+
+
+def get_graph_vocabularies(graphs, graph):
+    """ The vocabularies with an LDES dataset stored in one of `graphs` """
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+SELECT DISTINCT ?datasetGraph ?vocab WHERE {
+    VALUES ?datasetGraph { $graphs }
+    GRAPH $graph {
+        ?dataset ext:datasetGraph ?datasetGraph .
+        ?vocab ext:sourceDataset ?dataset .
+    }
+}""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        graphs=" ".join(sparql_escape_uri(g) for g in graphs),
+    )
+
+
+def changed_subjects_by_graph(changesets):
+    """ The IRI subjects of the inserted and deleted triples of delta-notifier changesets, per graph """
+    subjects = defaultdict(set)
+    for changeset in changesets:
+        for triple in changeset.get("inserts", []) + changeset.get("deletes", []):
+            if "graph" in triple and triple["subject"]["type"] == "uri":
+                subjects[triple["graph"]["value"]].add(triple["subject"]["value"])
+    return subjects
+
+
+class LdesDeltaBuffer:
+    """
+    Source subjects changed by LDES consumers, per vocabulary, waiting to be re-unified.
+    Changes are collected for `flush_delay_s` after the first one comes in, and are then
+    handed to `flush(vocab, subjects)`. When it returns False (e.g. the vocabulary is being
+    unified), the subjects are buffered again for the next flush.
+    """
+
+    def __init__(self, flush_delay_s, flush):
+        self.flush_delay_s = flush_delay_s
+        self.flush = flush
+        self.subjects = defaultdict(set)  # vocabulary -> changed source subjects
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def add(self, vocab, subjects):
+        with self.lock:
+            self.subjects[vocab].update(subjects)
+            if not self.timer:
+                self.timer = threading.Timer(self.flush_delay_s, self.run_flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def run_flush(self):
+        with self.lock:
+            pending = self.subjects
+            self.subjects = defaultdict(set)
+            self.timer = None
+        for vocab, subjects in pending.items():
+            try:
+                flushed = self.flush(vocab, subjects)
+            except Exception as e:
+                # there's no full unification to fall back on in this mode, retry with the next flush
+                logger.error(f"Incremental unification of {len(subjects)} subjects for <{vocab}> failed, "
+                             f"keeping them for the next flush: {e}")
+                self.add(vocab, subjects)
+                continue
+            if not flushed:
+                logger.info(f"<{vocab}> is busy, keeping {len(subjects)} changed subjects for the next flush")
+                self.add(vocab, subjects)
+
+    def pending(self):
+        with self.lock:
+            return {vocab: len(subjects) for vocab, subjects in self.subjects.items()}
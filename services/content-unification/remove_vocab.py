@@ -84,6 +84,7 @@ PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
 
 def run_vocab_delete_operation(vocab_uri):
     remove_files(vocab_uri, VOCAB_GRAPH)
+    remove_staging_graphs(vocab_uri, VOCAB_GRAPH)
     update_sudo(remove_vocab_data_dumps(vocab_uri, VOCAB_GRAPH))
 
     # concepts may return too many results in mu-auth internal construct. Batch it here.
@@ -99,6 +100,7 @@ def run_vocab_delete_operation(vocab_uri):
     # todo: these job deletions are not yet adjusted to the new Jobs structure (which use data containers)
     update_sudo(remove_vocab_vocab_fetch_jobs(vocab_uri, VOCAB_GRAPH))
     update_sudo(remove_vocab_vocab_unification_jobs(vocab_uri, VOCAB_GRAPH))
+    update_sudo(remove_vocab_unification_statistics(vocab_uri, VOCAB_GRAPH))
     update_sudo(remove_vocab_partitions(vocab_uri, VOCAB_GRAPH))
     update_sudo(remove_vocab_source_datasets(vocab_uri, VOCAB_GRAPH))
     update_sudo(remove_vocab_mapping_shape(vocab_uri, VOCAB_GRAPH))
@@ -121,20 +123,67 @@ PREFIX dct: <http://purl.org/dc/terms/>
 PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
 PREFIX void: <http://rdfs.org/ns/void#>
 
-SELECT ?dataSource WHERE {
+SELECT DISTINCT ?dataSource WHERE {
     $vocab a ext:VocabularyMeta ;
         ext:sourceDataset ?sourceDataset .
     ?sourceDataset void:dataDump ?fileResource .
     ?fileResource ^nie:dataSource ?dataSource .
+    # dumps are stored by content, keep the ones other files still reference
+    $not_referenced_elsewhere
 }
     """)
     query_string = query_template.substitute(
         graph=sparql_escape_uri(graph),
         vocab=sparql_escape_uri(vocab_uri),
+        not_referenced_elsewhere=not_referenced_elsewhere(vocab_uri),
     )
     return query_string
 
 
+def remove_staging_graphs(vocab_uri: str, graph: str):
+    response = query_sudo(find_staging_graphs(vocab_uri, graph))
+    for binding in response['results']['bindings']:
+        drop_graph(binding['stagingGraph']['value'])
+
+
+def find_staging_graphs(vocab_uri: str, graph: str) -> str:
+    # staging graphs are shared by dumps with the same content, keep the ones other datasets still use
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+PREFIX void: <http://rdfs.org/ns/void#>
+
+SELECT DISTINCT ?stagingGraph WHERE {
+    GRAPH $graph {
+        $vocab a ext:VocabularyMeta ;
+            ext:sourceDataset ?sourceDataset .
+        ?sourceDataset void:dataDump ?dataDump .
+        ?dataDump ext:stagingGraph ?stagingGraph .
+        FILTER NOT EXISTS {
+            ?otherDataset void:dataDump ?otherDump .
+            ?otherDump ext:stagingGraph ?stagingGraph .
+            FILTER NOT EXISTS { $vocab ext:sourceDataset ?otherDataset . }
+        }
+    }
+}
+    """)
+    query_string = query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        vocab=sparql_escape_uri(vocab_uri),
+    )
+    return query_string
+
+
+def not_referenced_elsewhere(vocab_uri: str) -> str:
+    """ Filter on ?dataSource not being the data source of a file other than the vocab's dumps """
+    return Template("""FILTER NOT EXISTS {
+        ?dataSource nie:dataSource ?otherFile .
+        FILTER NOT EXISTS {
+            $vocab ext:sourceDataset ?otherDataset .
+            ?otherDataset void:dataDump ?otherFile .
+        }
+    }""").substitute(vocab=sparql_escape_uri(vocab_uri))
+
+
 def select_vocab_concepts_batch(vocab_uri: str, graph: str) -> str:
     query_template = Template("""
 PREFIX dct: <http://purl.org/dc/terms/>
@@ -169,7 +218,8 @@ PREFIX void: <http://rdfs.org/ns/void#>
 WITH $graph
 DELETE {
     ?dataDump ?dataDumpPred ?dataDumpObj .
-    ?dataSource ?dataSourcePred ?dataSourceObj .
+    ?dataSource nie:dataSource ?dataDump .
+    ?unusedDataSource ?dataSourcePred ?dataSourceObj .
     ?sourceDataset void:dataDump ?dataDump .
 }
 WHERE {
@@ -178,12 +228,18 @@ WHERE {
     ?sourceDataset void:dataDump ?dataDump .
     ?dataDump ?dataDumpPred ?dataDumpObj .
     ?dataSource nie:dataSource ?dataDump .
-    ?dataSource ?dataSourcePred ?dataSourceObj .
+    # a physical file shared with dumps of other vocabularies only loses its reference to this dump
+    OPTIONAL {
+        ?dataSource ?dataSourcePred ?dataSourceObj .
+        $not_referenced_elsewhere
+        BIND(?dataSource AS ?unusedDataSource)
+    }
 }
     """)
     query_string = query_template.substitute(
         graph=sparql_escape_uri(graph),
         vocab=sparql_escape_uri(vocab_uri),
+        not_referenced_elsewhere=not_referenced_elsewhere(vocab_uri),
     )
     return query_string
 
@@ -268,6 +324,29 @@ WHERE {
     return query_string
 
 
+def remove_vocab_unification_statistics(vocab_uri: str, graph: str) -> str:
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+PREFIX prov: <http://www.w3.org/ns/prov#>
+
+WITH $graph
+
+DELETE {
+    ?statistics ?statisticsPred ?statisticsObj .
+}
+WHERE {
+    ?statistics a ext:UnificationStatistics ;
+        prov:used $vocab ;
+        ?statisticsPred ?statisticsObj .
+}
+    """)
+    query_string = query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        vocab=sparql_escape_uri(vocab_uri),
+    )
+    return query_string
+
+
 def remove_vocab_meta(vocab_uri: str, graph: str) -> str:
     query_template = Template("""
 PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
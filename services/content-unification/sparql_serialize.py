@@ -0,0 +1,12 @@
+from escape_helpers import sparql_escape_uri
+
+
+def serialize_triples_to_sparql(triples_batches, graph_name: str, operation="INSERT"):
+    """ Turn batches of triples into INSERT/DELETE DATA queries, one query per batch """
+    for triples_batch in triples_batches:
+        # Prefixes are left out on purpose. Since the '.n3()'-method produces ntriples compliant triples,
+        # this yields an ntriples only query, which is significantly faster
+        updatequery = f"\n{operation} DATA {{\n\tGRAPH {sparql_escape_uri(graph_name)} {{\n"
+        updatequery += " .\n".join([f"\t\t{s.n3()} {p.n3()} {o.n3()}" for (s, p, o) in triples_batch])
+        updatequery += " . \n\t }\n}\n"
+        yield updatequery
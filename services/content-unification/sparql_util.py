@@ -5,28 +5,138 @@ from sudo_query import query_sudo, update_sudo as update_virtuoso
 from file import construct_get_file_query, shared_uri_to_path
 
 import os
+import queue
+import threading
+import time
 from string import Template
+import sparql_client
 from more_itertools import batched
 from rdflib.graph import Graph
+from rdflib.store import Store
+from rdflib.util import guess_format
 from rdflib.term import URIRef, Literal
 from constants import MU_APPLICATION_GRAPH
+from sparql_serialize import serialize_triples_to_sparql
+from sparql_writer import SparqlWriter
+import compression
 
 TEMP_GRAPH_BASE = 'http://example-resource.com/graph/'
 BATCH_SIZE = 100
 
+# SPARQL Graph Store HTTP Protocol endpoint of the triplestore (e.g. Virtuoso's /sparql-graph-crud).
+# When configured, dataset dumps are loaded in a single request instead of INSERT DATA batches.
+MU_SPARQL_GRAPH_STORE_ENDPOINT = os.environ.get("MU_SPARQL_GRAPH_STORE_ENDPOINT")
+# seconds to wait for the graph store to answer a load, so a stuck load fails the task
+# instead of holding its worker (and the lock on the vocabulary) forever
+MU_SPARQL_GRAPH_STORE_TIMEOUT_S = int(os.environ.get("MU_SPARQL_GRAPH_STORE_TIMEOUT_S", "3600"))
+# file extension to the content type the graph store accepts. Other formats (e.g. JSON-LD)
+# are converted to N-Triples before loading.
+GRAPH_STORE_CONTENT_TYPES = {
+    "ttl": "text/turtle",
+    "nt": "text/turtle",  # N-Triples is a subset of Turtle
+    "rdf": "application/rdf+xml",
+}
+
 # adapted from https://github.com/RDFLib/rdflib/issues/1704
 def serialize_graph_to_sparql(g, graph_name: str, operation="INSERT"):
     # Note that the Graph triples method yields triples in random order
     # Triples aren't grouped by subject. Current mu-search delta handling
     # isn't affected by this.
-    for triples_batch in batched(g.triples((None, None, None)), BATCH_SIZE):
-        # updatequery = "\n".join([f"PREFIX {prefix}: {ns.n3()}" for prefix, ns in g.namespaces()])
-        # Dropping prefixes boosts performance. Since the '.n3()'-method produces ntriples compliant triples,
-        # dropping the prefixes yields an ntriples only query, which is significantly faster
-        updatequery = f"\n{operation} DATA {{\n\tGRAPH {sparql_escape_uri(graph_name)} {{\n"
-        updatequery += " .\n".join([f"\t\t{s.n3()} {p.n3()} {o.n3()}" for (s, p, o) in triples_batch])
-        updatequery += f" . \n\t }}\n}}\n"
-        yield updatequery
+    return serialize_triples_to_sparql(batched(g.triples((None, None, None)), BATCH_SIZE), graph_name, operation)
+
+class TripleSinkStore(Store):
+    """
+    rdflib store that doesn't keep any triples, but hands every parsed triple to `on_triple`.
+    This allows streaming a file through rdflib's parsers without building a Graph in memory.
+    """
+    context_aware = True  # the JSON-LD parser requires a context aware store
+
+    def __init__(self, on_triple):
+        super().__init__()
+        self.on_triple = on_triple
+        self.__namespaces = {}
+        self.__prefixes = {}
+
+    def add(self, triple, context, quoted=False):
+        self.on_triple(triple)
+
+    def bind(self, prefix, namespace, override=True):
+        self.__namespaces[prefix] = namespace
+        self.__prefixes[namespace] = prefix
+
+    def namespace(self, prefix):
+        return self.__namespaces.get(prefix)
+
+    def prefix(self, namespace):
+        return self.__prefixes.get(namespace)
+
+    def namespaces(self):
+        return iter(self.__namespaces.items())
+
+class ParsingStopped(Exception):
+    pass
+
+def parse_file(g, file):
+    """ Parse a file into `g`, decompressing it while parsing when it's stored compressed """
+    if not compression.compression_of(file):
+        return g.parse(file)
+    with compression.open_compressed(file) as f:
+        return g.parse(source=f, format=guess_format(compression.uncompressed_name(file)) or "turtle")
+
+def stream_file_triples(file, batch_size=BATCH_SIZE, max_pending_batches=4):
+    """
+    Parse a file in a background thread and yield its triples in batches of `batch_size`.
+    At most `max_pending_batches` batches are buffered. Memory use is only bounded by the batch size
+    for the formats rdflib parses incrementally: N-Triples and N-Quads (line by line) and RDF/XML (SAX).
+    Turtle, N3 and JSON-LD documents are read into memory as a whole before the first triple comes out,
+    these take memory in proportion to the file size (though the triples never end up in a Graph).
+    """
+    batches = queue.Queue(maxsize=max_pending_batches)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                batches.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+        raise ParsingStopped()
+
+    def parse():
+        batch = []
+
+        def on_triple(triple):
+            batch.append(triple)
+            if len(batch) >= batch_size:
+                put(batch.copy())
+                batch.clear()
+        try:
+            parse_file(Graph(store=TripleSinkStore(on_triple)), file)
+            if batch:
+                put(batch)
+            put(done)
+        except ParsingStopped:
+            pass
+        except Exception as e:
+            try:
+                put(e)
+            except ParsingStopped:
+                pass
+
+    threading.Thread(target=parse, daemon=True).start()
+    try:
+        while True:
+            item = batches.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # stops the parser thread when the consumer stops early
+        stopped.set()
 
 def json_to_term(json_term):
     if json_term['type'] == 'uri':
@@ -81,11 +191,48 @@ WHERE {
     update_virtuoso(query_string)
     return temp_named_graph
 
+def count_graph_triples(graph):
+    query_string = "SELECT (COUNT(*) AS ?count) WHERE {{ GRAPH {} {{ ?s ?p ?o . }} }}".format(sparql_escape_uri(graph))
+    return int(query_sudo(query_string)["results"]["bindings"][0]["count"]["value"])
+
+def log_load_throughput(file, graph, triples, start):
+    duration = max(time.time() - start, 0.001)
+    logger.info(f"Loaded {triples} triples from {file} into <{graph}> in {round(duration, 1)} s "
+                f"({round(triples / duration)} triples/s)")
+
+def bulk_load_file_to_graph(file, graph):
+    """ Load a file into a graph with a single Graph Store HTTP Protocol request """
+    start = time.time()
+    extension = os.path.splitext(compression.uncompressed_name(file))[1].lstrip(".").lower()
+    content_type = GRAPH_STORE_CONTENT_TYPES.get(extension)
+    params = {"graph-uri": graph}
+    if content_type:
+        # compressed dumps are sent decompressed, in chunks
+        with compression.open_compressed(file) as f:
+            res = sparql_client.get_session().post(MU_SPARQL_GRAPH_STORE_ENDPOINT, params=params,
+                                data=compression.read_chunks(f) if compression.compression_of(file) else f,
+                                headers={"Content-Type": content_type},
+                                timeout=MU_SPARQL_GRAPH_STORE_TIMEOUT_S)
+    else:
+        # converted to N-Triples while parsing, and sent as a chunked request body
+        ntriples = (
+            "".join([f"{s.n3()} {p.n3()} {o.n3()} .\n" for (s, p, o) in triples_batch]).encode("utf-8")
+            for triples_batch in stream_file_triples(file)
+        )
+        res = sparql_client.get_session().post(MU_SPARQL_GRAPH_STORE_ENDPOINT, params=params, data=ntriples,
+                            headers={"Content-Type": "text/turtle"},
+                            timeout=MU_SPARQL_GRAPH_STORE_TIMEOUT_S)
+    res.raise_for_status()
+    log_load_throughput(file, graph, count_graph_triples(graph), start)
+
 def upload_file_to_graph(file, graph):
-    g = Graph()
-    g.parse(file)
-    for query_string in serialize_graph_to_sparql(g, graph):
-        update_virtuoso(query_string)
+    if MU_SPARQL_GRAPH_STORE_ENDPOINT:
+        bulk_load_file_to_graph(file, graph)
+        return
+    start = time.time()
+    with SparqlWriter(update_virtuoso) as writer:
+        writer.write(stream_file_triples(file), graph)
+    log_load_throughput(file, graph, writer.triples, start)
 
 def load_file_to_db(uri: str, metadata_graph: str = MU_APPLICATION_GRAPH, temp_named_graph=None):
     if not temp_named_graph:
@@ -9,6 +9,7 @@ from escape_helpers import (
 )
 from helpers import generate_uuid, logger
 import traceback
+from sparql_retry import RetryBudget, retry_budget, SPARQL_JOB_RETRY_BUDGET
 from constants import (
     MU_APPLICATION_GRAPH,
     STATUS_BUSY,
@@ -16,6 +17,7 @@ from constants import (
     STATUS_SUCCESS,
     STATUS_FAILED,
     CONTAINER_URI_PREFIX,
+    SCHEDULED_DUMP_CREATOR,
 )
 
 
@@ -126,6 +128,10 @@ LIMIT 1
 
 
 def find_actionable_task_of_type(types, graph):
+    return find_actionable_tasks_of_type(types, graph, 1)
+
+
+def find_actionable_tasks_of_type(types, graph, limit):
     query_template = Template("""
 PREFIX mu: <http://mu.semte.ch/vocabularies/core/>
 PREFIX dct: <http://purl.org/dc/terms/>
@@ -146,11 +152,12 @@ SELECT (?task as ?uri) (?uuid as ?id) ?created ?used ?operation WHERE {
     }
 } 
 ORDER BY ASC(?created)
-LIMIT 1
+LIMIT $limit
 """)
     query_string = query_template.substitute(
         graph=sparql_escape_uri(graph) if graph else "?g",
         task_types=" ".join([sparql_escape_uri(uri) for uri in types]),
+        limit=limit,
     )
     return query_string
 
@@ -193,6 +200,73 @@ SELECT (?task as ?uri) (?uuid as ?id) ?created WHERE {
     return query_string
 
 
+def find_source_unchanged_tasks(task_uris, graph):
+    """
+    The tasks of jobs whose download found the dataset unchanged (see vocab-fetch).
+    The retry of a unification that failed is never skipped: the last finished unification
+    of the vocabulary must have succeeded.
+    """
+    query_template = Template("""
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+PREFIX task: <http://redpencil.data.gift/vocabularies/tasks/>
+PREFIX adms: <http://www.w3.org/ns/adms#>
+
+SELECT DISTINCT (?task as ?uri) WHERE {
+    VALUES ?task { $tasks }
+    GRAPH $graph {
+        ?task dct:isPartOf ?job ;
+            task:operation ?operation ;
+            task:inputContainer/ext:content ?vocab .
+        ?job ext:sourceUnchanged "true"^^<http://www.w3.org/2001/XMLSchema#boolean> .
+        ?previous task:operation ?operation ;
+            task:inputContainer/ext:content ?vocab ;
+            adms:status ?previousStatus ;
+            dct:modified ?previousModified .
+        FILTER(?previousStatus IN ($success, $failed))
+        FILTER NOT EXISTS {
+            ?later task:operation ?operation ;
+                task:inputContainer/ext:content ?vocab ;
+                adms:status ?laterStatus ;
+                dct:modified ?laterModified .
+            FILTER(?laterStatus IN ($success, $failed) && ?laterModified > ?previousModified)
+        }
+        FILTER(?previousStatus = $success)
+    }
+}
+""")
+    query_string = query_template.substitute(
+        graph=sparql_escape_uri(graph) if graph else "?g",
+        tasks=" ".join([sparql_escape_uri(task_uri) for task_uri in task_uris]),
+        success=sparql_escape_uri(STATUS_SUCCESS),
+        failed=sparql_escape_uri(STATUS_FAILED),
+    )
+    return query_string
+
+
+def find_incrementally_unified_tasks(task_uris, graph):
+    """ The tasks of jobs vocab-fetch scheduled for an LDES dataset that is unified from deltas """
+    query_template = Template("""
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+SELECT DISTINCT (?task as ?uri) WHERE {
+    VALUES ?task { $tasks }
+    GRAPH $graph {
+        ?task dct:isPartOf ?job .
+        ?job ext:incrementalUnification "true"^^<http://www.w3.org/2001/XMLSchema#boolean> ;
+            dct:creator $scheduled_creator .
+    }
+}
+""")
+    query_string = query_template.substitute(
+        graph=sparql_escape_uri(graph) if graph else "?g",
+        tasks=" ".join([sparql_escape_uri(task_uri) for task_uri in task_uris]),
+        scheduled_creator=sparql_escape_uri(SCHEDULED_DUMP_CREATOR),
+    )
+    return query_string
+
+
 def get_input_contents_task(task_uri, graph):
     query_template = Template("""
 PREFIX task: <http://redpencil.data.gift/vocabularies/tasks/>
@@ -217,8 +291,8 @@ def run_task(task_uri, graph, runner_func, sparql_query, sparql_update):
 
 
 # run the first task in task_uris, but set the status for all the given tasks
-# useful for tasks that are the same
-def run_tasks(task_uris, graph, runner_func, sparql_query, sparql_update, thread=False):
+# useful for tasks that are the same. The runner gets the task inputs and the task uris.
+def run_tasks(task_uris, graph, runner_func, sparql_query, sparql_update, thread=False, on_finished=None):
     import threading
     task_uri = task_uris[0]
     # start_time = time.time()
@@ -240,7 +314,8 @@ def run_tasks(task_uris, graph, runner_func, sparql_query, sparql_update, thread
 
     def thread_runner():
         try:
-            generated = runner_func(used)
+            with retry_budget(RetryBudget(SPARQL_JOB_RETRY_BUDGET)):
+                generated = runner_func(used, task_uris)
             if generated:
                 logger.info(
                     f"Running task <{task_uri}> with source <{used[0]}> generated <{generated[0]}>"
@@ -253,6 +328,9 @@ def run_tasks(task_uris, graph, runner_func, sparql_query, sparql_update, thread
             logger.warn(f"Failed running task {task_uri}")
             logger.warn(traceback.format_exc())
             sparql_update(update_tasks_status(task_uris, STATUS_FAILED, graph))
+        finally:
+            if on_finished:
+                on_finished()
 
     if thread:
         thread = threading.Thread(target=thread_runner)
@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import OrderedDict
+from string import Template
+
+from escape_helpers import sparql_escape_uri
+from helpers import generate_uuid, logger
+from sudo_query import query_sudo, update_sudo
+from sparql_util import load_file_to_db, drop_graph, count_graph_triples
+
+TEMP_GRAPH_CACHE_BASE = "http://example-resource.com/graph/cache/"
+
+
+def register_cached_graph(graph, data_dump, registry_graph):
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+INSERT DATA {
+    GRAPH $registry_graph {
+        $graph a ext:CachedTempGraph ;
+            ext:dataDump $data_dump .
+    }
+}""")
+    return query_template.substitute(
+        registry_graph=sparql_escape_uri(registry_graph),
+        graph=sparql_escape_uri(graph),
+        data_dump=sparql_escape_uri(data_dump),
+    )
+
+
+def unregister_cached_graph(graph, registry_graph):
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+DELETE WHERE {
+    GRAPH $registry_graph {
+        $graph a ext:CachedTempGraph ;
+            ext:dataDump ?dataDump .
+    }
+}""")
+    return query_template.substitute(
+        registry_graph=sparql_escape_uri(registry_graph),
+        graph=sparql_escape_uri(graph),
+    )
+
+
+def get_cached_graphs(registry_graph):
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+SELECT DISTINCT ?graph WHERE {
+    GRAPH $registry_graph {
+        ?graph a ext:CachedTempGraph .
+    }
+}""")
+    return query_template.substitute(
+        registry_graph=sparql_escape_uri(registry_graph),
+    )
+
+
+class CachedGraph:
+    def __init__(self, key, graph, triples):
+        self.key = key
+        self.graph = graph
+        self.triples = triples
+        self.loaded = time.time()
+        self.refs = 0
+
+
+class TempGraphCache:
+    """
+    Temporary graphs holding loaded data dumps, keyed by (data dump, creation date), so that
+    filter counts and unifications on an unchanged dump reuse the same loaded graph.
+    Graphs in use are reference counted and never dropped. Unused graphs are dropped once they
+    are older than `ttl_s`, or least recently used first while all cached graphs together
+    hold more than `max_triples` triples. Graphs are dropped outside of the cache lock.
+    Cached graphs are registered in `registry_graph`, so graphs left behind by a previous run
+    of the service can be dropped.
+    """
+
+    def __init__(self, max_triples, ttl_s, registry_graph, files_graph):
+        self.max_triples = max_triples
+        self.ttl_s = ttl_s
+        self.registry_graph = registry_graph
+        self.files_graph = files_graph
+        self.entries = OrderedDict()  # key -> CachedGraph, least recently used first
+        self.retired = []  # expired or evicted entries that are still in use
+        self.lock = threading.Lock()
+        self.load_locks = {}  # key -> [lock, number of acquires using it], removed once unused
+        self.cleaned_up = False
+
+    def expired(self, entry):
+        return time.time() - entry.loaded > self.ttl_s
+
+    def clean_up_previous_run(self):
+        """ Drop the graphs left by a previous run, once, before this run registers its own graphs """
+        with self.lock:
+            if self.cleaned_up:
+                return
+            self.cleaned_up = True
+            left_behind = [b["graph"]["value"] for b in query_sudo(get_cached_graphs(self.registry_graph))["results"]["bindings"]]
+        for graph in left_behind:
+            logger.info(f"Dropping temp graph <{graph}> left by a previous run")
+            self.drop(graph)
+
+    def sweep(self):
+        """ Drop the graphs that expired while the cache was idle """
+        self.clean_up_previous_run()
+        self.evict()
+
+    def start_sweeping(self, interval_s):
+        """ Sweep every `interval_s` in the background, acquire and release only evict when they're called """
+        def run():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Sweeping the temp graph cache failed: {e}")
+            self.start_sweeping(interval_s)
+        timer = threading.Timer(interval_s, run)
+        timer.daemon = True
+        timer.start()
+
+    def drop(self, graph):
+        drop_graph(graph)
+        update_sudo(unregister_cached_graph(graph, self.registry_graph))
+
+    def acquire(self, data_dump, creation_date):
+        """ Return a graph holding the data dump, to be released with `release` when done """
+        key = (data_dump, creation_date)
+        self.clean_up_previous_run()
+        with self.lock:
+            load_lock = self.load_locks.setdefault(key, [threading.Lock(), 0])
+            load_lock[1] += 1
+        try:
+            return self.acquire_loaded(key, load_lock[0])
+        finally:
+            with self.lock:
+                load_lock[1] -= 1
+                if not load_lock[1]:
+                    del self.load_locks[key]
+
+    def acquire_loaded(self, key, load_lock):
+        data_dump, _ = key
+        # a dump is loaded only once, concurrent requests for it wait for that load
+        with load_lock:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry and self.expired(entry):
+                    self.retire(entry)
+                    entry = None
+                if entry:
+                    logger.info(f"Reusing temp graph <{entry.graph}> for {data_dump}")
+                    entry.refs += 1
+                    self.entries.move_to_end(key)
+                    return entry.graph
+
+            graph = TEMP_GRAPH_CACHE_BASE + generate_uuid()
+            update_sudo(register_cached_graph(graph, data_dump, self.registry_graph))
+            try:
+                load_file_to_db(data_dump, self.files_graph, graph)
+                entry = CachedGraph(key, graph, count_graph_triples(graph))
+            except Exception:
+                self.drop(graph)
+                raise
+            entry.refs += 1
+            with self.lock:
+                self.entries[key] = entry
+        self.evict()
+        return entry.graph
+
+    def release(self, graph):
+        with self.lock:
+            for entry in list(self.entries.values()) + self.retired:
+                if entry.graph == graph:
+                    entry.refs -= 1
+        self.evict()
+
+    def retire(self, entry):
+        """ Remove an entry from the cache, it's dropped once no longer in use """
+        del self.entries[entry.key]
+        self.retired.append(entry)
+
+    def evict(self):
+        with self.lock:
+            for entry in list(self.entries.values()):
+                if self.expired(entry):
+                    self.retire(entry)
+            total_triples = sum(entry.triples for entry in self.entries.values())
+            for entry in list(self.entries.values()):
+                if total_triples <= self.max_triples:
+                    break
+                if entry.refs == 0:
+                    self.retire(entry)
+                    total_triples -= entry.triples
+            unused = [entry for entry in self.retired if entry.refs <= 0]
+            self.retired = [entry for entry in self.retired if entry.refs > 0]
+        for entry in unused:
+            logger.info(f"Dropping cached temp graph <{entry.graph}> ({entry.triples} triples)")
+            self.drop(entry.graph)
@@ -0,0 +1,34 @@
+import batching
+from batching import AdaptiveBatchSize
+
+
+def batch_size():
+    return AdaptiveBatchSize(initial=10, minimum=5, maximum=20, target_latency_ms=100, max_backoff_ms=400)
+
+
+def test_grows_under_the_target_latency_up_to_the_maximum():
+    size = batch_size()
+    for _ in range(5):
+        size.record(10)
+    assert size.size == 20
+    assert size.backoff_ms == 0
+
+
+def test_slow_batches_shrink_and_back_off(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(batching.time, "sleep", sleeps.append)
+    size = batch_size()
+    backoffs = []
+    for _ in range(4):
+        size.record(500)
+        backoffs.append(size.backoff_ms)
+    assert size.size == 5
+    assert backoffs == [100, 200, 400, 400]
+    # recording (e.g. by a writer lane) never waits, the next batch does
+    assert sleeps == []
+    with size.measure():
+        pass
+    assert sleeps == [0.4]
+    size.record(10)
+    assert size.backoff_ms == 0
+    assert size.summary()["batches"] == 6
@@ -0,0 +1,34 @@
+import gzip
+
+import pytest
+
+import compression
+from compression import available_compression, compression_suffix, gunzip_chunks, open_compressed, read_chunks, uncompressed_name
+
+CONTENT = b"<http://example.com/a> <http://example.com/p> \"a\" .\n" * 1000
+
+
+@pytest.mark.parametrize("file_compression", [None, "gzip", "zstd"])
+def test_round_trip(tmp_path, file_compression):
+    if file_compression == "zstd" and compression.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    path = str(tmp_path / f"dump.nt{compression_suffix(file_compression)}")
+    with open_compressed(path, "wb", file_compression) as f:
+        f.write(CONTENT)
+    with open_compressed(path) as f:
+        assert b"".join(read_chunks(f, chunk_size=1000)) == CONTENT
+    assert uncompressed_name(path) == str(tmp_path / "dump.nt")
+
+
+def test_gunzip_chunks_of_a_multi_member_stream():
+    compressed = gzip.compress(CONTENT[:500]) + gzip.compress(CONTENT[500:])
+    chunks = [compressed[i:i + 64] for i in range(0, len(compressed), 64)]
+    pairs = list(gunzip_chunks(chunks))
+    assert [chunk for chunk, _ in pairs] == chunks
+    assert b"".join(data for _, data in pairs) == CONTENT
+
+
+def test_unsupported_compression():
+    assert available_compression("none") is None
+    with pytest.raises(ValueError):
+        available_compression("brotli")
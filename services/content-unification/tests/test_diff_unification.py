@@ -0,0 +1,22 @@
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import RDF, SKOS
+
+from diff_unification import PROV_WAS_DERIVED_FROM, add_unified_triples, drop_foreign_subjects
+from unification import unified_subject_uri
+
+DATASET = URIRef("http://example.com/dataset")
+SOURCE_SUBJECT = "http://example.com/source/1"
+
+
+def unified(vocab_uri):
+    g = Graph()
+    add_unified_triples(g, vocab_uri, [DATASET], SKOS.Concept, SKOS.prefLabel, SOURCE_SUBJECT, Literal("a"))
+    return g
+
+
+def test_subjects_of_a_vocabulary_sharing_the_source_dataset_are_not_diffed():
+    existing = unified("http://example.com/vocab/1") + unified("http://example.com/vocab/2")
+    drop_foreign_subjects(existing, "http://example.com/vocab/1")
+    assert set(existing.subjects()) == {URIRef(unified_subject_uri("http://example.com/vocab/1", SOURCE_SUBJECT))}
+    assert (None, PROV_WAS_DERIVED_FROM, URIRef(SOURCE_SUBJECT)) in existing
+    assert (None, RDF.type, SKOS.Concept) in existing
@@ -0,0 +1,46 @@
+from ldes_delta import LdesDeltaBuffer, changed_subjects_by_graph
+
+VOCAB = "http://example.com/vocab/1"
+
+
+def test_changed_subjects_by_graph_keeps_iri_subjects():
+    def triple(graph, subject_type, subject):
+        return {
+            "graph": {"type": "uri", "value": graph},
+            "subject": {"type": subject_type, "value": subject},
+            "predicate": {"type": "uri", "value": "http://example.com/p"},
+            "object": {"type": "literal", "value": "o"},
+        }
+    changesets = [{
+        "inserts": [triple("http://example.com/g1", "uri", "http://example.com/a")],
+        "deletes": [triple("http://example.com/g1", "bnode", "b1"), triple("http://example.com/g2", "uri", "http://example.com/b")],
+    }]
+    assert changed_subjects_by_graph(changesets) == {
+        "http://example.com/g1": {"http://example.com/a"},
+        "http://example.com/g2": {"http://example.com/b"},
+    }
+
+
+def buffer_with(flush):
+    buffer = LdesDeltaBuffer(3600, flush)
+    buffer.add(VOCAB, {"http://example.com/a"})
+    buffer.timer.cancel()
+    return buffer
+
+
+def test_flush_hands_over_the_buffered_subjects():
+    flushed = {}
+    buffer = buffer_with(lambda vocab, subjects: flushed.update({vocab: subjects}) or True)
+    buffer.run_flush()
+    assert flushed == {VOCAB: {"http://example.com/a"}}
+    assert buffer.pending() == {}
+
+
+def test_busy_and_failed_flushes_keep_the_subjects():
+    def fail(vocab, subjects):
+        raise RuntimeError("triplestore unavailable")
+    for flush in (lambda vocab, subjects: False, fail):
+        buffer = buffer_with(flush)
+        buffer.run_flush()
+        buffer.timer.cancel()
+        assert buffer.pending() == {VOCAB: 1}
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+from rdflib import Dataset, URIRef
+
+from remove_vocab import find_file_paths, find_staging_graphs
+
+GRAPH = "http://mu.semte.ch/graphs/public"
+VOCAB = "http://example.com/vocab/1"
+OTHER_VOCAB = "http://example.com/vocab/2"
+
+# Both vocabularies have a dump with the same content as the other one: the dumps share their
+# stored file and staging graph. The first vocabulary also has a dump of its own.
+DATA = """
+@prefix ext: <http://mu.semte.ch/vocabularies/ext/> .
+@prefix void: <http://rdfs.org/ns/void#> .
+@prefix nie: <http://www.semanticdesktop.org/ontologies/2007/01/19/nie#> .
+@prefix ex: <http://example.com/> .
+
+<http://example.com/vocab/1> a ext:VocabularyMeta ;
+    ext:sourceDataset ex:dataset1 .
+ex:dataset1 void:dataDump ex:file1, ex:file1Shared .
+ex:file1 ext:stagingGraph ex:staging1 .
+ex:file1Shared ext:stagingGraph ex:stagingShared .
+<share://dumps/1.ttl> nie:dataSource ex:file1 .
+<share://dumps/shared.ttl> nie:dataSource ex:file1Shared .
+
+<http://example.com/vocab/2> a ext:VocabularyMeta ;
+    ext:sourceDataset ex:dataset2 .
+ex:dataset2 void:dataDump ex:file2Shared .
+ex:file2Shared ext:stagingGraph ex:stagingShared .
+<share://dumps/shared.ttl> nie:dataSource ex:file2Shared .
+"""
+
+
+@pytest.fixture
+def store():
+    store = Dataset(default_union=True)
+    store.graph(URIRef(GRAPH)).parse(data=DATA, format="turtle")
+    return store
+
+
+def results(store, query_string, name):
+    bindings = json.loads(store.query(query_string).serialize(format="json"))["results"]["bindings"]
+    return {binding[name]["value"] for binding in bindings}
+
+
+def test_dumps_shared_with_another_vocab_are_kept(store):
+    assert results(store, find_file_paths(VOCAB, GRAPH), "dataSource") == {"share://dumps/1.ttl"}
+    assert results(store, find_file_paths(OTHER_VOCAB, GRAPH), "dataSource") == set()
+
+
+def test_staging_graphs_shared_with_another_vocab_are_kept(store):
+    assert results(store, find_staging_graphs(VOCAB, GRAPH), "stagingGraph") == {"http://example.com/staging1"}
+    assert results(store, find_staging_graphs(OTHER_VOCAB, GRAPH), "stagingGraph") == set()
+
+
+def test_shared_staging_graphs_go_with_the_last_vocab_using_them(store):
+    # removing a vocab removes its source datasets
+    store.graph(URIRef(GRAPH)).remove((URIRef(OTHER_VOCAB), None, None))
+    store.graph(URIRef(GRAPH)).remove((URIRef("http://example.com/dataset2"), None, None))
+    assert results(store, find_staging_graphs(VOCAB, GRAPH), "stagingGraph") == \
+        {"http://example.com/staging1", "http://example.com/stagingShared"}
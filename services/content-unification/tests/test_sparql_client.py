@@ -0,0 +1,18 @@
+import threading
+
+from sparql_client import get_session, is_update_query
+
+
+def test_threads_share_one_session():
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(get_session())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(session is get_session() for session in sessions)
+
+
+def test_update_queries_are_recognized_after_the_prologue():
+    assert is_update_query("PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>\n# comment\nINSERT DATA { }")
+    assert not is_update_query("PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>\nSELECT * WHERE { ?s ?p ?o }")
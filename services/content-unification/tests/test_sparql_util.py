@@ -0,0 +1,29 @@
+import pytest
+import requests
+
+import sparql_util
+
+
+class StuckSession:
+    """ A graph store that never answers: the POST times out after the timeout it was given """
+    def __init__(self):
+        self.timeouts = []
+
+    def post(self, url, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        raise requests.Timeout(f"No response within {timeout} s")
+
+
+def test_a_stuck_graph_store_load_fails_after_the_timeout(tmp_path, monkeypatch):
+    session = StuckSession()
+    monkeypatch.setattr(sparql_util, "MU_SPARQL_GRAPH_STORE_ENDPOINT", "http://triplestore/sparql-graph-crud")
+    monkeypatch.setattr(sparql_util, "MU_SPARQL_GRAPH_STORE_TIMEOUT_S", 42)
+    monkeypatch.setattr(sparql_util.sparql_client, "get_session", lambda: session)
+    for name in ("dump.ttl", "dump.jsonld"):
+        path = tmp_path / name
+        path.write_text('{"@id": "http://example.com/s", "http://example.com/p": "o"}' if name.endswith("jsonld")
+                        else '<http://example.com/s> <http://example.com/p> "o" .\n')
+        # the load fails instead of hanging, the temp graph cache then drops the partial graph
+        with pytest.raises(requests.Timeout):
+            sparql_util.upload_file_to_graph(str(path), "http://example.com/graph")
+    assert session.timeouts == [42, 42]
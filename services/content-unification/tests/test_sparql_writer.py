@@ -0,0 +1,34 @@
+from rdflib import Literal, URIRef
+
+from batching import AdaptiveBatchSize
+from sparql_writer import SparqlWriter
+
+GRAPH = "http://example.com/graph"
+
+
+def triples(n):
+    return [(URIRef(f"http://example.com/s{i}"), URIRef("http://example.com/p"), Literal(i)) for i in range(n)]
+
+
+def test_every_batch_is_written_and_timed():
+    updates = []
+    latency = AdaptiveBatchSize(initial=10, minimum=5, maximum=500, target_latency_ms=10000, max_backoff_ms=0)
+    with SparqlWriter(updates.append, concurrency=2, latency=latency) as writer:
+        writer.write([triples(3), triples(2)], GRAPH)
+        writer.write([triples(1)], GRAPH, "DELETE")
+    assert writer.triples == 6
+    assert len(updates) == 3
+    assert sum(update.startswith("\nDELETE DATA") for update in updates) == 1
+    assert len(latency.samples) == 3
+
+
+def test_failed_batches_are_reported():
+    def fail(query_string):
+        raise RuntimeError("store unavailable")
+    try:
+        with SparqlWriter(fail, concurrency=1) as writer:
+            writer.write([triples(1)], GRAPH)
+    except Exception as e:
+        assert "1 update batches failed" in str(e)
+    else:
+        raise AssertionError("the failed batch wasn't reported")
@@ -0,0 +1,137 @@
+import json
+
+import pytest
+from rdflib import Dataset
+
+import web
+from constants import CONT_UN_OPERATION, SCHEDULED_DUMP_CREATOR, STATUS_FAILED, STATUS_SUCCESS, TASKS_GRAPH
+from task import find_incrementally_unified_tasks
+
+VOCAB = "http://example.com/vocab"
+JOB = "http://redpencil.data.gift/id/job/1"
+DOWNLOAD_TASK = "http://redpencil.data.gift/id/task/download"
+UNIFICATION_TASK = "http://redpencil.data.gift/id/task/unification"
+PREVIOUS_UNIFICATION_TASK = "http://redpencil.data.gift/id/task/previous-unification"
+
+# a download job started from the frontend, its unification task scheduled by the job-controller
+JOB_TRIPLES = f"""
+PREFIX cogs: <http://vocab.deri.ie/cogs#>
+PREFIX task: <http://redpencil.data.gift/vocabularies/tasks/>
+PREFIX mu: <http://mu.semte.ch/vocabularies/core/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+PREFIX adms: <http://www.w3.org/ns/adms#>
+
+INSERT DATA {{
+    GRAPH <{TASKS_GRAPH}> {{
+        <{JOB}> a cogs:Job ;
+            dct:creator <http://example.com/user> ;
+            task:operation <http://lblod.data.gift/id/jobs/concept/JobOperation/vocab-download> .
+        <{DOWNLOAD_TASK}> a task:Task ;
+            adms:status <{STATUS_SUCCESS}> ;
+            task:operation <http://mu.semte.ch/vocabularies/ext/VocabDownloadJob> ;
+            dct:isPartOf <{JOB}> .
+        <{UNIFICATION_TASK}> a task:Task ;
+            mu:uuid "unification" ;
+            dct:created "2026-10-18T10:00:00"^^xsd:dateTime ;
+            dct:modified "2026-10-18T10:00:00"^^xsd:dateTime ;
+            adms:status <http://redpencil.data.gift/id/concept/JobStatus/scheduled> ;
+            task:operation <{CONT_UN_OPERATION}> ;
+            dct:isPartOf <{JOB}> ;
+            task:inputContainer [ ext:content <{VOCAB}> ] .
+    }}
+}}
+"""
+
+# vocab-fetch's mark_job_source_unchanged, as run for a file download that kept the previous dump
+MARK_SOURCE_UNCHANGED = f"""
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+INSERT {{
+    GRAPH <{TASKS_GRAPH}> {{
+        ?job ext:sourceUnchanged "true"^^<http://www.w3.org/2001/XMLSchema#boolean> .
+    }}
+}}
+WHERE {{
+    GRAPH <{TASKS_GRAPH}> {{
+        <{DOWNLOAD_TASK}> dct:isPartOf ?job .
+    }}
+}}
+"""
+
+
+def previous_unification(status):
+    return f"""
+PREFIX task: <http://redpencil.data.gift/vocabularies/tasks/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+PREFIX adms: <http://www.w3.org/ns/adms#>
+
+INSERT DATA {{
+    GRAPH <{TASKS_GRAPH}> {{
+        <{PREVIOUS_UNIFICATION_TASK}> a task:Task ;
+            adms:status <{status}> ;
+            dct:modified "2026-10-17T10:00:00"^^xsd:dateTime ;
+            task:operation <{CONT_UN_OPERATION}> ;
+            task:inputContainer [ ext:content <{VOCAB}> ] .
+    }}
+}}
+"""
+
+
+class AdmitAll:
+    def try_acquire(self, operation, key):
+        return True
+
+    def release(self, operation, key):
+        pass
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = Dataset()
+    store.update(JOB_TRIPLES)
+    monkeypatch.setattr(web, "query_sudo", lambda query_string, **kwargs: json.loads(
+        store.query(query_string).serialize(format="json")))
+    monkeypatch.setattr(web, "worker_pool", AdmitAll())
+    return store
+
+
+def dispatched_runner(monkeypatch):
+    """ Dispatch the unification task, returns whether its runner unified the vocabulary """
+    unified = []
+    monkeypatch.setattr(web, "run_vocab_unification", lambda vocab, *args, **kwargs: unified.append(vocab))
+
+    def run_tasks(task_uris, graph, runner_func, *args, **kwargs):
+        assert task_uris == [UNIFICATION_TASK]
+        runner_func([VOCAB], task_uris)
+    monkeypatch.setattr(web, "run_tasks", run_tasks)
+    web.dispatch_task(UNIFICATION_TASK, CONT_UN_OPERATION)
+    return unified == [VOCAB]
+
+
+def test_unification_of_an_unchanged_file_download_is_skipped(store, monkeypatch):
+    store.update(previous_unification(STATUS_SUCCESS))
+    store.update(MARK_SOURCE_UNCHANGED)
+    assert not dispatched_runner(monkeypatch)
+
+
+def test_unification_of_a_changed_download_runs(store, monkeypatch):
+    store.update(previous_unification(STATUS_SUCCESS))
+    assert dispatched_runner(monkeypatch)
+
+
+def test_unification_is_retried_after_a_failed_unification(store, monkeypatch):
+    store.update(previous_unification(STATUS_FAILED))
+    store.update(MARK_SOURCE_UNCHANGED)
+    assert dispatched_runner(monkeypatch)
+
+
+def test_only_scheduled_jobs_marked_as_incremental_are_skipped():
+    query_string = find_incrementally_unified_tasks(["http://example.com/task/1"], "http://mu.semte.ch/graphs/public")
+    assert "$" not in query_string
+    assert f"dct:creator <{SCHEDULED_DUMP_CREATOR}>" in query_string
+    assert "ext:incrementalUnification" in query_string
@@ -0,0 +1,69 @@
+import pytest
+
+import temp_graph_cache
+from temp_graph_cache import TempGraphCache
+
+DUMP = "http://example.com/file/1"
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    dropped = []
+    monkeypatch.setattr(temp_graph_cache, "query_sudo", lambda q: {"results": {"bindings": []}})
+    monkeypatch.setattr(temp_graph_cache, "update_sudo", lambda q: None)
+    monkeypatch.setattr(temp_graph_cache, "load_file_to_db", lambda dump, files_graph, graph: None)
+    monkeypatch.setattr(temp_graph_cache, "count_graph_triples", lambda graph: 10)
+    monkeypatch.setattr(temp_graph_cache, "drop_graph", dropped.append)
+    cache = TempGraphCache(max_triples=15, ttl_s=3600, registry_graph="http://example.com/g",
+                           files_graph="http://example.com/g")
+    cache.dropped = dropped
+    return cache
+
+
+def test_an_unchanged_dump_reuses_its_graph(cache):
+    graph = cache.acquire(DUMP, "2024-01-08")
+    assert cache.acquire(DUMP, "2024-01-08") == graph
+    assert cache.acquire(DUMP, "2024-01-09") != graph
+    assert cache.load_locks == {}
+
+
+def test_graphs_in_use_are_never_dropped(cache):
+    first = cache.acquire(DUMP, "2024-01-08")
+    second = cache.acquire("http://example.com/file/2", "2024-01-08")
+    assert cache.dropped == []
+    cache.release(first)
+    # over max_triples, the least recently used graph that isn't in use goes
+    assert cache.dropped == [first]
+    cache.release(second)
+    assert cache.dropped == [first]
+
+
+def test_failed_loads_are_dropped(cache, monkeypatch):
+    def fail(dump, files_graph, graph):
+        raise RuntimeError("load failed")
+    monkeypatch.setattr(temp_graph_cache, "load_file_to_db", fail)
+    with pytest.raises(RuntimeError):
+        cache.acquire(DUMP, "2024-01-08")
+    assert len(cache.dropped) == 1
+    assert cache.load_locks == {}
+
+
+def test_expired_graphs_are_swept_while_idle(cache, monkeypatch):
+    graph = cache.acquire(DUMP, "2024-01-08")
+    cache.release(graph)
+    cache.sweep()
+    assert cache.dropped == []
+    monkeypatch.setattr(cache, "ttl_s", -1)
+    cache.sweep()
+    assert cache.dropped == [graph]
+
+
+def test_graphs_of_a_previous_run_are_dropped_outside_of_the_lock(cache, monkeypatch):
+    left_behind = ["http://example-resource.com/graph/cache/old"]
+    monkeypatch.setattr(temp_graph_cache, "query_sudo",
+                        lambda q: {"results": {"bindings": [{"graph": {"value": g}} for g in left_behind]}})
+    dropped_while_locked = []
+    monkeypatch.setattr(temp_graph_cache, "drop_graph", lambda graph: dropped_while_locked.append(cache.lock.locked()))
+    cache.acquire(DUMP, "2024-01-08")
+    cache.acquire(DUMP, "2024-01-09")
+    assert dropped_while_locked == [False]
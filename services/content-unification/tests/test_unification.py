@@ -0,0 +1,39 @@
+import re
+
+from unification import BLANK_NODE_SUBJECTS_FILTER, get_source_values_page, get_ununified_batch
+
+GRAPHS = ["http://example.com/graph/source"]
+
+
+def source_values_page(after_subject):
+    return get_source_values_page(
+        source_class="http://www.w3.org/2004/02/skos/core#Concept",
+        source_path_string="<http://www.w3.org/2004/02/skos/core#prefLabel>",
+        source_filter="",
+        source_graphs=GRAPHS,
+        after_subject=after_subject,
+        batch_size=10,
+    )
+
+
+def test_keyset_pages_compare_subjects_as_strings():
+    query_string = source_values_page("http://example.com/concept/1")
+    assert re.search(r'FILTER\(STR\(\?sourceSubject\) > ("""|")http://example\.com/concept/1\1\)', query_string)
+    assert "ORDER BY ?sourceSubject" not in query_string
+    assert query_string.count("ORDER BY STR(?sourceSubject)") == 2
+    assert "FILTER(isIRI(?sourceSubject))" in query_string
+
+
+def test_blank_node_subjects_are_left_to_the_rescan_query():
+    query_string = get_ununified_batch(
+        dest_class="http://www.w3.org/2004/02/skos/core#Concept",
+        dest_predicate="http://www.w3.org/2004/02/skos/core#prefLabel",
+        source_datasets=["http://example.com/dataset"],
+        source_class="http://www.w3.org/2004/02/skos/core#Concept",
+        source_path_string="<http://www.w3.org/2004/02/skos/core#prefLabel>",
+        source_filter=BLANK_NODE_SUBJECTS_FILTER,
+        source_graphs=GRAPHS,
+        target_graph="http://mu.semte.ch/graphs/public",
+        batch_size=10,
+    )
+    assert BLANK_NODE_SUBJECTS_FILTER in query_string
@@ -0,0 +1,131 @@
+import re
+
+import pytest
+from SPARQLWrapper.SPARQLExceptions import QueryBadFormed
+
+import diff_unification
+import web
+from unification import unified_subject_uri
+
+VOCAB = "http://example.com/vocab"
+DATASET = "http://example.com/dataset"
+DATASET_GRAPH = "http://example.com/graph/dataset"
+OBSOLETE = "http://example-resource.com/dataset-subject/obsolete"
+SUBJECTS = ["http://example.com/concept/1", "http://example.com/concept/2"]
+# unified before, but no longer in the source: one between the source subjects, one after the last
+REMOVED_SUBJECTS = ["http://example.com/concept/10", "http://example.com/concept/9"]
+
+
+def uri(value):
+    return {"type": "uri", "value": value}
+
+
+def literal(value):
+    return {"type": "literal", "value": value}
+
+
+def window_bound(query_string, operator):
+    bound = re.search(r'FILTER\(STR\(\?sourceSubject\) ' + operator + r' ("""|")(.*?)\1\)', query_string)
+    return bound.group(2) if bound else None
+
+
+class FakeTriplestore:
+    """ Answers the queries of a unification run of a vocabulary with one graph-based dataset """
+    def __init__(self):
+        self.queries = []
+        self.updates = []
+        self.obsolete = [OBSOLETE]
+        # source subject -> unified values, the label of the first subject changed since
+        self.unified = {SUBJECTS[0]: ["label 0 (old)"], REMOVED_SUBJECTS[0]: ["label 10"], REMOVED_SUBJECTS[1]: []}
+
+    def query(self, query_string, **kwargs):
+        self.queries.append(query_string)
+        if "ext:VocabularyMeta" in query_string:
+            bindings = [{"sourceDataset": uri(DATASET), "mappingShape": uri("http://example.com/shape")}]
+        elif "void:Dataset" in query_string:
+            bindings = [{"dataset_graph": uri(DATASET_GRAPH)}]
+        elif "sh:NodeShape" in query_string:
+            bindings = [{
+                "sourceClass": uri("http://www.w3.org/2004/02/skos/core#Concept"),
+                "sourcePathString": literal("<http://www.w3.org/2004/02/skos/core#prefLabel>"),
+                "sourceFilter": literal("FILTER(LANG(?sourceValue) = \"en\")"),
+                "destClass": uri("http://www.w3.org/2004/02/skos/core#Concept"),
+                "destPath": uri("http://www.w3.org/2004/02/skos/core#prefLabel"),
+            }]
+        elif "SELECT ?targetSubject" in query_string:
+            bindings = [{"targetSubject": uri(s)} for s in self.obsolete]
+        elif "SELECT DISTINCT ?sourceSubject ?sourceValue" in query_string:
+            # a single page, shorter than the batch size
+            bindings = [{"sourceSubject": uri(s), "sourceValue": literal(f"label {i}")} for i, s in enumerate(SUBJECTS)]
+        elif "SELECT DISTINCT ?s ?sourceSubject ?o" in query_string:
+            after, up_to = window_bound(query_string, ">"), window_bound(query_string, "<=")
+            limit = int(re.search(r"LIMIT (\d+)", query_string).group(1))
+            window = sorted(s for s in self.unified if (not after or s > after) and (not up_to or s <= up_to))[:limit]
+            bindings = []
+            for source_subject in window:
+                s = uri(unified_subject_uri(VOCAB, source_subject))
+                values = [{"o": literal(value)} for value in self.unified[source_subject]] or [{}]
+                bindings += [{"s": s, "sourceSubject": uri(source_subject), **value} for value in values]
+        else:  # ununified (blank node) batches
+            bindings = []
+        return {"head": {"vars": []}, "results": {"bindings": bindings}}
+
+    def update(self, query_string, **kwargs):
+        if OBSOLETE in query_string:
+            self.obsolete = []
+        self.updates.append(query_string)
+
+
+@pytest.fixture
+def triplestore(monkeypatch):
+    store = FakeTriplestore()
+    for module in (web, diff_unification):
+        monkeypatch.setattr(module, "query_sudo", store.query)
+        monkeypatch.setattr(module, "update_sudo", store.update)
+    return store
+
+
+def test_rescan_unification_deletes_obsolete_subjects_with_the_source_filter(triplestore, monkeypatch):
+    monkeypatch.setattr(web, "UNIFICATION_MODE", "rescan")
+    assert web.run_vocab_unification(VOCAB) == VOCAB
+    assert any("SELECT ?targetSubject" in q and "LANG(?sourceValue)" in q for q in triplestore.queries)
+    assert any(OBSOLETE in update and "DELETE" in update for update in triplestore.updates)
+
+
+def test_keyset_unification_compares_every_page_with_its_window(triplestore, monkeypatch):
+    monkeypatch.setattr(web, "UNIFICATION_MODE", "keyset")
+    assert web.run_vocab_unification(VOCAB) == VOCAB
+    # no full rescans
+    assert not any("SELECT ?targetSubject" in q or "FILTER NOT EXISTS" in q for q in triplestore.queries)
+
+    deletes = "\n".join(update for update in triplestore.updates if "DELETE" in update)
+    for removed in REMOVED_SUBJECTS:
+        assert f"<{unified_subject_uri(VOCAB, removed)}>" in deletes
+    assert "label 0 (old)" in deletes
+    inserts = "\n".join(update for update in triplestore.updates if "INSERT DATA" in update)
+    for subject in SUBJECTS:
+        assert f"<{unified_subject_uri(VOCAB, subject)}>" in inserts
+    assert "label 0 (old)" not in inserts
+
+
+def test_unification_statistics_are_linked_to_their_tasks(triplestore, monkeypatch):
+    monkeypatch.setattr(web, "UNIFICATION_MODE", "keyset")
+    tasks = ["http://example.com/task/1", "http://example.com/task/2"]
+    web.run_vocab_unification(VOCAB, task_uris=tasks)
+    statistics = [update for update in triplestore.updates if "ext:UnificationStatistics" in update]
+    assert len(statistics) == 1
+    statistics_uri = re.search(r"(<[^>]+>) a ext:UnificationStatistics", statistics[0]).group(1)
+    for task in tasks:
+        assert f"<{task}> ext:statistics {statistics_uri} ." in statistics[0]
+
+
+def test_inline_filter_count_reports_a_malformed_filter_as_invalid(triplestore, monkeypatch):
+    def query(query_string, **kwargs):
+        if "COUNT(DISTINCT ?entity)" in query_string:
+            raise QueryBadFormed("Virtuoso 37000 Error SP030: SPARQL compiler, syntax error")
+        return triplestore.query(query_string)
+    monkeypatch.setattr(web, "query_sudo", query)
+    result = web.run_filter_count_inline(DATASET, "http://www.w3.org/2004/02/skos/core#Concept",
+                                         "<http://www.w3.org/2004/02/skos/core#prefLabel>", "FILTER(")
+    assert result["valid"] is False
+    assert "syntax error" in result["error"]
@@ -0,0 +1,30 @@
+from worker_pool import QueueWaitStats, TaskWorkerPool
+
+UNIFY = "http://mu.semte.ch/vocabularies/ext/ContentUnificationJob"
+COUNT = "http://mu.semte.ch/vocabularies/ext/FilterCountJob"
+
+
+def test_tasks_on_the_same_vocabulary_are_serialized():
+    pool = TaskWorkerPool({UNIFY: 2, COUNT: 2})
+    assert pool.try_acquire(UNIFY, "http://example.com/vocab/1")
+    assert not pool.try_acquire(UNIFY, "http://example.com/vocab/1")
+    assert pool.try_acquire(UNIFY, "http://example.com/vocab/2")
+    pool.release(UNIFY, "http://example.com/vocab/1")
+    assert pool.try_acquire(UNIFY, "http://example.com/vocab/1")
+
+
+def test_operations_have_their_own_slots():
+    pool = TaskWorkerPool({UNIFY: 1, COUNT: 1})
+    assert pool.try_acquire(UNIFY, "http://example.com/vocab/1")
+    assert not pool.try_acquire(UNIFY, "http://example.com/vocab/2")
+    assert pool.try_acquire(COUNT, None)
+    # a refused key doesn't keep the slot it took
+    pool.release(UNIFY, "http://example.com/vocab/1")
+    assert pool.try_acquire(UNIFY, "http://example.com/vocab/2")
+
+
+def test_queue_wait_summary():
+    stats = QueueWaitStats()
+    stats.record("normal", 1.0)
+    stats.record("normal", 3.0)
+    assert stats.summary() == {"normal": {"tasks": 2, "mean_wait_s": 2.0, "max_wait_s": 3.0}}
@@ -1,5 +1,6 @@
 import os
 import datetime
+import hashlib
 from string import Template
 import re
 from escape_helpers import sparql_escape_uri, sparql_escape_datetime, sparql_escape_string, sparql_escape_int, sparql_escape_bool
@@ -12,6 +13,7 @@ from constants import (
     CONTAINER_URI_PREFIX,
     FILTER_COUNT_INPUT_URI_PREFIX,
     FILTER_COUNT_OUTPUT_URI_PREFIX,
+    UNIFICATION_STATISTICS_URI_PREFIX,
 )
 NEW_SUBJECT_BASE = "http://example-resource.com/dataset-subject/"
 
@@ -121,6 +123,149 @@ def get_ununified_batch(dest_class,
     )
     return query_string
 
+# Same URI as the one built by UNUNIFIED_BATCH_TEMPLATE in SPARQL
+# (`IRI(CONCAT(base, MD5(CONCAT(str(?vocabUri), str(?sourceSubject)))))`),
+# but computed locally so the triplestore doesn't need to evaluate it for every row.
+def unified_subject_uri(vocab_uri, source_subject):
+    return NEW_SUBJECT_BASE + hashlib.md5((vocab_uri + source_subject).encode("utf-8")).hexdigest()
+
+# Keyset pagination over the source subjects of a property path.
+# Instead of re-running the full FILTER NOT EXISTS scan and taking the first
+# `batch_size` results (which makes the total cost quadratic in the vocabulary size),
+# the source subjects are walked in a stable order. Every page starts right after
+# the last subject of the previous page, so each page costs about the same.
+# A page returns the (?sourceSubject, ?sourceValue) pairs of `batch_size` subjects,
+# the unified subject URIs are computed locally with `unified_subject_uri`.
+# Subjects are compared and sorted as strings: SPARQL doesn't define `>` for IRIs, and nothing
+# guarantees that a triplestore compares IRIs in the order of `ORDER BY ?sourceSubject`.
+# Only IRI subjects can be paged this way (blank nodes have no stable order). The diff mode
+# unifies its blank node subjects with the rescan query, see `BLANK_NODE_SUBJECTS_FILTER`.
+SOURCE_VALUES_PAGE_TEMPLATE = Template("""
+SELECT DISTINCT ?sourceSubject ?sourceValue
+WHERE {
+    {
+        SELECT DISTINCT ?sourceSubject
+        WHERE {
+            VALUES ?source_graph { $source_graphs }
+            GRAPH ?source_graph {
+                ?sourceSubject
+                    a $source_class ;
+                    $source_path_string ?sourceValue .
+                BIND(?sourceSubject as ?entity)
+                $source_filter
+            }
+            FILTER(isIRI(?sourceSubject))
+            $source_subjects_values
+            $after_subject_filter
+        }
+        ORDER BY STR(?sourceSubject)
+        LIMIT $batch_size
+    }
+    VALUES ?source_graph { $source_graphs }
+    GRAPH ?source_graph {
+        ?sourceSubject
+            a $source_class ;
+            $source_path_string ?sourceValue .
+        BIND(?sourceSubject as ?entity)
+        $source_filter
+    }
+}
+ORDER BY STR(?sourceSubject)
+""")
+
+# Restricts the rescan query (UNUNIFIED_BATCH_TEMPLATE) to the subjects the keyset pages leave out
+BLANK_NODE_SUBJECTS_FILTER = "FILTER(isBlank(?sourceSubject))"
+
+# The unified subjects of a property path whose source subject lies in a keyset window
+# (after, up to], with their values for the path. The keyset mode compares every page of
+# source values with the unified values of the same window, so neither side is ever held
+# in memory as a whole. The window is paged itself, `batch_size` source subjects at a time.
+UNIFIED_VALUES_WINDOW_TEMPLATE = Template("""
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX prov: <http://www.w3.org/ns/prov#>
+
+SELECT DISTINCT ?s ?sourceSubject ?o
+WHERE {
+    {
+        SELECT DISTINCT ?sourceSubject
+        WHERE {
+            VALUES ?sourceDataset {
+                $source_datasets
+            }
+            GRAPH $target_graph {
+                ?s prov:wasDerivedFrom ?sourceSubject ;
+                    a $dest_class ;
+                    dct:source ?sourceDataset .
+            }
+            FILTER(isIRI(?sourceSubject))
+            $window_filter
+        }
+        ORDER BY STR(?sourceSubject)
+        LIMIT $batch_size
+    }
+    VALUES ?sourceDataset {
+        $source_datasets
+    }
+    GRAPH $target_graph {
+        ?s prov:wasDerivedFrom ?sourceSubject ;
+            a $dest_class ;
+            dct:source ?sourceDataset .
+        OPTIONAL { ?s $dest_predicate ?o . }
+    }
+}
+ORDER BY STR(?sourceSubject)
+""")
+
+def get_unified_values_window(dest_class,
+                              dest_predicate,
+                              source_datasets,
+                              target_graph,
+                              after_subject,
+                              up_to_subject,
+                              batch_size):
+    window_filter = []
+    if after_subject:
+        window_filter.append(f"FILTER(STR(?sourceSubject) > {sparql_escape_string(after_subject)})")
+    if up_to_subject:
+        window_filter.append(f"FILTER(STR(?sourceSubject) <= {sparql_escape_string(up_to_subject)})")
+    query_string = UNIFIED_VALUES_WINDOW_TEMPLATE.substitute(
+        dest_class=sparql_escape_uri(dest_class),
+        dest_predicate=sparql_escape_uri(dest_predicate),
+        source_datasets="\n                ".join([sparql_escape_uri(source_dataset) for source_dataset in source_datasets]),
+        target_graph=sparql_escape_uri(target_graph),
+        window_filter="\n            ".join(window_filter),
+        batch_size=batch_size,
+    )
+    return query_string
+
+def source_subjects_values(source_subjects):
+    """ VALUES block restricting ?sourceSubject, or nothing when all subjects are unified """
+    if source_subjects is None:
+        return ""
+    return "VALUES ?sourceSubject { " + " ".join(sparql_escape_uri(s) for s in source_subjects) + " }"
+
+def get_source_values_page(source_class,
+                           source_path_string,
+                           source_filter,
+                           source_graphs,
+                           after_subject,
+                           batch_size,
+                           source_subjects=None):
+    if after_subject:
+        after_subject_filter = f"FILTER(STR(?sourceSubject) > {sparql_escape_string(after_subject)})"
+    else:
+        after_subject_filter = ""
+    query_string = SOURCE_VALUES_PAGE_TEMPLATE.substitute(
+        source_subjects_values=source_subjects_values(source_subjects),
+        source_class=sparql_escape_uri(source_class),
+        source_path_string=source_path_string,
+        source_filter=source_filter,
+        source_graphs=" ".join([sparql_escape_uri(source_graph) for source_graph in source_graphs]),
+        after_subject_filter=after_subject_filter,
+        batch_size=batch_size,
+    )
+    return query_string
+
 UNUNIFIED_BATCH_TEMPLATE_VARS = set(re.compile(r'\?\w+').findall(UNUNIFIED_BATCH_TEMPLATE.template))
 UNUNIFIED_BATCH_TEMPLATE_VARS.remove("?entity")
 
@@ -392,3 +537,42 @@ WHERE {
         graph=sparql_escape_uri(graph),
     )
     return query_string
+
+# batch sizes and latencies used by a unification run, see `AdaptiveBatchSize`,
+# linked to the tasks of the run with ext:statistics
+def write_unification_statistics(vocab_uri, samples, graph, task_uris=()):
+    query_template = Template("""
+PREFIX mu: <http://mu.semte.ch/vocabularies/core/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX prov: <http://www.w3.org/ns/prov#>
+
+INSERT DATA {
+    GRAPH $graph {
+        $statistics_uri a ext:UnificationStatistics ;
+            mu:uuid $statistics_uuid ;
+            prov:used $vocab_uri ;
+            dct:created $created ;
+            ext:batchCount $batch_count ;
+            ext:batchSizes $batch_sizes ;
+            ext:batchLatenciesMs $batch_latencies .
+        $task_links
+    }
+}
+""")
+    statistics_uuid = generate_uuid()
+    statistics_uri = UNIFICATION_STATISTICS_URI_PREFIX + statistics_uuid
+    query_string = query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        statistics_uri=sparql_escape_uri(statistics_uri),
+        statistics_uuid=sparql_escape_string(statistics_uuid),
+        vocab_uri=sparql_escape_uri(vocab_uri),
+        created=sparql_escape_datetime(datetime.datetime.now()),
+        batch_count=sparql_escape_int(len(samples)),
+        batch_sizes=sparql_escape_string(",".join([str(size) for size, _ in samples])),
+        batch_latencies=sparql_escape_string(",".join([str(latency) for _, latency in samples])),
+        task_links="\n        ".join(
+            [f"{sparql_escape_uri(task_uri)} ext:statistics {sparql_escape_uri(statistics_uri)} ." for task_uri in task_uris]
+        ),
+    )
+    return query_string
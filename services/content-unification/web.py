@@ -1,7 +1,7 @@
+import datetime
 import os
 from string import Template
 import threading
-import time
 
 from rdflib import Graph, URIRef
 import requests
@@ -17,21 +17,29 @@ from sudo_query import query_sudo, auth_update_sudo as update_sudo
 
 from sparql_util import (
     binding_results,
+    json_to_term,
     serialize_graph_to_sparql,
     sparql_construct_res_to_graph,
-    load_file_to_db,
-    drop_graph,
     diff_graphs,
     copy_graph_to_temp,
+    BATCH_SIZE,
 )
+from sparql_writer import SparqlWriter
 
-from task import find_actionable_task_of_type, find_same_scheduled_tasks, get_input_contents_task, run_task, find_actionable_task, run_tasks
+from task import find_actionable_tasks_of_type, find_same_scheduled_tasks, get_input_contents_task, run_task, find_actionable_task, run_tasks
+from task import find_source_unchanged_tasks, find_incrementally_unified_tasks
 from vocabulary import get_vocabulary, vocabulary_uri
 from dataset import get_dataset
+from worker_pool import TaskWorkerPool, QueueWaitStats
+from temp_graph_cache import TempGraphCache
+from ldes_delta import LdesDeltaBuffer, get_graph_vocabularies, changed_subjects_by_graph
 
 from unification import (
     get_property_paths,
     get_ununified_batch,
+    unified_subject_uri,
+    get_unified_values_window,
+    BLANK_NODE_SUBJECTS_FILTER,
     count_ununified,
     start_filter_count_task,
     get_filter_count_input,
@@ -40,6 +48,13 @@ from unification import (
     get_delete_subjects_batch,
     delete_subjects,
     delete_dataset_subjects_from_graph,
+    write_unification_statistics,
+)
+from batching import AdaptiveBatchSize
+from diff_unification import (
+    run_diff_unification,
+    read_source_values,
+    add_unified_triples,
 )
 from remove_vocab import (
     start_vocab_delete_task,
@@ -48,7 +63,6 @@ from remove_vocab import (
 )
 from constants import (
     FILE_RESOURCE_BASE,
-    SLEEP_MS_BETWEEN_QUERIES_UNIFY,
     TASKS_GRAPH,
     VOCAB_GRAPH,
     UNIFICATION_TARGET_GRAPH,
@@ -59,57 +73,82 @@ from constants import (
     VOCAB_DELETE_OPERATION,
     VOCAB_DELETE_WAIT_OPERATION,
     UNIFICATION_BATCH_SIZE,
+    UNIFICATION_BATCH_SIZE_MIN,
+    UNIFICATION_BATCH_SIZE_MAX,
+    UNIFICATION_TARGET_LATENCY_MS,
+    UNIFICATION_MAX_BACKOFF_MS,
+    UNIFICATION_MODE,
+    UNIFICATION_CONCURRENCY,
+    FILTER_COUNT_CONCURRENCY,
+    VOCAB_DELETE_CONCURRENCY,
+    VOCAB_DELETE_WAIT_CONCURRENCY,
+    SCHEDULED_TASKS_PAGE_SIZE,
+    PRIORITY_CLASSES,
+    FILTER_COUNT_INLINE_TIMEOUT_S,
+    TEMP_GRAPH_CACHE_MAX_TRIPLES,
+    TEMP_GRAPH_CACHE_TTL_S,
+    TEMP_GRAPH_CACHE_SWEEP_INTERVAL_S,
+    INCREMENTAL_LDES_UNIFICATION,
+    LDES_DELTA_FLUSH_DELAY_S,
 )
 
-TEMP_GRAPH_BASE = "http://example-resource.com/graph/"
+temp_graph_cache = TempGraphCache(
+    TEMP_GRAPH_CACHE_MAX_TRIPLES, TEMP_GRAPH_CACHE_TTL_S, TASKS_GRAPH, VOCAB_GRAPH
+)
+temp_graph_cache.start_sweeping(TEMP_GRAPH_CACHE_SWEEP_INTERVAL_S)
 
 def build_temp_graphs(datasets):
     # for every dataset:
-    # if file-based, load into temporary graph
+    # if file-based, use the staging graph loaded by vocab-fetch, or load into temporary graph
+    # (or reuse the one of the same dump) when there is none
     # if graph-based, return graph directly
+    # the temporary graphs are returned separately, to be released with `release_temp_graphs`
     graphs = set()
-    temp_named_graph = TEMP_GRAPH_BASE + generate_uuid()
-
-    for dataset in datasets:
-        dataset_versions = query_sudo(
-            get_dataset(dataset, VOCAB_GRAPH)
-        )["results"]["bindings"]
-
-        if "dataset_graph" in dataset_versions[0].keys():
-            graphs.add(dataset_versions[0]["dataset_graph"]["value"])
-
-        elif "data_dump" in dataset_versions[0].keys():
-            graphs.add(temp_named_graph)
-            temp_named_graph = load_file_to_db(
-                dataset_versions[0]["data_dump"]["value"], VOCAB_GRAPH, temp_named_graph
-            )
-            # this should only load in the data, diffing is done by unification itself.
-        else:
-            pass
-            # TODO: return error?
-
-    return list(graphs), temp_named_graph
+    temp_graphs = []
 
-def run_vocab_unification(vocab_uri):
-    vocab_sources = query_sudo(get_vocabulary(vocab_uri, VOCAB_GRAPH))["results"][
-        "bindings"
-    ]
-
-    if not vocab_sources:
-        raise Exception(f"Vocab {vocab_uri} does not have a mapping. Unification cancelled.")
+    try:
+        for dataset in datasets:
+            dataset_versions = query_sudo(
+                get_dataset(dataset, VOCAB_GRAPH)
+            )["results"]["bindings"]
 
-    datasets = [vocab_source["sourceDataset"]["value"] for vocab_source in vocab_sources]
+            if "dataset_graph" in dataset_versions[0].keys():
+                graphs.add(dataset_versions[0]["dataset_graph"]["value"])
 
-    dataset_graphs, temp_named_graph = build_temp_graphs(datasets)
-    try:
-      prop_paths_qs = get_property_paths(
-          vocab_sources[0]["mappingShape"]["value"], VOCAB_GRAPH
-      )
-      prop_paths_res = query_sudo(prop_paths_qs)
+            elif "staging_graph" in dataset_versions[0].keys():
+                graphs.add(dataset_versions[0]["staging_graph"]["value"])
 
-      for path_props in prop_paths_res["results"]["bindings"]:
-        # Delete obsolete entities first
-        while True:
+            elif "data_dump" in dataset_versions[0].keys():
+                temp_graph = temp_graph_cache.acquire(
+                    dataset_versions[0]["data_dump"]["value"],
+                    dataset_versions[0].get("creation_date", {}).get("value"),
+                )
+                graphs.add(temp_graph)
+                temp_graphs.append(temp_graph)
+                # this should only load in the data, diffing is done by unification itself.
+            else:
+                pass
+                # TODO: return error?
+    except Exception:
+        # the caller only releases the graphs of a complete build
+        release_temp_graphs(temp_graphs)
+        raise
+
+    return list(graphs), temp_graphs
+
+def release_temp_graphs(temp_graphs):
+    for temp_graph in temp_graphs:
+        temp_graph_cache.release(temp_graph)
+
+def insert_unification_batch(batch_res):
+    g = sparql_construct_res_to_graph(batch_res)
+    for query_string in serialize_graph_to_sparql(g, VOCAB_GRAPH):
+        update_sudo(query_string)
+
+def delete_obsolete_path(path_props, vocab_sources, dataset_graphs, batch_size):
+    source_filter = path_props.get("sourceFilter", {}).get("value") or ''
+    while True:
+        with batch_size.measure() as size:
             delete_subjects_batch_qs = get_delete_subjects_batch(
                 dest_class=path_props["destClass"]["value"],
                 source_datasets=[
@@ -118,10 +157,10 @@ def run_vocab_unification(vocab_uri):
                 ],
                 source_class=path_props["sourceClass"]["value"],
                 source_path_string=path_props["sourcePathString"]["value"],  # !
-                source_filter=path_props.get("sourceFilter", {}).get("value") or '',
+                source_filter=source_filter,
                 source_graphs=dataset_graphs,
                 target_graph=VOCAB_GRAPH,
-                batch_size=UNIFICATION_BATCH_SIZE,
+                batch_size=size,
              )
             batch_res = query_sudo(delete_subjects_batch_qs)
             if not batch_res["results"]["bindings"]:
@@ -135,12 +174,13 @@ def run_vocab_unification(vocab_uri):
                 target_graph=VOCAB_GRAPH
             )
             update_sudo(delete_subjects_qs)
-            if(SLEEP_MS_BETWEEN_QUERIES_UNIFY and SLEEP_MS_BETWEEN_QUERIES_UNIFY >0 ):
-              logger.info(f"Waiting for {SLEEP_MS_BETWEEN_QUERIES_UNIFY} ms")
-              time.sleep(SLEEP_MS_BETWEEN_QUERIES_UNIFY / 1000)
 
-        # Then unify new ones
-        while True:
+def unify_path_rescan(path_props, vocab_sources, dataset_graphs, batch_size, subjects_filter=""):
+    # Every batch re-runs the full FILTER NOT EXISTS scan and only takes the first
+    # results. Kept for comparison with the keyset mode, the diff mode unifies its blank node subjects with it.
+    source_filter = (path_props.get("sourceFilter", {}).get("value") or '') + "\n" + subjects_filter
+    while True:
+        with batch_size.measure() as size:
             get_batch_qs = get_ununified_batch(
                 dest_class=path_props["destClass"]["value"],
                 dest_predicate=path_props["destPath"]["value"],
@@ -150,10 +190,10 @@ def run_vocab_unification(vocab_uri):
                 ],
                 source_class=path_props["sourceClass"]["value"],
                 source_path_string=path_props["sourcePathString"]["value"],  # !
-                source_filter=path_props.get("sourceFilter", {}).get("value") or '',
+                source_filter=source_filter,
                 source_graphs=dataset_graphs,
                 target_graph=VOCAB_GRAPH,
-                batch_size=UNIFICATION_BATCH_SIZE,
+                batch_size=size,
             )
             # We might want to dump intermediary unified content to file before committing to store
             batch_res = query_sudo(get_batch_qs)
@@ -162,17 +202,161 @@ def run_vocab_unification(vocab_uri):
                 break
             else:
                 logger.info("Running unification batch")
-            g = sparql_construct_res_to_graph(batch_res)
-            for query_string in serialize_graph_to_sparql(g, VOCAB_GRAPH):
-                update_sudo(query_string)
-            if(SLEEP_MS_BETWEEN_QUERIES_UNIFY and SLEEP_MS_BETWEEN_QUERIES_UNIFY > 0 ):
-              logger.info(f"Waiting for {SLEEP_MS_BETWEEN_QUERIES_UNIFY} ms")
-              time.sleep(SLEEP_MS_BETWEEN_QUERIES_UNIFY / 1000)
+            insert_unification_batch(batch_res)
+
+def read_unified_values_window(vocab_uri, dest_class, dest_predicate, source_datasets,
+                               after_subject, up_to_subject, batch_size):
+    """ Yield (unified subject, value or None) pages of a keyset window, see `get_unified_values_window` """
+    while True:
+        with batch_size.measure() as size:
+            bindings = query_sudo(get_unified_values_window(
+                dest_class=dest_class,
+                dest_predicate=dest_predicate,
+                source_datasets=source_datasets,
+                target_graph=VOCAB_GRAPH,
+                after_subject=after_subject,
+                up_to_subject=up_to_subject,
+                batch_size=size,
+            ))["results"]["bindings"]
+        # subjects another vocabulary unified from the same datasets aren't ours to compare
+        yield [
+            (URIRef(b["s"]["value"]), json_to_term(b["o"]) if "o" in b else None)
+            for b in bindings
+            if b["s"]["value"] == unified_subject_uri(vocab_uri, b["sourceSubject"]["value"])
+        ]
+        if len(set(b["sourceSubject"]["value"] for b in bindings)) < size:
+            break
+        after_subject = bindings[-1]["sourceSubject"]["value"]
+
+def unify_keyset_window(vocab_uri, source_values, source_datasets, dest_class, dest_predicate,
+                        after_subject, up_to_subject, batch_size, writer):
+    """
+    Bring the unification of the source subjects in the window (after, up to] in line with
+    `source_values`, the (source subject, value) pairs of the window. Unified subjects whose
+    source subject no longer has a value for the path are deleted, as are the values that changed.
+    """
+    expected = {}  # unified subject -> (source subject, value) pairs
+    for source_subject, source_value in source_values:
+        expected.setdefault(URIRef(unified_subject_uri(vocab_uri, source_subject)), set()).add((source_subject, source_value))
+    expected_values = set((s, value) for s, pairs in expected.items() for _, value in pairs)
+    unified_values = set()
+    for unified in read_unified_values_window(vocab_uri, dest_class, dest_predicate, source_datasets,
+                                              after_subject, up_to_subject, batch_size):
+        obsolete = sorted(set(s for s, _ in unified if s not in expected))
+        for i in range(0, len(obsolete), 100):
+            update_sudo(delete_subjects(obsolete[i:i + 100], VOCAB_GRAPH))
+        stale = [(s, dest_predicate, value) for (s, value) in unified
+                 if s in expected and value is not None and (s, value) not in expected_values]
+        unified_values.update((s, value) for (s, value) in unified if (s, value) in expected_values)
+        if obsolete or stale:
+            logger.info(f"Deleting {len(obsolete)} obsolete subjects and {len(stale)} changed values")
+        writer.write(batched(stale, BATCH_SIZE), VOCAB_GRAPH, "DELETE")
+
+    g = Graph()
+    datasets = [URIRef(d) for d in source_datasets]
+    for s, pairs in expected.items():
+        for source_subject, source_value in pairs:
+            if (s, source_value) not in unified_values:
+                add_unified_triples(g, vocab_uri, datasets, dest_class, dest_predicate, source_subject, source_value)
+    if len(g):
+        writer.write(batched(g, BATCH_SIZE), VOCAB_GRAPH)
+    return len(g)
+
+def unify_path_keyset(vocab_uri, path_props, vocab_sources, dataset_graphs, batch_size):
+    # Walk the (source subject, source value) pairs in a stable subject order, each page
+    # starting after the last subject of the previous one. Every page is compared with the unified
+    # values derived from the source subjects in the same window, see `unify_keyset_window`.
+    # Only IRI subjects are unified: the unified triples of a blank node subject would point at a
+    # new blank node once inserted, so they can never be recognized as unified on a next run.
+    source_datasets = [vocab_source["sourceDataset"]["value"] for vocab_source in vocab_sources]
+    dest_class = URIRef(path_props["destClass"]["value"])
+    dest_predicate = URIRef(path_props["destPath"]["value"])
+
+    page = 0
+    last_subject = None
+    # pages are written in the background while the next page is read, slow writes shrink the pages
+    with SparqlWriter(update_sudo, latency=batch_size) as writer:
+        for source_values in read_source_values(path_props, dataset_graphs, batch_size):
+            page += 1
+            up_to_subject = source_values[-1][0]
+            written = unify_keyset_window(vocab_uri, source_values, source_datasets, dest_class, dest_predicate,
+                                          last_subject, up_to_subject, batch_size, writer)
+            if written:
+                logger.info(f"Running unification page {page} ({written} triples)")
+            else:
+                logger.debug(f"Unification page {page} already up to date")
+            last_subject = up_to_subject
+        # what's unified from subjects after the last source subject is obsolete
+        unify_keyset_window(vocab_uri, [], source_datasets, dest_class, dest_predicate,
+                            last_subject, None, batch_size, writer)
+    logger.info(f"Finished unification after {page} pages")
+
+def run_vocab_unification(vocab_uri, source_subjects=None, task_uris=()):
+    """
+    Unify the vocabulary, or only the given source subjects (always as a diff, see `run_diff_unification`).
+    The batch statistics are linked to the `task_uris` the unification runs for.
+    """
+    vocab_sources = query_sudo(get_vocabulary(vocab_uri, VOCAB_GRAPH))["results"][
+        "bindings"
+    ]
+
+    if not vocab_sources:
+        raise Exception(f"Vocab {vocab_uri} does not have a mapping. Unification cancelled.")
+
+    datasets = [vocab_source["sourceDataset"]["value"] for vocab_source in vocab_sources]
+
+    batch_size = AdaptiveBatchSize(
+        initial=UNIFICATION_BATCH_SIZE,
+        minimum=UNIFICATION_BATCH_SIZE_MIN,
+        maximum=UNIFICATION_BATCH_SIZE_MAX,
+        target_latency_ms=UNIFICATION_TARGET_LATENCY_MS,
+        max_backoff_ms=UNIFICATION_MAX_BACKOFF_MS,
+    )
+    dataset_graphs, temp_graphs = build_temp_graphs(datasets)
+    try:
+      prop_paths_qs = get_property_paths(
+          vocab_sources[0]["mappingShape"]["value"], VOCAB_GRAPH
+      )
+      prop_paths_res = query_sudo(prop_paths_qs)
+
+      if UNIFICATION_MODE == "diff" or source_subjects is not None:
+          run_diff_unification(
+              vocab_uri=vocab_uri,
+              source_datasets=datasets,
+              prop_paths=prop_paths_res["results"]["bindings"],
+              source_graphs=dataset_graphs,
+              target_graph=VOCAB_GRAPH,
+              batch_size=batch_size,
+              source_subjects=source_subjects,
+          )
+          if source_subjects is None:
+              # the diff only covers IRI subjects
+              for path_props in prop_paths_res["results"]["bindings"]:
+                  unify_path_rescan(path_props, vocab_sources, dataset_graphs, batch_size, BLANK_NODE_SUBJECTS_FILTER)
+          return vocab_uri
+
+      for path_props in prop_paths_res["results"]["bindings"]:
+        if UNIFICATION_MODE == "keyset":
+            # deletes the obsolete entities page by page as well
+            unify_path_keyset(vocab_uri, path_props, vocab_sources, dataset_graphs, batch_size)
+            continue
+
+        # Delete obsolete entities first
+        delete_obsolete_path(path_props, vocab_sources, dataset_graphs, batch_size)
+
+        # Then unify new ones
+        unify_path_rescan(path_props, vocab_sources, dataset_graphs, batch_size)
     except Exception as e:
         logger.error(f"Error during vocab {vocab_uri} unification: {e}")
         raise e
     finally:
-        drop_graph(temp_named_graph)
+        release_temp_graphs(temp_graphs)
+        logger.info(f"Unification batches for {vocab_uri}: {batch_size.summary()}")
+        if batch_size.samples:
+            try:
+                update_sudo(write_unification_statistics(vocab_uri, batch_size.samples, TASKS_GRAPH, task_uris))
+            except Exception as e:
+                logger.warning(f"Failed to record unification statistics for {vocab_uri}: {e}")
     return vocab_uri
 
 @app.route("/filter-count/", methods=('POST',))
@@ -182,6 +366,13 @@ def filter_count():
     source_path_string= request.form['source_path_string']
     source_filter: str = request.form['filter']
 
+    if request.form.get('inline') == 'true':
+        result = run_filter_count_inline(dataset_uri, source_class, source_path_string, source_filter)
+        if result:
+            return {
+                'meta': result
+            }
+
     task_uuid, qs = start_filter_count_task(
         dataset_uri=dataset_uri,
         source_class=source_class,
@@ -196,6 +387,49 @@ def filter_count():
         }
     }
 
+def filter_count_warning(source_filter):
+    from unification import UNUNIFIED_BATCH_TEMPLATE_VARS
+    shadowed_vars = [var for var in UNUNIFIED_BATCH_TEMPLATE_VARS if source_filter.find(var) != -1]
+
+    warning = None
+    if not shadowed_vars == []:
+        warning = f"Found vars in your filter that overlap with internally used vars. This could lead to unexpected behaviour: {', '.join(shadowed_vars)}"
+    return warning
+
+def run_filter_count_inline(dataset_uri, source_class, source_path_string, source_filter):
+    """
+    Count for a graph-based dataset within the request, without writing a task.
+    Returns None when the dataset first needs to be loaded from its dump, or when the count
+    doesn't finish within FILTER_COUNT_INLINE_TIMEOUT_S, in which case a task is needed.
+    """
+    from SPARQLWrapper.SPARQLExceptions import EndPointInternalError, QueryBadFormed
+
+    dataset_versions = query_sudo(get_dataset(dataset_uri, VOCAB_GRAPH))["results"]["bindings"]
+    if not dataset_versions or "dataset_graph" not in dataset_versions[0].keys():
+        return None
+
+    count_query = count_ununified(
+            source_class, source_path_string, source_filter, [dataset_versions[0]["dataset_graph"]["value"]]
+        )
+    try:
+        filter_res = query_sudo(count_query, timeout=FILTER_COUNT_INLINE_TIMEOUT_S)
+    except requests.Timeout:
+        logger.info(f"Inline filter count for <{dataset_uri}> timed out, scheduling a task")
+        return None
+    except (EndPointInternalError, QueryBadFormed) as e:
+        return {
+            'query': count_query.strip(),
+            'valid': False,
+            'error': str(e),
+        }
+
+    return {
+        'query': count_query.strip(),
+        'valid': True,
+        'count': int(filter_res["results"]["bindings"][0]["count"]["value"]),
+        'warning': filter_count_warning(source_filter),
+    }
+
 def run_filter_count_task(input):
     input_qs = get_filter_count_input(input)
     input_res = query_sudo(input_qs)
@@ -206,23 +440,18 @@ def run_filter_count_task(input):
     source_path_string = input_bindings["sourcePathString"]["value"]
     source_filter = input_bindings["sourceFilter"]["value"]
 
-    from unification import UNUNIFIED_BATCH_TEMPLATE_VARS
-    shadowed_vars = [var for var in UNUNIFIED_BATCH_TEMPLATE_VARS if source_filter.find(var) != -1]
-
-    warning = None
-    if not shadowed_vars == []:
-        warning = f"Found vars in your filter that overlap with internally used vars. This could lead to unexpected behaviour: {', '.join(shadowed_vars)}"
+    warning = filter_count_warning(source_filter)
 
-    dataset_graphs, temp_named_graph = build_temp_graphs([dataset_uri])
+    dataset_graphs, temp_graphs = build_temp_graphs([dataset_uri])
 
-    from SPARQLWrapper.SPARQLExceptions import EndPointInternalError
+    from SPARQLWrapper.SPARQLExceptions import EndPointInternalError, QueryBadFormed
 
     count_query = count_ununified(
             source_class, source_path_string, source_filter, dataset_graphs
         )
     try:
         filter_res = query_sudo(count_query)
-    except (EndPointInternalError) as e:
+    except (EndPointInternalError, QueryBadFormed) as e:
         output_uri, qs = write_filter_count_output(
                 graph=DATA_GRAPH,
                 dataset_uri=dataset_uri,
@@ -233,7 +462,7 @@ def run_filter_count_task(input):
         update_sudo(qs)
         return output_uri
     finally:
-        drop_graph(temp_named_graph)
+        release_temp_graphs(temp_graphs)
         update_sudo(remove_filter_count_input(input_uri=input, graph=DATA_GRAPH))
 
     count = filter_res["results"]["bindings"][0]["count"]["value"]
@@ -263,77 +492,172 @@ def delete_vocabulary(vocab_uuid: str):
     }
 
 
+TASK_RUNNERS = {
+    CONT_UN_OPERATION: lambda sources, tasks: [run_vocab_unification(sources[0], task_uris=tasks)],
+    FILTER_COUNT_OPERATION: lambda sources, tasks: [run_filter_count_task(sources[0])],
+    VOCAB_DELETE_OPERATION: lambda sources, tasks: [run_vocab_delete_operation(sources[0])],
+    VOCAB_DELETE_WAIT_OPERATION: lambda sources, tasks: [run_vocab_delete_wait_operation(sources[0])],
+}
+
+# operations whose input is a vocabulary, and thus need to be serialized per vocabulary
+VOCAB_OPERATIONS = (CONT_UN_OPERATION, VOCAB_DELETE_OPERATION, VOCAB_DELETE_WAIT_OPERATION)
+
+worker_pool = TaskWorkerPool({
+    CONT_UN_OPERATION: UNIFICATION_CONCURRENCY,
+    FILTER_COUNT_OPERATION: FILTER_COUNT_CONCURRENCY,
+    VOCAB_DELETE_OPERATION: VOCAB_DELETE_CONCURRENCY,
+    VOCAB_DELETE_WAIT_OPERATION: VOCAB_DELETE_WAIT_CONCURRENCY,
+})
+
+queue_wait_stats = QueueWaitStats()
+
 running_tasks_lock = threading.Lock()
+dispatch_requested = threading.Event()
+# set by the first LDES delta, until then scheduled LDES refreshes are still unified completely
+ldes_deltas_received = threading.Event()
 
 
-def run_scheduled_tasks():
-    # run this function only once at a time to avoid overloading the service
-    acquired = running_tasks_lock.acquire(blocking=False)
+def dispatch_task(task_uri, task_operation):
+    """ Start a scheduled task in a worker thread if the pool admits it, returns the tasks it runs for """
+    inputs_res =  query_sudo(get_input_contents_task(task_uri, TASKS_GRAPH))
+    inputs = binding_results(inputs_res, "content")
+    key = inputs[0] if task_operation in VOCAB_OPERATIONS and inputs else None
+    if not worker_pool.try_acquire(task_operation, key):
+        return []
+
+    def on_finished():
+        worker_pool.release(task_operation, key)
+        # tasks that had to wait for this one can start now
+        run_scheduled_tasks()
+
+    try:
+        similar_tasks_res = query_sudo(find_same_scheduled_tasks(task_operation, inputs,  TASKS_GRAPH))
+        similar_tasks = binding_results(similar_tasks_res, "uri")
+        logger.debug(f"Running task {task_uri}, operation {task_operation}")
+        logger.debug(f"Updating at the same time: {' | '.join(similar_tasks)}")
+        runner = TASK_RUNNERS[task_operation]
+        if task_operation == CONT_UN_OPERATION:
+            unchanged_tasks = binding_results(query_sudo(find_source_unchanged_tasks(similar_tasks, TASKS_GRAPH)), "uri")
+            if set(similar_tasks) <= set(unchanged_tasks):
+                # downloads that found the datasets unchanged after a successful unification, nothing to unify
+                logger.info(f"Skipping unification of {inputs[0]}, its source datasets are unchanged")
+                runner = lambda sources, tasks: sources
+            elif INCREMENTAL_LDES_UNIFICATION and set(similar_tasks) <= set(binding_results(
+                    query_sudo(find_incrementally_unified_tasks(similar_tasks, TASKS_GRAPH)), "uri")):
+                if ldes_deltas_received.is_set():
+                    logger.info(f"Skipping unification of {inputs[0]}, its LDES changes are unified from deltas")
+                    runner = lambda sources, tasks: sources
+                else:
+                    logger.warning(f"INCREMENTAL_LDES_UNIFICATION is enabled, but no LDES deltas were received "
+                                   f"since startup. Do the ldes-delta rules in config/delta/rules.js match its LDES members? "
+                                   f"Unifying {inputs[0]} completely.")
+        run_tasks(
+            similar_tasks,
+            TASKS_GRAPH,
+            runner,
+            query_sudo,
+            update_sudo,
+            thread=True,
+            on_finished=on_finished,
+        )
+    except Exception:
+        worker_pool.release(task_operation, key)
+        raise
+    return similar_tasks
 
-    if not acquired:
-        logger.debug("Already running `run_tasks`")
-        return
 
+def record_queue_wait(priority, created):
     try:
-        while True:
-            task_q = find_actionable_task_of_type(
-                [CONT_UN_OPERATION, FILTER_COUNT_OPERATION, VOCAB_DELETE_OPERATION, VOCAB_DELETE_WAIT_OPERATION],
-                TASKS_GRAPH)
+        created = datetime.datetime.fromisoformat(created.replace("Z", "+00:00"))
+    except ValueError:
+        logger.debug(f"Can't parse task creation date {created}")
+        return
+    queue_wait_stats.record(priority, (datetime.datetime.now(created.tzinfo) - created).total_seconds())
+
+
+def dispatch_scheduled_tasks():
+    while True:
+        started = set()
+        waiting = 0
+        # every round starts from the highest priority class, so that interactive tasks
+        # scheduled in the meantime go before the remaining lower priority ones
+        for priority, operations in PRIORITY_CLASSES:
+            task_q = find_actionable_tasks_of_type(operations, TASKS_GRAPH, SCHEDULED_TASKS_PAGE_SIZE)
             task_res = query_sudo(task_q)
-            if task_res["results"]["bindings"]:
-                (task_uri, task_operation) = binding_results(
-                    task_res, ("uri", "operation")
-                )[0]
-            else:
-                logger.debug("No more tasks found")
-                return
-            inputs_res =  query_sudo(get_input_contents_task(task_uri, TASKS_GRAPH))
-            inputs = binding_results(inputs_res, "content")
-            similar_tasks_res = query_sudo(find_same_scheduled_tasks(task_operation, inputs,  TASKS_GRAPH))
-            similar_tasks = binding_results(similar_tasks_res, "uri")
-            if task_operation == CONT_UN_OPERATION:
-                logger.debug(f"Running task {task_uri}, operation {task_operation}")
-                logger.debug(f"Updating at the same time: {' | '.join(similar_tasks)}")
-                run_tasks(
-                    similar_tasks,
-                    TASKS_GRAPH,
-                    lambda sources: [run_vocab_unification(sources[0])],
-                    query_sudo,
-                    update_sudo,
-                )
-            elif task_operation == FILTER_COUNT_OPERATION:
-                logger.debug(f"Running task {task_uri}, operation {task_operation}")
-                logger.debug(f"Updating at the same time: {' | '.join(similar_tasks)}")
-                run_tasks(
-                    similar_tasks,
-                    TASKS_GRAPH,
-                    lambda sources: [run_filter_count_task(sources[0])],
-                    query_sudo,
-                    update_sudo,
-                )
-            elif task_operation == VOCAB_DELETE_OPERATION:
-                logger.debug(f"Running task {task_uri}, operation {task_operation}")
-                logger.debug(f"Updating at the same time: {' | '.join(similar_tasks)}")
-                run_tasks(
-                    similar_tasks,
-                    TASKS_GRAPH,
-                    lambda sources: [run_vocab_delete_operation(sources[0])],
-                    query_sudo,
-                    update_sudo,
-                )
-            elif task_operation == VOCAB_DELETE_WAIT_OPERATION:
-                logger.debug(f"Running task {task_uri}, operation {task_operation}")
-                logger.debug(f"Updating at the same time: {' | '.join(similar_tasks)}")
-                run_tasks(
-                    similar_tasks,
-                    TASKS_GRAPH,
-                    lambda sources: [run_vocab_delete_wait_operation(sources[0])],
-                    query_sudo,
-                    update_sudo,
-                    thread=True
-                )
+            scheduled_tasks = list(dict.fromkeys(binding_results(task_res, ("uri", "operation", "created"))))
+            for (task_uri, task_operation, created) in scheduled_tasks:
+                if task_uri in started:  # already started along with a similar task
+                    continue
+                similar_tasks = dispatch_task(task_uri, task_operation)
+                if similar_tasks:
+                    started.update(similar_tasks)
+                    record_queue_wait(priority, created)
+                else:
+                    waiting += 1
+        # started tasks (and the similar tasks they run for) are no longer scheduled,
+        # so the next round only sees the ones that had to wait
+        if not started:
+            logger.debug(f"{waiting} scheduled tasks are waiting for a running task")
+            return
+
+
+@app.route("/queue-wait", methods=["GET"])
+def get_queue_wait():
+    return queue_wait_stats.summary()
+
+
+def run_scheduled_tasks():
+    # Only one thread dispatches at a time. Requests arriving meanwhile are remembered,
+    # so the dispatching thread does another round for them.
+    dispatch_requested.set()
+    while dispatch_requested.is_set():
+        if not running_tasks_lock.acquire(blocking=False):
+            logger.debug("Already running `run_tasks`")
+            return
+        try:
+            dispatch_requested.clear()
+            dispatch_scheduled_tasks()
+        finally:
+            running_tasks_lock.release()
+
+
+def flush_ldes_changes(vocab_uri, subjects):
+    """ Re-unify the changed subjects of a vocabulary, unless a task is running for it """
+    if not worker_pool.try_acquire(CONT_UN_OPERATION, vocab_uri):
+        return False
+    try:
+        run_vocab_unification(vocab_uri, subjects)
     finally:
-        running_tasks_lock.release()
+        worker_pool.release(CONT_UN_OPERATION, vocab_uri)
+        run_scheduled_tasks()
+    return True
+
+
+ldes_delta_buffer = LdesDeltaBuffer(LDES_DELTA_FLUSH_DELAY_S, flush_ldes_changes)
+if INCREMENTAL_LDES_UNIFICATION:
+    logger.warning("INCREMENTAL_LDES_UNIFICATION is enabled: scheduled LDES refreshes are only unified completely "
+                   "until the first delta arrives on /ldes-delta. Make sure the ldes-delta rules in "
+                   "config/delta/rules.js match the LDES members.")
+
+
+@app.route("/ldes-delta", methods=["POST"])
+def process_ldes_delta():
+    if not INCREMENTAL_LDES_UNIFICATION:
+        return "", 204
+    ldes_deltas_received.set()
+    subjects = changed_subjects_by_graph(request.json)
+    if not subjects:
+        return "", 204
+    # most changes are in graphs that aren't LDES dataset graphs
+    vocabs_res = query_sudo(get_graph_vocabularies(subjects.keys(), VOCAB_GRAPH))
+    for (dataset_graph, vocab) in binding_results(vocabs_res, ("datasetGraph", "vocab")):
+        ldes_delta_buffer.add(vocab, subjects[dataset_graph])
+    return "", 200
+
+
+@app.route("/ldes-delta", methods=["GET"])
+def get_ldes_delta():
+    return ldes_delta_buffer.pending()
 
 
 @app.route("/delta", methods=["POST"])
@@ -0,0 +1,69 @@
+import threading
+from collections import defaultdict
+
+from helpers import logger
+
+
+class TaskWorkerPool:
+    """
+    Admission control for tasks running in their own thread.
+    Every operation has a limited number of slots, and tasks with the same key (the vocabulary
+    they work on) hold a shared lock, so that independent vocabularies are processed in
+    parallel while jobs on the same vocabulary stay serialized.
+    Acquiring never blocks: a task that can't start now stays scheduled and is picked up by
+    a later dispatch.
+    """
+
+    def __init__(self, concurrency):
+        self.slots = {
+            operation: threading.BoundedSemaphore(limit)
+            for operation, limit in concurrency.items()
+        }
+        self.key_locks = defaultdict(threading.Lock)
+        self.lock = threading.Lock()
+
+    def key_lock(self, key):
+        with self.lock:
+            return self.key_locks[key]
+
+    def try_acquire(self, operation, key):
+        if not self.slots[operation].acquire(blocking=False):
+            logger.debug(f"No free slot for {operation}")
+            return False
+        if key and not self.key_lock(key).acquire(blocking=False):
+            logger.debug(f"Another task is running for <{key}>")
+            self.slots[operation].release()
+            return False
+        return True
+
+    def release(self, operation, key):
+        if key:
+            self.key_lock(key).release()
+        self.slots[operation].release()
+
+
+class QueueWaitStats:
+    """ Time tasks spent scheduled before they were started, per priority class """
+
+    def __init__(self):
+        self.waits = defaultdict(lambda: {"tasks": 0, "total_wait_s": 0.0, "max_wait_s": 0.0})
+        self.lock = threading.Lock()
+
+    def record(self, priority, wait_seconds):
+        logger.info(f"Starting {priority} task after waiting {round(wait_seconds, 1)} s")
+        with self.lock:
+            waits = self.waits[priority]
+            waits["tasks"] += 1
+            waits["total_wait_s"] += wait_seconds
+            waits["max_wait_s"] = max(waits["max_wait_s"], wait_seconds)
+
+    def summary(self):
+        with self.lock:
+            return {
+                priority: {
+                    "tasks": waits["tasks"],
+                    "mean_wait_s": round(waits["total_wait_s"] / waits["tasks"], 1),
+                    "max_wait_s": round(waits["max_wait_s"], 1),
+                }
+                for priority, waits in self.waits.items()
+            }
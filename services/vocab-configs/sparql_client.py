@@ -0,0 +1,114 @@
+import os
+import re
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from SPARQLWrapper.SPARQLExceptions import (
+    EndPointInternalError,
+    EndPointNotFound,
+    QueryBadFormed,
+    Unauthorized,
+    URITooLong,
+)
+
+# Connections to the triplestore are kept open and reused across queries, instead of
+# opening a new connection for every (small) batch query. All threads share one pool of at
+# most SPARQL_POOL_SIZE connections per host, threads wait for a free connection beyond that.
+SPARQL_POOL_SIZE = int(os.environ.get("SPARQL_POOL_SIZE", "10"))
+
+SPARQL_RESULTS_JSON = "application/sparql-results+json,application/json"
+
+HTTP_ERRORS = {
+    400: QueryBadFormed,
+    401: Unauthorized,
+    404: EndPointNotFound,
+    414: URITooLong,
+    500: EndPointInternalError,
+}
+
+COMMENT_LINE = re.compile(r"^\s*#.*$", re.MULTILINE)
+PROLOGUE_DECLARATION = re.compile(r"^\s*(PREFIX\s+[^\s:]*:\s*<[^>]*>|BASE\s*<[^>]*>)", re.IGNORECASE)
+UPDATE_KEYWORD = re.compile(r"^\s*(INSERT|DELETE|WITH|LOAD|CLEAR|CREATE|DROP|COPY|MOVE|ADD)\b", re.IGNORECASE)
+
+
+def new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=SPARQL_POOL_SIZE, pool_maxsize=SPARQL_POOL_SIZE, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+# One session for all threads: its connection pool is thread-safe, and the session state
+# that isn't (cookies, default headers) is never changed after creation. Per-thread sessions
+# would leave a pool of keep-alive connections behind for every short-lived worker thread.
+session = None
+session_lock = threading.Lock()
+
+
+def get_session():
+    global session
+    with session_lock:
+        if session is None:
+            session = new_session()
+        return session
+
+
+def is_update_query(query_string):
+    """ Whether a query is a SPARQL update, judged by its first keyword after the prologue """
+    query_string = COMMENT_LINE.sub("", query_string)
+    declaration = PROLOGUE_DECLARATION.match(query_string)
+    while declaration:
+        query_string = query_string[declaration.end():]
+        declaration = PROLOGUE_DECLARATION.match(query_string)
+    return bool(UPDATE_KEYWORD.match(query_string))
+
+
+def raise_for_sparql_status(res):
+    """ Raise the SPARQLWrapper exception type matching an error response, to keep existing error handling working """
+    if res.ok:
+        return
+    if res.status_code in HTTP_ERRORS:
+        raise HTTP_ERRORS[res.status_code](res.content)
+    res.raise_for_status()
+
+
+class SparqlClient:
+    """ SPARQL protocol client for a single endpoint. Holds no request state, so it can be shared between threads """
+
+    def __init__(self, endpoint, headers=None):
+        self.endpoint = endpoint
+        self.headers = headers or {}
+
+    def request(self, data, accept=SPARQL_RESULTS_JSON, stream=False, timeout=None):
+        res = get_session().post(
+            self.endpoint,
+            data=data,
+            headers={**self.headers, "Accept": accept},
+            stream=stream,
+            timeout=timeout,
+        )
+        raise_for_sparql_status(res)
+        return res
+
+    def get(self, params, accept, stream=False):
+        """ GET request, e.g. to read a graph from a Graph Store HTTP Protocol endpoint """
+        res = get_session().get(
+            self.endpoint,
+            params=params,
+            headers={**self.headers, "Accept": accept},
+            stream=stream,
+        )
+        raise_for_sparql_status(res)
+        return res
+
+    def query(self, query_string, timeout=None):
+        return self.request({"query": query_string}, timeout=timeout).json()
+
+    def update(self, query_string):
+        self.request({"update": query_string})
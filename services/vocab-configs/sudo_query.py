@@ -2,74 +2,58 @@ import datetime
 import os
 import time
 
-from SPARQLWrapper import SPARQLWrapper, JSON
 from helpers import logger
+from sparql_client import SparqlClient, is_update_query
+from sparql_retry import call_with_retries, SPARQL_MAX_RETRIES
 
-sparqlQuery = SPARQLWrapper(os.environ.get("MU_SPARQL_ENDPOINT"))
-sparqlQuery.addCustomHttpHeader("mu-auth-sudo", "true")
-sparqlUpdate = SPARQLWrapper(os.environ.get("MU_SPARQL_UPDATEPOINT"), returnFormat=JSON)
-sparqlUpdate.method = "POST"
-sparqlUpdate.addCustomHttpHeader("mu-auth-sudo", "true")
+sparqlQuery = SparqlClient(os.environ.get("MU_SPARQL_ENDPOINT"), {"mu-auth-sudo": "true"})
+sparqlUpdate = SparqlClient(os.environ.get("MU_SPARQL_UPDATEPOINT"), {"mu-auth-sudo": "true"})
 
-authSparqlUpdate = SPARQLWrapper(os.environ.get("MU_AUTH_ENDPOINT"), returnFormat=JSON)
-authSparqlUpdate.method = "POST"
-authSparqlUpdate.addCustomHttpHeader("mu-auth-sudo", "true")
+authSparqlUpdate = SparqlClient(os.environ.get("MU_AUTH_ENDPOINT"), {"mu-auth-sudo": "true"})
 
-sparqlQueryDirectUpdate = SPARQLWrapper(os.environ.get("MU_SPARQL_DIRECT_UPDATEPOINT"), returnFormat= JSON)
-sparqlQueryDirectUpdate.method = "POST"
+sparqlQueryDirectUpdate = SparqlClient(os.environ.get("MU_SPARQL_DIRECT_UPDATEPOINT"))
 
 def query_sudo(the_query):
     """Execute the given SPARQL query (select/ask/construct)on the triple store and returns
     the results in the given returnFormat (JSON by default)."""
     logger.debug("execute query: \n" + the_query)
-    sparqlQuery.setQuery(the_query)
     try:
-        return sparqlQuery.query().convert()
+        return sparqlQuery.query(the_query)
     except Exception as e:
         logger.error("Query failed: \n" + the_query)
         logger.error(f"Query error: {str(e)}")
         raise
 
-def direct_update_triplestore(the_query, attempt=0, max_retries=5):
-    execute_update_query(sparqlQueryDirectUpdate, the_query, attempt, max_retries)
+def direct_update_triplestore(the_query, max_retries=SPARQL_MAX_RETRIES):
+    execute_update_query(sparqlQueryDirectUpdate, the_query, max_retries)
 
-def update_sudo(the_query, attempt=0, max_retries=5):
+def update_sudo(the_query, max_retries=SPARQL_MAX_RETRIES):
     """Execute the given update SPARQL query on the triple store,
     if the given query is no update query, nothing happens."""
-    execute_update_query(sparqlUpdate, the_query, attempt, max_retries)
+    execute_update_query(sparqlUpdate, the_query, max_retries)
 
-def execute_update_query(querier, the_query, attempt=0, max_retries=5):
-    querier.setQuery(the_query)
-    if querier.isSparqlUpdateRequest():
+def execute_update_query(querier, the_query, max_retries=SPARQL_MAX_RETRIES):
+    if is_update_query(the_query):
         try:
             start = time.time()
             logger.debug(f"started query at {datetime.datetime.now()}")
             logger.debug("execute query: \n" + the_query)
 
-            querier.query()
+            call_with_retries(lambda: querier.update(the_query), max_retries)
 
             logger.debug(f"query took {time.time() - start} seconds")
         except Exception as e:
             logger.error("Update query failed: \n" + the_query)
             logger.error(f"Update query error: {str(e)}")
-            if attempt <= max_retries:
-                wait_time = 0.6 * attempt + 30
-                logger.warn(f"Retrying after {wait_time} seconds [{attempt}/{max_retries}]")
-                time.sleep(wait_time)
-
-                execute_update_query(querier, the_query, attempt + 1, max_retries)
-            else:
-                logger.error("Max attempts reached for query. Skipping.")
-                raise e
+            raise
                 
 def auth_update_sudo(the_query):
     """Execute the given update SPARQL query on the triple store,
     if the given query is no update query, nothing happens."""
-    authSparqlUpdate.setQuery(the_query)
-    if authSparqlUpdate.isSparqlUpdateRequest():
+    if is_update_query(the_query):
         try:
             start = time.time()
-            authSparqlUpdate.query()
+            call_with_retries(lambda: authSparqlUpdate.update(the_query))
             logger.debug(f"query took {time.time() - start} seconds")
         except Exception as e:
             logger.error("Auth update query failed: \n" + the_query)
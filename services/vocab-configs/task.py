@@ -8,6 +8,7 @@ from escape_helpers import (
 )
 from helpers import generate_uuid, logger
 import traceback
+from sparql_retry import RetryBudget, retry_budget, SPARQL_JOB_RETRY_BUDGET
 
 MU_APPLICATION_GRAPH = os.environ.get("MU_APPLICATION_GRAPH")
 
@@ -222,7 +223,8 @@ def run_task(task_uri, graph, runner_func, sparql_query, sparql_update):
 
     sparql_update(update_task_status(task_uri, STATUS_BUSY, graph))
     try:
-        generated = runner_func(used)
+        with retry_budget(RetryBudget(SPARQL_JOB_RETRY_BUDGET)):
+            generated = runner_func(used)
         if generated:
             logger.info(
                 f"Running task <{task_uri}> with source {used} generated {generated}"
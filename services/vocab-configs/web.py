@@ -21,7 +21,7 @@ from vocabularies import (
     vocab_uris_from_graph,
 )
 
-from rdflib import Graph, URIRef, Literal
+from rdflib import URIRef, Literal
 from rdflib.void import generateVoID
 
 from file import file_to_shared_uri, shared_uri_to_path
@@ -31,7 +31,8 @@ from task import (
     run_task,
     start_download_task,
 )
-from sparql_util import serialize_graph_to_sparql
+from sparql_util import stream_file_triples
+from sparql_writer import SparqlWriter
 
 from sparql_util import sparql_construct_res_to_graph, drop_graph, binding_results
 
@@ -88,22 +89,19 @@ def do_vocab_export(vocab_uris):
     return [upload_resource_uri]
 
 
-def vocab_config_file_to_graph(file_uri: str, files_graph: str):
+def stream_vocab_config_file(file_uri: str, files_graph: str):
+    """ Yield the triples of a vocab config file in batches, see `stream_file_triples` """
     query_string = construct_get_file_query(file_uri, files_graph)
     file_result = query_sudo(query_string)["results"]["bindings"][0]
 
-    g = Graph()
-    g.parse(shared_uri_to_path(file_result["physicalFile"]["value"]))
-
-    return g
+    return stream_file_triples(shared_uri_to_path(file_result["physicalFile"]["value"]))
 
 
 def import_vocab_configs(file_uri):
     graph_uri = BASE_IMPORT_GRAPH + generate_uuid()
 
-    configs_g = vocab_config_file_to_graph(file_uri, FILES_GRAPH)
-    for query_string in serialize_graph_to_sparql(configs_g, graph_uri):
-        update_sudo(query_string)
+    with SparqlWriter(update_sudo) as writer:
+        writer.write(stream_vocab_config_file(file_uri, FILES_GRAPH), graph_uri)
 
     # check if alias is already in use
     matching_aliases_results = query_sudo(matching_aliasses_in_graph(graph_uri))
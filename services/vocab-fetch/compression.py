@@ -0,0 +1,81 @@
+import gzip
+import zlib
+
+from helpers import logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Dumps may be stored compressed, the compression is derived from the file name suffix.
+COMPRESSION_SUFFIXES = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def available_compression(compression):
+    """ The compression to write files with, falling back to gzip when zstandard isn't installed """
+    if compression in (None, "", "none"):
+        return None
+    if compression == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed, compressing with gzip instead")
+        return "gzip"
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unsupported compression {compression}")
+    return compression
+
+
+def compression_suffix(compression):
+    return COMPRESSION_SUFFIXES[compression] if compression else ""
+
+
+def compression_of(path):
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return None
+
+
+def uncompressed_name(path):
+    """ The file name without its compression suffix, to derive the RDF format from """
+    compression = compression_of(path)
+    return path[:-len(COMPRESSION_SUFFIXES[compression])] if compression else path
+
+
+def open_compressed(path, mode="rb", compression=None):
+    """
+    Open a (possibly compressed) file as a binary stream of its uncompressed content.
+    When reading, the compression is derived from the file name.
+    """
+    compression = compression or (compression_of(path) if "r" in mode else None)
+    if compression == "gzip":
+        return gzip.open(path, mode)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError(f"zstandard is required to read {path}")
+        if "r" in mode:
+            return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+    return open(path, mode)
+
+
+def read_chunks(f, chunk_size=1024 * 1024):
+    """
+    Read a stream in chunks, e.g. to send it as a chunked request body. Decompressing streams
+    can't be sent as file objects, requests would take the compressed size as Content-Length.
+    """
+    return iter(lambda: f.read(chunk_size), b"")
+
+
+def gunzip_chunks(chunks):
+    """ Yield (compressed chunk, decompressed content) pairs of a gzip stream, which may have multiple members """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        while decompressor.eof and decompressor.unused_data:
+            rest = decompressor.unused_data
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            data += decompressor.decompress(rest)
+        yield chunk, data
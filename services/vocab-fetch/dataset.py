@@ -14,7 +14,7 @@ PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
 PREFIX dc: <http://purl.org/dc/terms/>
 PREFIX dct: <http://purl.org/dc/terms/>
 
-SELECT DISTINCT ?format ?download_url ?data_dump ?type ?dataset_graph ?vocab ?creation_date
+SELECT DISTINCT ?format ?download_url ?data_dump ?type ?dataset_graph ?vocab ?creation_date ?staging_graph
 WHERE {
     GRAPH $graph {
         $dataset
@@ -26,6 +26,7 @@ WHERE {
         OPTIONAL {
             $dataset void:dataDump ?data_dump .
             ?data_dump dct:created ?creation_date .
+            OPTIONAL { ?data_dump ext:stagingGraph ?staging_graph . }
         }
         OPTIONAL { $dataset ext:datasetGraph ?dataset_graph . }
     }
@@ -75,3 +76,48 @@ WHERE {
     )
     return query_string
 
+def get_download_validators(dataset, graph=MU_APPLICATION_GRAPH):
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+SELECT ?etag ?last_modified
+WHERE {
+    GRAPH $graph {
+        OPTIONAL { $dataset ext:downloadEtag ?etag . }
+        OPTIONAL { $dataset ext:downloadLastModified ?last_modified . }
+    }
+}""")
+    query_string = query_template.substitute(
+        graph=sparql_escape_uri(graph) if graph else "?g",
+        dataset=sparql_escape_uri(dataset),
+    )
+    return query_string
+
+def update_download_validators(dataset, validators, graph=MU_APPLICATION_GRAPH):
+    """ Store the ETag and Last-Modified headers of the last download, for conditional requests """
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+WITH $graph
+DELETE {
+    $dataset ext:downloadEtag ?etag ;
+        ext:downloadLastModified ?last_modified .
+}
+INSERT {
+    $new_validators
+}
+WHERE {
+    OPTIONAL { $dataset ext:downloadEtag ?etag . }
+    OPTIONAL { $dataset ext:downloadLastModified ?last_modified . }
+}""")
+    new_validators = []
+    if validators.get("etag"):
+        new_validators.append(f'{sparql_escape_uri(dataset)} ext:downloadEtag {sparql_escape_string(validators["etag"])} .')
+    if validators.get("last_modified"):
+        new_validators.append(f'{sparql_escape_uri(dataset)} ext:downloadLastModified {sparql_escape_string(validators["last_modified"])} .')
+    query_string = query_template.substitute(
+        graph=sparql_escape_uri(graph) if graph else "?g",
+        dataset=sparql_escape_uri(dataset),
+        new_validators="\n    ".join(new_validators),
+    )
+    return query_string
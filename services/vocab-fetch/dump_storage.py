@@ -0,0 +1,59 @@
+import os
+import re
+import time
+
+from helpers import logger
+from file import STORAGE_PATH, file_to_shared_uri, shared_uri_to_path
+
+# Dumps are stored by the sha256 of their content, so that downloads with the same content
+# share one file on the volume. The file metadata (nfo:FileDataObject) of every download
+# references the shared file, which is only removed once no download references it anymore.
+BLOB_NAME = re.compile(r"^[0-9a-f]{64}\.")
+PARTIAL_SUFFIX = ".part"
+
+
+def partial_file_name(name):
+    """ Downloads are written under a temporary name until their checksum is known """
+    return name + PARTIAL_SUFFIX
+
+
+def blob_name(checksum, extension):
+    return f"{checksum}.{extension}"
+
+
+def store_blob(partial_path, checksum, extension):
+    """
+    Move a completely written download to its content-addressed location.
+    Returns the share uri of the blob, and whether a blob with the same content already existed.
+    """
+    blob_uri = file_to_shared_uri(blob_name(checksum, extension))
+    blob_path = shared_uri_to_path(blob_uri)
+    if os.path.exists(blob_path):
+        os.remove(partial_path)
+        # keeps the garbage collection off the blob until the new reference is written
+        os.utime(blob_path)
+        return blob_uri, True
+    os.replace(partial_path, blob_path)
+    return blob_uri, False
+
+
+def collect_garbage(referenced_uris, min_age_s):
+    """
+    Remove blobs (and interrupted partial downloads) that no file metadata references.
+    Files younger than `min_age_s` are kept, their metadata may not be written yet.
+    """
+    removed = []
+    freed_bytes = 0
+    now = time.time()
+    for name in sorted(os.listdir(STORAGE_PATH)):
+        if not (BLOB_NAME.match(name) or name.endswith(PARTIAL_SUFFIX)):
+            continue
+        path = os.path.join(STORAGE_PATH, name)
+        if file_to_shared_uri(name) in referenced_uris or now - os.path.getmtime(path) < min_age_s:
+            continue
+        size = os.path.getsize(path)
+        logger.info(f"Removing unreferenced dump {name} ({size} bytes)")
+        os.remove(path)
+        removed.append(name)
+        freed_bytes += size
+    return {"removed": removed, "freed_bytes": freed_bytes}
@@ -10,6 +10,15 @@ STORAGE_PATH = f"/share/{RELATIVE_STORAGE_PATH}"
 # TODO: keep this generic and extract into packaged module later
 ############################################################
 
+def file_extra_triples(file):
+    """ Optional properties of a file: the checksum and compression of its content """
+    triples = []
+    if file.get("sha256"):
+        triples.append(f'{sparql_escape_uri(file["uri"])} ext:sha256 {sparql_escape_string(file["sha256"])} .')
+    if file.get("compression"):
+        triples.append(f'{sparql_escape_uri(file["uri"])} ext:compression {sparql_escape_string(file["compression"])} .')
+    return "\n        ".join(triples)
+
 def construct_insert_file_query(file, physical_file, graph=MU_APPLICATION_GRAPH):
     """
     Construct a SPARQL query for inserting a file.
@@ -23,9 +32,11 @@ PREFIX nfo: <http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#>
 PREFIX nie: <http://www.semanticdesktop.org/ontologies/2007/01/19/nie#>
 PREFIX dct: <http://purl.org/dc/terms/>
 PREFIX dbpedia: <http://dbpedia.org/ontology/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
 
 INSERT DATA {
     GRAPH $graph {
+        $extra
         $uri a nfo:FileDataObject ;
             mu:uuid $uuid ;
             nfo:fileName $name ;
@@ -53,10 +64,84 @@ INSERT DATA {
         created=sparql_escape_datetime(file["created"]),
         size=sparql_escape_int(file["size"]),
         extension=sparql_escape_string(file["extension"]),
+        extra=file_extra_triples(file),
         physical_uri=sparql_escape_uri(physical_file["uri"]),
         physical_uuid=sparql_escape_string(physical_file["uuid"]),
         physical_name=sparql_escape_string(physical_file["name"]))
 
+def construct_insert_file_reference_query(file, physical_uri, graph=MU_APPLICATION_GRAPH):
+    """
+    Construct a SPARQL query for inserting a file whose physical file already exists.
+    :param file: dict containing properties for file
+    :param physical_uri: uri of the existing physical file
+    :returns: string containing SPARQL query
+    """
+    query_template = Template("""
+PREFIX mu: <http://mu.semte.ch/vocabularies/core/>
+PREFIX nfo: <http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#>
+PREFIX nie: <http://www.semanticdesktop.org/ontologies/2007/01/19/nie#>
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX dbpedia: <http://dbpedia.org/ontology/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+INSERT DATA {
+    GRAPH $graph {
+        $extra
+        $uri a nfo:FileDataObject ;
+            mu:uuid $uuid ;
+            nfo:fileName $name ;
+            dct:format $mimetype ;
+            dct:created $created ;
+            nfo:fileSize $size ;
+            dbpedia:fileExtension $extension .
+        $physical_uri nie:dataSource $uri .
+    }
+}
+""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        uri=sparql_escape_uri(file["uri"]),
+        uuid=sparql_escape_string(file["uuid"]),
+        name=sparql_escape_string(file["name"]),
+        mimetype=sparql_escape_string(file["mimetype"]),
+        created=sparql_escape_datetime(file["created"]),
+        size=sparql_escape_int(file["size"]),
+        extension=sparql_escape_string(file["extension"]),
+        extra=file_extra_triples(file),
+        physical_uri=sparql_escape_uri(physical_uri))
+
+def construct_physical_file_exists_query(physical_uri, graph=MU_APPLICATION_GRAPH):
+    query_template = Template("""
+PREFIX nfo: <http://www.semanticdesktop.org/ontologies/2007/03/22/nfo#>
+
+ASK {
+    GRAPH $graph {
+        $physical_uri a nfo:FileDataObject .
+    }
+}
+""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        physical_uri=sparql_escape_uri(physical_uri))
+
+def construct_get_referenced_physical_files_query(graph=MU_APPLICATION_GRAPH):
+    """
+    Construct a SPARQL query for the physical files that are the data source of a file.
+    :returns: string containing SPARQL query
+    """
+    query_template = Template("""
+PREFIX nie: <http://www.semanticdesktop.org/ontologies/2007/01/19/nie#>
+
+SELECT DISTINCT ?physicalFile
+WHERE {
+    GRAPH $graph {
+        ?physicalFile nie:dataSource ?file .
+    }
+}
+""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph))
+
 def construct_get_file_query(file_uri, graph=MU_APPLICATION_GRAPH):
     """
     Construct a SPARQL query for querying a file.
@@ -79,4 +79,100 @@ WHERE {
     )
     query_res = query(query_string)
     datasets = binding_results(query_res, "dataset")
-    return datasets
\ No newline at end of file
+    return datasets
+
+
+# Change watermark of an LDES dataset: the latest dct:modified and dct:date of its members
+# (MarineRegions LDES use dct:modified, BODC dct:date). Each is the first entry of the
+# predicate/object index of the dataset graph in descending order, so no member is scanned,
+# unlike `query_outdated_dump_ldes_datasets` which compares every member against the latest dump.
+# The values are only compared for equality, so they're used as-is (some aren't valid xsd:dateTime's).
+WATERMARK_PREDICATES = {
+    "modified": "http://purl.org/dc/terms/modified",
+    "date": "http://purl.org/dc/terms/date",
+}
+
+def query_ldes_dataset_watermarks():
+    """ The LDES datasets with their dataset graph and the watermark stored at their last download """
+    query_string = Template("""
+PREFIX void: <http://rdfs.org/ns/void#>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+PREFIX dct: <http://purl.org/dc/terms/>
+
+SELECT DISTINCT ?dataset ?dataset_graph ?modified ?date
+WHERE {
+    GRAPH $dataset_graph {
+      ?dataset a void:Dataset ;
+        dct:type $ldes_type ;
+        ext:datasetGraph ?dataset_graph .
+      ?vocab ext:sourceDataset ?dataset.
+      OPTIONAL { ?dataset ext:watermarkModified ?modified . }
+      OPTIONAL { ?dataset ext:watermarkDate ?date . }
+    }
+}
+    """).substitute(
+        ldes_type=sparql_escape_uri(LDES_TYPE),
+        dataset_graph=sparql_escape_uri(VOID_DATASET_GRAPH)
+    )
+    query_res = query(query_string)
+    return [
+        (
+            binding["dataset"]["value"],
+            binding["dataset_graph"]["value"],
+            tuple(binding.get(name, {}).get("value") for name in WATERMARK_PREDICATES),
+        )
+        for binding in query_res["results"]["bindings"]
+    ]
+
+def query_latest_value(graph, predicate):
+    query_string = Template("""
+SELECT ?value
+WHERE { GRAPH $graph { ?elem $predicate ?value . } }
+ORDER BY DESC(?value)
+LIMIT 1
+    """).substitute(
+        graph=sparql_escape_uri(graph),
+        predicate=sparql_escape_uri(predicate)
+    )
+    bindings = query(query_string)["results"]["bindings"]
+    return bindings[0]["value"]["value"] if bindings else None
+
+def query_graph_watermark(graph):
+    """ The current watermark of a dataset graph, as (latest dct:modified, latest dct:date) strings """
+    return tuple(query_latest_value(graph, predicate) for predicate in WATERMARK_PREDICATES.values())
+
+def update_dataset_watermark(dataset, watermark, graph=VOID_DATASET_GRAPH):
+    modified, date = watermark
+    # ext:watermarkTriples was part of the watermark before it was read from the indexes only
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+DELETE {
+    GRAPH $graph {
+        $dataset ext:watermarkTriples ?triples ;
+            ext:watermarkModified ?modified ;
+            ext:watermarkDate ?date .
+    }
+}
+INSERT {
+    GRAPH $graph {
+        $new_watermark
+    }
+}
+WHERE {
+    GRAPH $graph {
+        OPTIONAL { $dataset ext:watermarkTriples ?triples . }
+        OPTIONAL { $dataset ext:watermarkModified ?modified . }
+        OPTIONAL { $dataset ext:watermarkDate ?date . }
+    }
+}""")
+    new_watermark = []
+    if modified:
+        new_watermark.append(f"{sparql_escape_uri(dataset)} ext:watermarkModified {sparql_escape_string(modified)} .")
+    if date:
+        new_watermark.append(f"{sparql_escape_uri(dataset)} ext:watermarkDate {sparql_escape_string(date)} .")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        dataset=sparql_escape_uri(dataset),
+        new_watermark="\n        ".join(new_watermark),
+    )
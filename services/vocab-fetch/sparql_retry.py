@@ -0,0 +1,137 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from SPARQLWrapper.SPARQLExceptions import EndPointInternalError
+
+from helpers import logger
+
+SPARQL_MAX_RETRIES = int(os.environ.get("SPARQL_MAX_RETRIES", "5"))
+SPARQL_RETRY_BASE_MS = int(os.environ.get("SPARQL_RETRY_BASE_MS", "500"))
+SPARQL_RETRY_MAX_MS = int(os.environ.get("SPARQL_RETRY_MAX_MS", "30000"))
+# total number of retries all requests of a single job may use
+SPARQL_JOB_RETRY_BUDGET = int(os.environ.get("SPARQL_JOB_RETRY_BUDGET", "20"))
+# consecutive retryable failures (over all threads) after which requests are paused
+SPARQL_BREAKER_THRESHOLD = int(os.environ.get("SPARQL_BREAKER_THRESHOLD", "5"))
+SPARQL_BREAKER_COOLDOWN_MS = int(os.environ.get("SPARQL_BREAKER_COOLDOWN_MS", "30000"))
+
+RETRYABLE_STATUS_CODES = (502, 503, 504)
+# Virtuoso reports some query errors as 500 Internal Server Error. These won't go away by retrying.
+NON_RETRYABLE_MESSAGES = ("SP030", "syntax error")
+
+
+def is_retryable(e):
+    """ Whether a failed request may succeed when sent again (overload, timeouts, ...) """
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(e, EndPointInternalError):
+        return not any(message in str(e) for message in NON_RETRYABLE_MESSAGES)
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code in RETRYABLE_STATUS_CODES
+    # syntax errors (QueryBadFormed), unauthorized, not found, ...
+    return False
+
+
+def backoff_delay(attempt):
+    """ Exponential backoff with jitter, in seconds """
+    delay_ms = min(SPARQL_RETRY_MAX_MS, SPARQL_RETRY_BASE_MS * 2 ** attempt)
+    return random.uniform(delay_ms / 2, delay_ms) / 1000
+
+
+class RetryBudget:
+    """ Number of retries shared by all requests of a job, so a failing job gives up early """
+
+    def __init__(self, retries):
+        self.remaining = retries
+        self.lock = threading.Lock()
+
+    def consume(self):
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+local = threading.local()
+
+
+def current_retry_budget():
+    return getattr(local, "budget", None)
+
+
+@contextmanager
+def retry_budget(budget):
+    """ Charge the retries of the requests sent by this thread to `budget` """
+    previous = current_retry_budget()
+    local.budget = budget
+    try:
+        yield budget
+    finally:
+        local.budget = previous
+
+
+class CircuitBreaker:
+    """
+    Pauses requests of all threads once the triplestore keeps failing, instead of every request
+    backing off on its own. After the cooldown, requests are let through again, and the breaker
+    opens again on the first failure until a request succeeds.
+    """
+
+    def __init__(self, threshold, cooldown_ms):
+        self.threshold = threshold
+        self.cooldown_ms = cooldown_ms
+        self.failures = 0
+        self.open_until = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            remaining = self.open_until - time.time()
+        if remaining > 0:
+            logger.info(f"Triplestore overloaded, pausing for {round(remaining, 1)} seconds")
+            time.sleep(remaining)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.open_until <= time.time():
+                self.open_until = time.time() + self.cooldown_ms / 1000
+                logger.warning(f"{self.failures} consecutive failed requests, "
+                               f"pausing requests for {self.cooldown_ms} ms")
+
+
+breaker = CircuitBreaker(SPARQL_BREAKER_THRESHOLD, SPARQL_BREAKER_COOLDOWN_MS)
+
+
+def call_with_retries(func, max_retries=SPARQL_MAX_RETRIES):
+    """ Call `func`, retrying retryable errors with backoff, within the retry budget of the job """
+    attempt = 0
+    while True:
+        breaker.wait()
+        try:
+            result = func()
+            breaker.record_success()
+            return result
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            breaker.record_failure()
+            if attempt >= max_retries:
+                logger.error("Max attempts reached for query.")
+                raise
+            budget = current_retry_budget()
+            if budget and not budget.consume():
+                logger.error("Retry budget of the job is exhausted.")
+                raise
+            delay = backoff_delay(attempt)
+            attempt += 1
+            logger.warning(f"Retrying after {round(delay, 1)} seconds [{attempt}/{max_retries}]")
+            time.sleep(delay)
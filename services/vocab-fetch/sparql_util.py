@@ -1,5 +1,8 @@
 import os
-from escape_helpers import sparql_escape_uri
+import queue
+import re
+import threading
+from escape_helpers import sparql_escape_uri, sparql_escape_string
 from string import Template
 from datetime import datetime
 from file import file_to_shared_uri, shared_uri_to_path
@@ -9,11 +12,25 @@ from format_to_mime import FORMAT_TO_MIME_EXT
 from helpers import generate_uuid, logger
 from helpers import query, update
 from sudo_query import query_sudo, update_sudo
-import requests
+from rdflib.graph import Graph
+from rdflib.store import Store
+from rdflib.term import URIRef, Literal, BNode
+from rdflib.util import guess_format
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from sparql_client import SparqlClient
+import compression
 BATCH_SIZE = 100
 
 FILE_RESOURCE_BASE = "http://example-resource.com/"
 MU_VIRTUOSO_ENDPOINT = os.environ.get("MU_VIRTUOSO_ENDPOINT")
+MU_SPARQL_GRAPH_STORE_ENDPOINT = os.environ.get("MU_SPARQL_GRAPH_STORE_ENDPOINT")
+# How `graph_to_file` reads a graph: "graph-store" streams it with a single Graph Store HTTP Protocol
+# GET (needs MU_SPARQL_GRAPH_STORE_ENDPOINT), "keyset" pages over the subjects in a stable order,
+# "offset" uses OFFSET/LIMIT pages (the original behaviour, each page sorts the whole graph again)
+GRAPH_DUMP_MODE = os.environ.get("GRAPH_DUMP_MODE", "graph-store" if MU_SPARQL_GRAPH_STORE_ENDPOINT else "keyset")
+GRAPH_DUMP_PAGE_SIZE = int(os.environ.get("GRAPH_DUMP_PAGE_SIZE", "1000"))  # subjects per keyset page
+# Virtuoso silently truncates results at ResultSetMaxRows (config/virtuoso/virtuoso.ini), keyset pages must stay below it
+SPARQL_RESULT_MAX_ROWS = int(os.environ.get("SPARQL_RESULT_MAX_ROWS", "10000"))
 
 # adapted from https://github.com/RDFLib/rdflib/issues/1704
 def serialize_graph_to_sparql(g, graph_name: str):
@@ -29,6 +46,100 @@ def serialize_graph_to_sparql(g, graph_name: str):
         updatequery += f" . \n\t }}\n}}\n"
         yield updatequery
 
+class TripleSinkStore(Store):
+    """
+    rdflib store that doesn't keep any triples, but hands every parsed triple to `on_triple`.
+    This allows streaming a file through rdflib's parsers without building a Graph in memory.
+    """
+    context_aware = True  # the JSON-LD parser requires a context aware store
+
+    def __init__(self, on_triple):
+        super().__init__()
+        self.on_triple = on_triple
+        self.__namespaces = {}
+        self.__prefixes = {}
+
+    def add(self, triple, context, quoted=False):
+        self.on_triple(triple)
+
+    def bind(self, prefix, namespace, override=True):
+        self.__namespaces[prefix] = namespace
+        self.__prefixes[namespace] = prefix
+
+    def namespace(self, prefix):
+        return self.__namespaces.get(prefix)
+
+    def prefix(self, namespace):
+        return self.__prefixes.get(namespace)
+
+    def namespaces(self):
+        return iter(self.__namespaces.items())
+
+class ParsingStopped(Exception):
+    pass
+
+def parse_file(g, file):
+    """ Parse a file into `g`, decompressing it while parsing when it's stored compressed """
+    if not compression.compression_of(file):
+        return g.parse(file)
+    with compression.open_compressed(file) as f:
+        return g.parse(source=f, format=guess_format(compression.uncompressed_name(file)) or "turtle")
+
+def stream_file_triples(file, batch_size=BATCH_SIZE, max_pending_batches=4):
+    """
+    Parse a file in a background thread and yield its triples in batches of `batch_size`.
+    At most `max_pending_batches` batches are buffered. Memory use is only bounded by the batch size
+    for the formats rdflib parses incrementally: N-Triples and N-Quads (line by line) and RDF/XML (SAX).
+    Turtle, N3 and JSON-LD documents are read into memory as a whole before the first triple comes out,
+    these take memory in proportion to the file size (though the triples never end up in a Graph).
+    """
+    batches = queue.Queue(maxsize=max_pending_batches)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                batches.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+        raise ParsingStopped()
+
+    def parse():
+        batch = []
+
+        def on_triple(triple):
+            batch.append(triple)
+            if len(batch) >= batch_size:
+                put(batch.copy())
+                batch.clear()
+        try:
+            parse_file(Graph(store=TripleSinkStore(on_triple)), file)
+            if batch:
+                put(batch)
+            put(done)
+        except ParsingStopped:
+            pass
+        except Exception as e:
+            try:
+                put(e)
+            except ParsingStopped:
+                pass
+
+    threading.Thread(target=parse, daemon=True).start()
+    try:
+        while True:
+            item = batches.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # stops the parser thread when the consumer stops early
+        stopped.set()
+
 dump_graph_query_template = Template("""
 CONSTRUCT {
     ?s ?p ?o .
@@ -49,40 +160,154 @@ OFFSET $offset
 LIMIT $limit
 """)
 
+dump_graph_page_template = Template("""
+SELECT ?s ?p ?o
+WHERE
+{
+    {
+        SELECT DISTINCT ?s
+        WHERE
+        {
+            GRAPH $graph {
+                ?s ?p ?o .
+            }
+            $after_subject_filter
+        }
+        ORDER BY STR(?s)
+        LIMIT $limit
+    }
+    GRAPH $graph {
+        ?s ?p ?o .
+    }
+}
+""")
+
+def json_to_term(json_term):
+    """ rdflib term of a term of a SPARQL JSON result """
+    if json_term["type"] == "uri":
+        return URIRef(json_term["value"])
+    if json_term["type"] == "bnode":
+        # Virtuoso labels (e.g. "nodeID://b10001") are stable within a query, but not valid N-Triples labels
+        return BNode(re.sub(r"[^A-Za-z0-9]", "_", json_term["value"]))
+    if "xml:lang" in json_term:
+        return Literal(json_term["value"], lang=json_term["xml:lang"])
+    return Literal(json_term["value"], datatype=json_term.get("datatype"))
+
+class TripleBatchSink:
+    """ N-Triples parser sink collecting the parsed triples """
+    def __init__(self):
+        self.batch = []
+
+    def triple(self, s, p, o):
+        self.batch.append((s, p, o))
+
+def stream_graph_store_triples(graph_name, batch_size=BATCH_SIZE):
+    """ Yield the triples of a graph in batches, read with a single Graph Store HTTP Protocol GET """
+    sink = TripleBatchSink()
+    parser = W3CNTriplesParser(sink)
+    bnode_context = {}  # blank node labels are shared by all lines of the response
+    with SparqlClient(MU_SPARQL_GRAPH_STORE_ENDPOINT).get(
+        params={"graph-uri": graph_name}, accept="application/n-triples, text/plain", stream=True
+    ) as res:
+        for line in res.iter_lines():
+            if line.strip():
+                parser.parsestring(line, bnode_context=bnode_context)
+            if len(sink.batch) >= batch_size:
+                yield sink.batch
+                sink.batch = []
+    if sink.batch:
+        yield sink.batch
+
+def stream_graph_keyset_triples(graph_name, page_size=GRAPH_DUMP_PAGE_SIZE):
+    """
+    Yield the triples of a graph in batches, a page of subjects at a time. Every page starts after the last subject of the previous one.
+    Pages that reach SPARQL_RESULT_MAX_ROWS (and may be truncated) are read again with fewer subjects. This mode
+    sorts the remaining subjects on every page, prefer the Graph Store endpoint for large graphs.
+    """
+    client = SparqlClient(MU_VIRTUOSO_ENDPOINT)
+    last_subject = None
+    page = 0
+    while True:
+        page += 1
+        logger.debug(f"Reading graph {graph_name}. Page {page}")
+        after_subject_filter = f"FILTER(STR(?s) > {sparql_escape_string(last_subject)})" if last_subject else ""
+        bindings = client.query(dump_graph_page_template.substitute(
+            graph=sparql_escape_uri(graph_name),
+            after_subject_filter=after_subject_filter,
+            limit=page_size,
+        ))["results"]["bindings"]
+        if len(bindings) >= SPARQL_RESULT_MAX_ROWS:
+            if page_size == 1:
+                raise ValueError(f"Subject after {last_subject} in <{graph_name}> has more than {SPARQL_RESULT_MAX_ROWS} triples, "
+                                 "it can't be read without truncation. Configure MU_SPARQL_GRAPH_STORE_ENDPOINT.")
+            page_size = max(page_size // 2, 1)
+            logger.warning(f"Page of <{graph_name}> reached {SPARQL_RESULT_MAX_ROWS} rows, reading it again with {page_size} subjects")
+            continue
+        if bindings:
+            yield [(json_to_term(b["s"]), json_to_term(b["p"]), json_to_term(b["o"])) for b in bindings]
+        subjects = set(b["s"]["value"] for b in bindings)
+        if len(subjects) < page_size:
+            break
+        last_subject = max(subjects)
+
+def stream_graph_triples(graph_name):
+    """ Yield the triples of a graph in batches, from the Graph Store endpoint when there is one """
+    if MU_SPARQL_GRAPH_STORE_ENDPOINT:
+        return stream_graph_store_triples(graph_name)
+    return stream_graph_keyset_triples(graph_name)
+
+def dump_graph_offset(client, graph_name, f):
+    i = 0
+    while True:
+        logger.debug(f"Writing triplestore graph to file. Batch {i+1}")
+        query_string = dump_graph_query_template.substitute(
+            graph=sparql_escape_uri(graph_name),
+            offset=i*BATCH_SIZE,
+            limit=BATCH_SIZE
+        )
+        with client.request({"query": query_string}, accept="text/plain", stream=True) as res:
+            if res.content == b'# Empty NT\n':
+                break
+            for chunk in res.iter_content(chunk_size=None):
+                f.write(chunk)
+            i += 1
+
+def dump_graph_keyset(graph_name, f):
+    """ Write a graph as N-Triples, see `stream_graph_keyset_triples` """
+    for triples_batch in stream_graph_keyset_triples(graph_name):
+        f.write("".join(f"{s.n3()} {p.n3()} {o.n3()} .\n" for (s, p, o) in triples_batch).encode("utf-8"))
+
+def dump_graph_store(graph_name, f):
+    """ Stream a graph with a single Graph Store HTTP Protocol GET """
+    with SparqlClient(MU_SPARQL_GRAPH_STORE_ENDPOINT).get(
+        params={"graph-uri": graph_name}, accept="application/n-triples, text/plain", stream=True
+    ) as res:
+        for chunk in res.iter_content(chunk_size=1024 * 1024):
+            f.write(chunk)
+
 def graph_to_file(graph_name, graph):
     """triplestore graph to file"""
-    mime_type = "text/plain"
     file_extension = "nt"
     upload_resource_uuid = generate_uuid()
     upload_resource_uri = f"{FILE_RESOURCE_BASE}{upload_resource_uuid}"
     file_resource_uuid = generate_uuid()
-    file_resource_name = f"{file_resource_uuid}.{file_extension}"
+    file_compression = compression.available_compression(os.environ.get("DUMP_COMPRESSION", "gzip"))
+    file_resource_name = f"{file_resource_uuid}.{file_extension}{compression.compression_suffix(file_compression)}"
 
     file_resource_uri = file_to_shared_uri(file_resource_name)
 
-    headers = {"Accept": mime_type}
+    client = SparqlClient(MU_VIRTUOSO_ENDPOINT)
 
-    i = 0
-    logger.info(f"Starting graph {graph_name} dump to {shared_uri_to_path(file_resource_uri)}.")
-    with open(shared_uri_to_path(file_resource_uri), "wb") as f:
-        while True:
-            logger.debug(f"Writing triplestore graph to file. Batch {i+1}")
-            query_string = dump_graph_query_template.substitute(
-                graph=sparql_escape_uri(graph_name),
-                offset=i*BATCH_SIZE,
-                limit=BATCH_SIZE
-            )
-            url = MU_VIRTUOSO_ENDPOINT + '?query=' + query_string
-            with requests.get(url, headers=headers, stream=True) as res:
-                assert res.ok
-                if res.content == b'# Empty NT\n':
-                    break
-                for chunk in res.iter_content(chunk_size=None):
-                    f.write(chunk)
-                i += 1
-
-        f.seek(0, 2)
-        file_size = f.tell()
+    logger.info(f"Starting graph {graph_name} dump to {shared_uri_to_path(file_resource_uri)} ({GRAPH_DUMP_MODE}).")
+    with compression.open_compressed(shared_uri_to_path(file_resource_uri), "wb", file_compression) as f:
+        if GRAPH_DUMP_MODE == "graph-store":
+            dump_graph_store(graph_name, f)
+        elif GRAPH_DUMP_MODE == "offset":
+            dump_graph_offset(client, graph_name, f)
+        else:
+            dump_graph_keyset(graph_name, f)
+
+    file_size = os.path.getsize(shared_uri_to_path(file_resource_uri))
 
     file = {
         "uri": upload_resource_uri,
@@ -92,6 +317,7 @@ def graph_to_file(graph_name, graph):
         "created": datetime.now(),
         "size": file_size,
         "extension": file_extension,
+        "compression": file_compression,
     }
     physical_file = {
         "uri": file_resource_uri,
@@ -0,0 +1,113 @@
+import os
+import queue
+import threading
+import time
+
+from helpers import logger
+from sparql_retry import current_retry_budget, retry_budget
+from sparql_serialize import serialize_triples_to_sparql
+
+SPARQL_WRITER_CONCURRENCY = int(os.environ.get("SPARQL_WRITER_CONCURRENCY", "4"))
+SPARQL_WRITER_QUEUE_SIZE = int(os.environ.get("SPARQL_WRITER_QUEUE_SIZE", "8"))
+
+
+class SparqlWriter:
+    """
+    Send INSERT/DELETE DATA batches over `concurrency` connections.
+    Every connection is served by a worker thread with its own bounded queue, so producing
+    batches (parsing, querying) overlaps with serializing and sending them, while the number of
+    pending batches stays bounded. When `ordered` is set, all batches of a graph go to the same
+    worker and are thus written in the order they were produced.
+    Failed batches are collected and reported when the writer is closed.
+    With a `latency` controller (e.g. `AdaptiveBatchSize`), the duration of every written batch is
+    recorded with it, so that slow writes shrink the batches that are read in the meantime.
+
+    with SparqlWriter(update_sudo) as writer:
+        writer.write(stream_file_triples(file), graph)
+    """
+
+    def __init__(self, update, concurrency=None, queue_size=None, ordered=False, latency=None):
+        self.update = update
+        self.latency = latency
+        self.ordered = ordered
+        self.lanes = [
+            queue.Queue(maxsize=queue_size or SPARQL_WRITER_QUEUE_SIZE)
+            for _ in range(max(1, concurrency or SPARQL_WRITER_CONCURRENCY))
+        ]
+        self.next_lane = 0
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.triples = 0
+        self.failed = []  # (graph, operation, triples batch, error)
+        self.start = time.time()
+        # retries of the workers count towards the budget of the job that writes
+        self.retry_budget = current_retry_budget()
+        self.workers = [
+            threading.Thread(target=self.work, args=(lane,), daemon=True)
+            for lane in self.lanes
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def work(self, lane):
+        with retry_budget(self.retry_budget):
+            self.write_batches(lane)
+
+    def write_batches(self, lane):
+        while True:
+            item = lane.get()
+            if item is None:
+                return
+            graph, operation, triples_batch = item
+            try:
+                start = time.time()
+                for query_string in serialize_triples_to_sparql([triples_batch], graph, operation):
+                    self.update(query_string)
+                if self.latency:
+                    self.latency.record((time.time() - start) * 1000)
+                with self.lock:
+                    self.batches += 1
+                    self.triples += len(triples_batch)
+            except Exception as e:
+                logger.error(f"Failed writing batch of {len(triples_batch)} triples to <{graph}>: {e}")
+                with self.lock:
+                    self.failed.append((graph, operation, triples_batch, e))
+
+    def lane_for(self, graph):
+        if self.ordered:
+            return self.lanes[hash(graph) % len(self.lanes)]
+        self.next_lane = (self.next_lane + 1) % len(self.lanes)
+        return self.lanes[self.next_lane]
+
+    def write(self, triples_batches, graph, operation="INSERT"):
+        """ Queue batches of triples to be written, blocks while the queue of a worker is full """
+        for triples_batch in triples_batches:
+            self.lane_for(graph).put((graph, operation, list(triples_batch)))
+
+    def stats(self):
+        duration = max(time.time() - self.start, 0.001)
+        return {
+            "batches": self.batches,
+            "triples": self.triples,
+            "failed_batches": len(self.failed),
+            "seconds": round(duration, 1),
+            "triples_per_second": round(self.triples / duration),
+        }
+
+    def close(self):
+        """ Wait for all queued batches to be written and return the writer statistics """
+        for lane in self.lanes:
+            lane.put(None)
+        for worker in self.workers:
+            worker.join()
+        stats = self.stats()
+        logger.info(f"SPARQL writer finished: {stats}")
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if self.failed and exc_type is None:
+            raise Exception(f"{len(self.failed)} update batches failed, first error: {self.failed[0][3]}")
@@ -0,0 +1,140 @@
+import hashlib
+from string import Template
+
+from escape_helpers import sparql_escape_uri, sparql_escape_string, sparql_escape_datetime
+from compression import open_compressed, read_chunks
+
+# A staging graph holds the content of a data dump, and is shared by the VoID generation and
+# unification of the dataset. Its name is derived from the checksum of the dump, so that
+# downloading an unchanged dump again doesn't require reloading it.
+STAGING_GRAPH_BASE = "http://example-resource.com/graph/staging/"
+
+
+def staging_graph_uri(checksum):
+    return STAGING_GRAPH_BASE + checksum
+
+
+def file_checksum(path):
+    """ The sha256 of the (uncompressed) content of a file """
+    sha256 = hashlib.sha256()
+    with open_compressed(path) as f:
+        for chunk in read_chunks(f):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_file_checksum(file_uri, graph):
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+SELECT ?checksum WHERE {
+    GRAPH $graph {
+        $file ext:sha256 ?checksum .
+    }
+}""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        file=sparql_escape_uri(file_uri),
+    )
+
+
+def is_staging_graph_loaded(staging_graph, graph):
+    """ Whether the staging graph was completely loaded for some file (with the same checksum) """
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+ASK {
+    GRAPH $graph {
+        ?file ext:stagingGraph $staging_graph .
+    }
+}""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        staging_graph=sparql_escape_uri(staging_graph),
+    )
+
+
+def set_file_checksum(file_uri, checksum, graph):
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+INSERT DATA {
+    GRAPH $graph {
+        $file ext:sha256 $checksum .
+    }
+}""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        file=sparql_escape_uri(file_uri),
+        checksum=sparql_escape_string(checksum),
+    )
+
+
+def set_staging_graph(file_uri, staging_graph, graph):
+    """ Marks the staging graph as completely loaded for the file """
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+INSERT DATA {
+    GRAPH $graph {
+        $file ext:stagingGraph $staging_graph .
+    }
+}""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        file=sparql_escape_uri(file_uri),
+        staging_graph=sparql_escape_uri(staging_graph),
+    )
+
+
+def get_outdated_staging_graphs(dataset, superseded_before, graph):
+    """
+    Staging graphs of earlier dumps of the dataset, that aren't the staging graph of the latest dump of any dataset.
+    Only graphs of dumps superseded before `superseded_before` are returned, unification tasks that
+    started on the earlier dump may still be reading its graph.
+    """
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+PREFIX void: <http://rdfs.org/ns/void#>
+PREFIX dct: <http://purl.org/dc/terms/>
+
+SELECT DISTINCT ?stagingGraph WHERE {
+    GRAPH $graph {
+        $dataset void:dataDump ?dump .
+        ?dump ext:stagingGraph ?stagingGraph ;
+            dct:created ?created .
+        $dataset void:dataDump ?supersedingDump .
+        ?supersedingDump dct:created ?supersededAt .
+        FILTER(?supersededAt > ?created && ?supersededAt < $superseded_before)
+        FILTER NOT EXISTS {
+            ?latestDataset void:dataDump ?latestDump .
+            ?latestDump ext:stagingGraph ?stagingGraph ;
+                dct:created ?latestCreated .
+            FILTER NOT EXISTS {
+                ?latestDataset void:dataDump ?newerDump .
+                ?newerDump dct:created ?newerCreated .
+                FILTER(?newerCreated > ?latestCreated)
+            }
+        }
+    }
+}""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        dataset=sparql_escape_uri(dataset),
+        superseded_before=sparql_escape_datetime(superseded_before),
+    )
+
+
+def remove_staging_graph_markers(staging_graph, graph):
+    query_template = Template("""
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+DELETE WHERE {
+    GRAPH $graph {
+        ?file ext:stagingGraph $staging_graph .
+    }
+}""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph),
+        staging_graph=sparql_escape_uri(staging_graph),
+    )
@@ -4,6 +4,7 @@ from string import Template
 from escape_helpers import sparql_escape_uri, sparql_escape_datetime, sparql_escape_string
 from helpers import generate_uuid, logger
 import traceback
+from sparql_retry import RetryBudget, retry_budget, SPARQL_JOB_RETRY_BUDGET
 
 MU_APPLICATION_GRAPH = os.environ.get("MU_APPLICATION_GRAPH")
 
@@ -12,7 +13,15 @@ STATUS_SCHEDULED = 'http://redpencil.data.gift/id/concept/JobStatus/scheduled'
 STATUS_SUCCESS = 'http://redpencil.data.gift/id/concept/JobStatus/success'
 STATUS_FAILED = 'http://redpencil.data.gift/id/concept/JobStatus/failed'
 
-def create_download_task(dataset, graph=MU_APPLICATION_GRAPH):
+# creator of the download jobs re-dumping LDES datasets on a schedule. These run in the
+# background, after the tasks scheduled by users.
+SCHEDULED_DUMP_CREATOR = 'http://mu.semte.ch/vocabularies/ext/vocab-fetch/scheduled-dump'
+
+def create_download_task(dataset, graph=MU_APPLICATION_GRAPH, creator=None, incremental_unification=False):
+    """
+    With `incremental_unification`, the job is marked as one whose dataset is unified from LDES deltas,
+    content-unification then only re-unifies the vocabularies when it doesn't receive these deltas.
+    """
     job_uri_prefix = 'http://redpencil.data.gift/id/job/'
     job_uuid = generate_uuid()
     job_uri = job_uri_prefix + job_uuid
@@ -38,11 +47,12 @@ PREFIX adms: <http://www.w3.org/ns/adms#>
 INSERT {
     GRAPH $graph {
         $job a cogs:Job;
-            dct:creator "empty";
+            dct:creator $creator;
             adms:status <http://redpencil.data.gift/id/concept/JobStatus/scheduled>;
             dct:created $created ;
             dct:modified $created ;
             task:operation <http://lblod.data.gift/id/jobs/concept/JobOperation/vocab-download> .
+        $incremental_unification
         $task_uri a task:Task ;
             mu:uuid $task_uuid ;
             dct:created $created ;
@@ -76,10 +86,52 @@ WHERE {
         created=sparql_escape_datetime(created),
         container_uuid=sparql_escape_string(container_uuid),
         container=sparql_escape_uri(container_uri),
-        dataset=sparql_escape_uri(dataset)
+        dataset=sparql_escape_uri(dataset),
+        creator=sparql_escape_uri(creator) if creator else '"empty"',
+        incremental_unification=(
+            f'{sparql_escape_uri(job_uri)} ext:incrementalUnification "true"^^xsd:boolean .'
+            if incremental_unification else ""
+        ),
     )
     return query_string
 
+def mark_job_source_unchanged(task, graph=MU_APPLICATION_GRAPH):
+    """ Mark the job of a download task as not having changed its dataset, the next tasks then skip their work """
+    query_template = Template("""
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+INSERT {
+    GRAPH $graph {
+        ?job ext:sourceUnchanged "true"^^<http://www.w3.org/2001/XMLSchema#boolean> .
+    }
+}
+WHERE {
+    GRAPH $graph {
+        $task dct:isPartOf ?job .
+    }
+}""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph) if graph else "?g",
+        task=sparql_escape_uri(task),
+    )
+
+def is_job_source_unchanged(task, graph=MU_APPLICATION_GRAPH):
+    query_template = Template("""
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+ASK {
+    GRAPH $graph {
+        $task dct:isPartOf ?job .
+        ?job ext:sourceUnchanged "true"^^<http://www.w3.org/2001/XMLSchema#boolean> .
+    }
+}""")
+    return query_template.substitute(
+        graph=sparql_escape_uri(graph) if graph else "?g",
+        task=sparql_escape_uri(task),
+    )
+
 def attach_task_results_container(task, results, graph=MU_APPLICATION_GRAPH):
     CONTAINER_URI_PREFIX = 'http://redpencil.data.gift/id/container/'
     container_uuid = generate_uuid()
@@ -189,7 +241,7 @@ PREFIX task: <http://redpencil.data.gift/vocabularies/tasks/>
 PREFIX adms: <http://www.w3.org/ns/adms#>
 PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
 
-SELECT (?task as ?uri) (?uuid as ?id) ?created ?used ?operation ?job_operation WHERE {
+SELECT (?task as ?uri) (?uuid as ?id) ?created ?used ?operation ?job_operation ?priority WHERE {
     GRAPH $graph {
         ?task a task:Task ;
             dct:created ?created ;
@@ -198,13 +250,18 @@ SELECT (?task as ?uri) (?uuid as ?id) ?created ?used ?operation ?job_operation W
             mu:uuid ?uuid .
         OPTIONAL { ?task task:inputContainer/ext:content ?used }
         OPTIONAL {?task dct:isPartOf/task:operation ?job_operation}
+        OPTIONAL {?task dct:isPartOf/dct:creator ?creator}
         VALUES ?operation {$task_types}
     }
-} LIMIT 1
+    BIND(IF(BOUND(?creator) && ?creator = $background_creator, "background", "normal") AS ?priority)
+}
+ORDER BY DESC(?priority) ASC(?created)
+LIMIT 1
 """)
     query_string = query_template.substitute(
         graph=sparql_escape_uri(graph) if graph else "?g",
-        task_types = " ".join([sparql_escape_uri(uri) for uri in types])
+        task_types = " ".join([sparql_escape_uri(uri) for uri in types]),
+        background_creator=sparql_escape_uri(SCHEDULED_DUMP_CREATOR),
         )
     return query_string
 
@@ -222,7 +279,8 @@ def run_task(task_uri, graph, runner_func, sparql_query, sparql_update):
 
     sparql_update(update_task_status(task_uri, STATUS_BUSY, graph))
     try:
-        generated = runner_func(used)
+        with retry_budget(RetryBudget(SPARQL_JOB_RETRY_BUDGET)):
+            generated = runner_func(used)
         if generated:
             logger.info(f"Running task <{task_uri}> with source <{used[0]}> generated <{generated[0]}>")
             sparql_update(attach_task_results_container(task_uri, generated, graph))
@@ -0,0 +1,98 @@
+import builtins
+import datetime
+import logging
+import os
+import re
+import sys
+import types
+import uuid
+
+# the service modules are imported the way the mu-python-template runs them, from the service directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+# `helpers` and `escape_helpers` are provided by the mu-python-template image. Outside of it,
+# they are replaced by stubs that escape the way the template does (e.g. strings as """…""").
+def _template_escape_helpers():
+    module = types.ModuleType("escape_helpers")
+
+    def sparql_escape_string(obj):
+        return '"""' + re.sub(r'[\\"]', lambda s: "\\" + s.group(0), str(obj)) + '"""'
+
+    def sparql_escape_uri(obj):
+        return "<" + re.sub(r'[\\"<>]', lambda s: "\\" + s.group(0), str(obj)) + ">"
+
+    def sparql_escape_datetime(obj):
+        if not isinstance(obj, datetime.datetime):
+            obj = datetime.datetime.fromisoformat(str(obj))
+        return '"{}"^^xsd:dateTime'.format(obj.isoformat())
+
+    def sparql_escape_date(obj):
+        if not isinstance(obj, datetime.date):
+            obj = datetime.date.fromisoformat(str(obj))
+        return '"{}"^^xsd:date'.format(obj.isoformat())
+
+    def sparql_escape_int(obj):
+        return '"{}"^^xsd:integer'.format(int(obj))
+
+    def sparql_escape_float(obj):
+        return '"{}"^^xsd:float'.format(float(obj))
+
+    def sparql_escape_bool(obj):
+        return '"{}"^^xsd:boolean'.format("true" if obj else "false")
+
+    def sparql_escape(obj):
+        if isinstance(obj, bool):
+            return sparql_escape_bool(obj)
+        if isinstance(obj, int):
+            return sparql_escape_int(obj)
+        if isinstance(obj, float):
+            return sparql_escape_float(obj)
+        if isinstance(obj, datetime.datetime):
+            return sparql_escape_datetime(obj)
+        if isinstance(obj, datetime.date):
+            return sparql_escape_date(obj)
+        return sparql_escape_string(obj)
+
+    for f in (sparql_escape_string, sparql_escape_uri, sparql_escape_datetime, sparql_escape_date,
+              sparql_escape_int, sparql_escape_float, sparql_escape_bool, sparql_escape):
+        setattr(module, f.__name__, f)
+    return module
+
+
+def _template_helpers():
+    module = types.ModuleType("helpers")
+
+    def generate_uuid():
+        return str(uuid.uuid1())
+
+    def log(msg, *args, **kwargs):
+        module.logger.info(msg, *args, **kwargs)
+
+    def query(the_query, *args, **kwargs):
+        raise RuntimeError("No triplestore in the tests, patch the query function of the module under test")
+
+    def update(the_query, *args, **kwargs):
+        raise RuntimeError("No triplestore in the tests, patch the update function of the module under test")
+
+    module.logger = logging.getLogger("MU_PYTHON_TEMPLATE_LOGGER")
+    for f in (generate_uuid, log, query, update):
+        setattr(module, f.__name__, f)
+    return module
+
+
+class _TemplateApp:
+    """ Stands in for the Flask app the template exposes to web.py as the `app` builtin """
+
+    def route(self, *args, **kwargs):
+        return lambda f: f
+
+
+for _name, _stub in (("escape_helpers", _template_escape_helpers), ("helpers", _template_helpers)):
+    try:
+        __import__(_name)
+    except ImportError:
+        sys.modules[_name] = _stub()
+
+if not hasattr(builtins, "app"):
+    builtins.app = _TemplateApp()
@@ -0,0 +1,34 @@
+import pytest
+
+from hyperloglog import HyperLogLog
+
+
+@pytest.mark.parametrize("precision", [10, 12, 14])
+def test_estimates_stay_within_the_error_bound(precision):
+    hll = HyperLogLog(precision)
+    n = 50000
+    for i in range(n):
+        hll.add(f"http://example.com/concept/{i}")
+    # 3 standard errors
+    assert abs(len(hll) - n) / n < 3 * hll.relative_error
+
+
+def test_small_counts_are_exact():
+    hll = HyperLogLog(12)
+    for i in range(20):
+        hll.add(f"http://example.com/concept/{i}")
+        hll.add(f"http://example.com/concept/{i}")
+    assert len(hll) == 20
+    assert len(HyperLogLog(12)) == 0
+
+
+def test_values_are_hashed_by_their_key():
+    hll = HyperLogLog(12, key=lambda value: value.lower())
+    hll.add("A")
+    hll.add("a")
+    assert len(hll) == 1
+
+
+def test_precision_is_bounded():
+    with pytest.raises(ValueError):
+        HyperLogLog(20)
@@ -0,0 +1,24 @@
+import re
+
+import ldes_dump
+
+
+def test_watermark_is_read_from_the_index_order(monkeypatch):
+    queries = []
+
+    def query(query_string):
+        queries.append(query_string)
+        bindings = [{"value": {"value": "2024-01-08 18:29:18.0"}}] if "modified" in query_string else []
+        return {"results": {"bindings": bindings}}
+    monkeypatch.setattr(ldes_dump, "query", query)
+
+    assert ldes_dump.query_graph_watermark("http://example.com/ldes") == ("2024-01-08 18:29:18.0", None)
+    for query_string in queries:
+        assert "ORDER BY DESC(?value)" in query_string
+        assert "COUNT" not in query_string and "STR(" not in query_string
+
+
+def test_update_dataset_watermark_keeps_only_the_known_values():
+    query_string = ldes_dump.update_dataset_watermark("http://example.com/dataset", ("2024-01-08", None))
+    assert re.search(r'<http://example\.com/dataset> ext:watermarkModified ("""|")2024-01-08\1 \.', query_string)
+    assert 'ext:watermarkDate "' not in query_string
@@ -0,0 +1,49 @@
+import re
+
+import pytest
+
+import sparql_util
+
+
+def binding(s, p="http://example.com/p", o="o"):
+    return {"s": {"type": "uri", "value": s}, "p": {"type": "uri", "value": p}, "o": {"type": "literal", "value": o}}
+
+
+class PagedClient:
+    """ Answers keyset pages from a list of subjects with `triples_per_subject` triples each, truncating like Virtuoso """
+    def __init__(self, subjects, triples_per_subject, max_rows):
+        self.subjects = sorted(subjects)
+        self.triples_per_subject = triples_per_subject
+        self.max_rows = max_rows
+
+    def query(self, query_string):
+        # the template escapes strings as """…""", other escape helpers with single quotes
+        after = re.search(r'FILTER\(STR\(\?s\) > ("""|")(.*?)\1\)', query_string)
+        after = after.group(2) if after else ""
+        limit = int(query_string.split("LIMIT")[1].split()[0])
+        page = [s for s in self.subjects if s > after][:limit]
+        bindings = [binding(s, o=str(i)) for s in page for i in range(self.triples_per_subject)]
+        return {"results": {"bindings": bindings[:self.max_rows]}}
+
+
+@pytest.fixture
+def paged_client(monkeypatch):
+    def use(subjects, triples_per_subject, max_rows):
+        client = PagedClient(subjects, triples_per_subject, max_rows)
+        monkeypatch.setattr(sparql_util, "SparqlClient", lambda endpoint: client)
+        monkeypatch.setattr(sparql_util, "SPARQL_RESULT_MAX_ROWS", max_rows)
+    return use
+
+
+def test_keyset_pages_read_every_triple_below_the_result_cap(paged_client):
+    subjects = [f"http://example.com/s{i:03}" for i in range(25)]
+    paged_client(subjects, triples_per_subject=3, max_rows=20)
+    triples = [t for batch in sparql_util.stream_graph_keyset_triples("http://example.com/g", page_size=10) for t in batch]
+    assert len(triples) == 75
+    assert len(set(triples)) == 75
+
+
+def test_keyset_page_of_a_single_subject_over_the_cap_fails(paged_client):
+    paged_client(["http://example.com/s"], triples_per_subject=30, max_rows=20)
+    with pytest.raises(ValueError):
+        list(sparql_util.stream_graph_keyset_triples("http://example.com/g", page_size=10))
@@ -0,0 +1,68 @@
+import gzip
+from datetime import datetime
+
+import pytest
+from rdflib import Dataset, URIRef
+
+from staging import file_checksum, get_outdated_staging_graphs
+
+
+GRAPH = "http://mu.semte.ch/graphs/public"
+DATASET = "http://example.com/dataset1"
+
+# dataset1 was downloaded on the 6th and the 8th, dataset2 has the content of dataset1's first dump
+DUMPS = """
+@prefix ext: <http://mu.semte.ch/vocabularies/ext/> .
+@prefix void: <http://rdfs.org/ns/void#> .
+@prefix dct: <http://purl.org/dc/terms/> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+@prefix ex: <http://example.com/> .
+
+ex:dataset1 void:dataDump ex:dump1, ex:dump2 .
+ex:dump1 dct:created "2024-01-06T12:00:00"^^xsd:dateTime ;
+    ext:stagingGraph ex:staging1 .
+ex:dump2 dct:created "2024-01-08T12:00:00"^^xsd:dateTime ;
+    ext:stagingGraph ex:staging2 .
+"""
+SHARED_DUMP = """
+@prefix ext: <http://mu.semte.ch/vocabularies/ext/> .
+@prefix void: <http://rdfs.org/ns/void#> .
+@prefix dct: <http://purl.org/dc/terms/> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+@prefix ex: <http://example.com/> .
+
+ex:dataset2 void:dataDump ex:dump3 .
+ex:dump3 dct:created "2024-01-07T12:00:00"^^xsd:dateTime ;
+    ext:stagingGraph ex:staging1 .
+"""
+
+
+@pytest.fixture
+def store():
+    store = Dataset()
+    store.graph(URIRef(GRAPH)).parse(data=DUMPS, format="turtle")
+    return store
+
+
+def outdated(store, superseded_before):
+    query_string = get_outdated_staging_graphs(DATASET, superseded_before, GRAPH)
+    return {str(row.stagingGraph) for row in store.query(query_string)}
+
+
+def test_outdated_staging_graphs_are_kept_for_a_while(store):
+    # the graph of the latest dump is never outdated, the earlier one only after the retention
+    assert outdated(store, datetime(2024, 1, 8, 13)) == {"http://example.com/staging1"}
+    assert outdated(store, datetime(2024, 1, 8, 11)) == set()
+
+
+def test_staging_graphs_of_the_latest_dump_of_another_dataset_are_kept(store):
+    store.graph(URIRef(GRAPH)).parse(data=SHARED_DUMP, format="turtle")
+    assert outdated(store, datetime(2024, 1, 8, 13)) == set()
+
+
+def test_checksum_is_the_one_of_the_uncompressed_content(tmp_path):
+    plain = tmp_path / "dump.ttl"
+    plain.write_bytes(b"<http://example.com/a> a <http://example.com/C> .\n")
+    compressed = tmp_path / "dump.ttl.gz"
+    compressed.write_bytes(gzip.compress(plain.read_bytes()))
+    assert file_checksum(str(plain)) == file_checksum(str(compressed))
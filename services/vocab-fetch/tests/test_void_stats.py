@@ -0,0 +1,138 @@
+import pytest
+from rdflib import Dataset, Graph, Literal, Namespace, URIRef
+from rdflib.namespace import RDF, VOID
+
+import void
+from void_stats import VoidStats, replace_void_query
+
+EXT = Namespace("http://mu.semte.ch/vocabularies/ext/")
+
+DATA = """
+@prefix ex: <http://example.com/> .
+@prefix skos: <http://www.w3.org/2004/02/skos/core#> .
+
+ex:a a skos:Concept, ex:Term ;
+    skos:prefLabel "a"@en, "a"@nl ;
+    skos:broader ex:b .
+ex:b a skos:Concept ;
+    skos:prefLabel "b"@en ;
+    skos:note "a" .
+ex:c a "not a class" ;
+    skos:related [ skos:prefLabel "a"@en ] .
+"""
+
+# the aggregates of the make-void queries in void.py
+PROPERTY_PARTITIONS = """
+SELECT ?p (COUNT(*) AS ?triples) (COUNT(DISTINCT ?s) AS ?subjects) (COUNT(DISTINCT ?o) AS ?objects)
+WHERE { ?s ?p ?o . } GROUP BY ?p
+"""
+CLASS_PARTITIONS = """
+SELECT ?type (COUNT(DISTINCT ?instance) AS ?instances)
+WHERE { ?instance a ?type . FILTER (isURI(?type)) } GROUP BY ?type
+"""
+SUMMARY = """
+SELECT (COUNT(*) AS ?triples) (COUNT(DISTINCT ?s) AS ?entities) (COUNT(DISTINCT ?p) AS ?properties)
+WHERE { ?s ?p ?o . }
+"""
+
+
+def test_counts_match_the_make_void_queries():
+    g = Graph().parse(data=DATA, format="turtle")
+    stats = VoidStats().add(g.triples((None, None, None)))
+
+    for row in g.query(PROPERTY_PARTITIONS):
+        assert stats.property_triples[row.p] == row.triples.toPython()
+        assert len(stats.property_subjects[row.p]) == row.subjects.toPython()
+        assert len(stats.property_objects[row.p]) == row.objects.toPython()
+    class_rows = list(g.query(CLASS_PARTITIONS))
+    assert {row.type: row.instances.toPython() for row in class_rows} == \
+        {c: len(instances) for c, instances in stats.class_instances.items()}
+    summary = list(g.query(SUMMARY))[0]
+    assert stats.triples == summary.triples.toPython()
+    assert len(stats.subjects) == summary.entities.toPython()
+    assert len(stats.property_triples) == summary.properties.toPython()
+    assert len(stats.class_instances) == len(class_rows)
+
+
+def test_batches_add_up():
+    g = Graph().parse(data=DATA, format="turtle")
+    triples = list(g.triples((None, None, None)))
+    in_batches = VoidStats().add(triples[:5]).add(triples[5:])
+    at_once = VoidStats().add(triples)
+    assert in_batches.triples == at_once.triples
+    assert len(in_batches.subjects) == len(at_once.subjects)
+    assert in_batches.property_triples == at_once.property_triples
+
+
+def test_approximate_counts_are_flagged():
+    g = Graph().parse(data=DATA, format="turtle")
+    stats = VoidStats(precision=12).add(g.triples((None, None, None)))
+    assert len(stats.subjects) == len(set(g.subjects()))
+    assert "ext:approximate" in stats.void_triples("http://example.com/dataset")
+    assert "ext:approximate" not in VoidStats().add(g.triples((None, None, None))).void_triples("http://example.com/dataset")
+
+
+DATASET = "http://example.com/dataset"
+DATA_GRAPH = "http://example.com/graph/data"
+VOID_GRAPH = "http://example.com/graph/void"
+
+DESCRIPTION = """
+SELECT ?triples ?entities (COUNT(DISTINCT ?pp) AS ?propertyPartitions) (COUNT(DISTINCT ?cp) AS ?classPartitions)
+WHERE {
+    GRAPH <http://example.com/graph/void> {
+        <http://example.com/dataset> a void:Dataset ;
+            void:triples ?triples ;
+            void:entities ?entities ;
+            void:propertyPartition ?pp ;
+            void:classPartition ?cp .
+    }
+}
+GROUP BY ?triples ?entities
+"""
+
+
+@pytest.fixture
+def store():
+    store = Dataset()
+    store.graph(URIRef(DATA_GRAPH)).parse(data=DATA, format="turtle")
+    store.graph(URIRef(VOID_GRAPH)).add((URIRef(DATASET), RDF.type, VOID.Dataset))
+    return store
+
+
+def description(store):
+    return [(row.triples.toPython(), row.entities.toPython(), row.propertyPartitions.toPython(),
+             row.classPartitions.toPython()) for row in store.query(DESCRIPTION, initNs={"void": VOID})]
+
+
+def test_replace_swaps_the_description_in_a_single_request(store):
+    stats = VoidStats().add(store.graph(URIRef(DATA_GRAPH)).triples((None, None, None)))
+    expected = [(stats.triples, len(stats.subjects), len(stats.property_triples), len(stats.class_instances))]
+    for _ in range(2):
+        store.update(replace_void_query(stats, DATASET, VOID_GRAPH))
+        # the old description is gone, the new one is inserted once, the dataset keeps its type
+        assert description(store) == expected
+
+
+def test_sparql_mode_swaps_the_description_in_a_single_request(store, monkeypatch):
+    updates = []
+    monkeypatch.setattr(void, "update_sudo", lambda query_string: updates.append(query_string) or store.update(query_string))
+    monkeypatch.setattr(void, "VOID_MODE", "sparql")
+    stats = VoidStats().add(store.graph(URIRef(DATA_GRAPH)).triples((None, None, None)))
+    expected = [(stats.triples, len(stats.subjects), len(stats.property_triples), len(stats.class_instances))]
+    for _ in range(2):
+        void.generateVoID(DATA_GRAPH, DATASET, VOID_GRAPH)
+        assert description(store) == expected
+    assert len(updates) == 2
+
+
+def test_estimates_are_flagged_in_the_description(store):
+    stats = VoidStats(precision=12).add(store.graph(URIRef(DATA_GRAPH)).triples((None, None, None)))
+    store.update(replace_void_query(stats, DATASET, VOID_GRAPH))
+    void_graph = store.graph(URIRef(VOID_GRAPH))
+    described = {URIRef(DATASET)} | set(void_graph.objects(URIRef(DATASET), VOID.propertyPartition)) \
+        | set(void_graph.objects(URIRef(DATASET), VOID.classPartition))
+    assert set(void_graph.subjects(EXT.approximate, Literal(True))) == described
+    # exact statistics replacing them drop the flags
+    store.update(replace_void_query(VoidStats().add(store.graph(URIRef(DATA_GRAPH)).triples((None, None, None))),
+                                    DATASET, VOID_GRAPH))
+    assert not list(void_graph.subjects(EXT.approximate, None))
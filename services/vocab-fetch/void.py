@@ -1,10 +1,22 @@
+import os
 from string import Template
 from helpers import query, update
 from helpers import generate_uuid, logger
 from sudo_query import query_sudo, update_sudo
 from escape_helpers import sparql_escape, sparql_escape_uri, sparql_escape_string
+from sparql_util import stream_graph_triples
+from void_stats import VoidStats, replace_void_query, delete_void_query
 
 VOID_GRAPH_URI_BASE = "http://example.com/graph/"
+# "stream" (default) reads the dataset contents once and computes all statistics while reading,
+# "sparql" runs the three aggregate INSERT ... WHERE queries below in the triplestore (each scans the graph again).
+# Exact streaming statistics keep every distinct subject and object in memory, combine it with VOID_APPROXIMATE
+# for large graphs.
+VOID_MODE = os.environ.get("VOID_MODE", "stream")
+# In "stream" mode, estimate distinct subjects/objects/entities with HyperLogLog instead of counting them
+# exactly. Memory per partition is 2^VOID_HLL_PRECISION bytes, the relative error 1.04/sqrt(2^VOID_HLL_PRECISION)
+VOID_APPROXIMATE = os.environ.get("VOID_APPROXIMATE", "false").lower() == "true"
+VOID_HLL_PRECISION = int(os.environ.get("VOID_HLL_PRECISION", "12"))  # 4..16, 12 gives ~1.6%
 
 # Queries adapted from https://github.com/cygri/make-void by Richard Cygniak
 
@@ -44,8 +56,7 @@ WHERE {
         property_partition_base=sparql_escape_string(property_partition_base),
         void_graph=sparql_escape_uri(graph)
     )
-    update_sudo(query_string)
-    return graph, dataset
+    return query_string
 
 
 def generate_insert_class_partitions(dataset_contents_g, dataset, graph):
@@ -83,8 +94,7 @@ WHERE {
         class_partition_base=sparql_escape_string(class_partition_base),
         void_graph=sparql_escape_uri(graph)
     )
-    update_sudo(query_string)
-    return graph, dataset
+    return query_string
 
 def generate_insert_summary(dataset_contents_g, dataset, graph):
     query_template = Template("""
@@ -132,13 +142,32 @@ WHERE {
         dataset=sparql_escape_uri(dataset),
         void_graph=sparql_escape_uri(graph)
     )
-    update_sudo(query_string)
+    return query_string
+
+def replaceVoID(triples_batches, dataset, graph):
+    """
+    Replace the VoID description of a dataset by the one of batches of its triples (e.g. streamed
+    from its graph or dump file). The statistics are computed first and swapped in with a single
+    update, so the dataset never lacks its partitions.
+    """
+    stats = VoidStats(VOID_HLL_PRECISION if VOID_APPROXIMATE else None)
+    for triples_batch in triples_batches:
+        stats.add(triples_batch)
+    logger.info(f"Computed VoID statistics of <{dataset}> over {stats.triples} triples")
+    update_sudo(replace_void_query(stats, dataset, graph))
     return graph, dataset
 
 def generateVoID(dataset_contents_g, dataset, graph):
-    generate_insert_class_partitions(dataset_contents_g, dataset, graph)
-    generate_insert_property_partitions(dataset_contents_g, dataset, graph)
-    generate_insert_summary(dataset_contents_g, dataset, graph)
+    if VOID_MODE == "stream":
+        logger.info(f"Reading <{dataset_contents_g}> for the VoID description of <{dataset}>")
+        return replaceVoID(stream_graph_triples(dataset_contents_g), dataset, graph)
+    # like in "stream" mode, the old description is swapped for the new one in a single request
+    update_sudo(" ;\n".join([
+        delete_void_query(dataset, graph),
+        generate_insert_class_partitions(dataset_contents_g, dataset, graph),
+        generate_insert_property_partitions(dataset_contents_g, dataset, graph),
+        generate_insert_summary(dataset_contents_g, dataset, graph),
+    ]))
     return graph, dataset
 
 def generate_delete_class_partitions(dataset, graph):
@@ -199,7 +228,7 @@ def generate_delete_summary(dataset, graph):
     query_template = Template("""
 PREFIX void: <http://rdfs.org/ns/void#>
 
-INSERT {
+DELETE {
     GRAPH $void_graph {
         $dataset
             void:triples ?triples;
@@ -0,0 +1,156 @@
+from collections import defaultdict
+from string import Template
+
+from rdflib.namespace import RDF
+from rdflib.term import URIRef
+
+from helpers import generate_uuid
+from escape_helpers import sparql_escape_uri, sparql_escape_int, sparql_escape_bool
+from hyperloglog import HyperLogLog
+
+
+class VoidStats:
+    """
+    VoID statistics of a dataset, accumulated while its triples stream by once.
+    Counts the same as the make-void queries in `void.py`: property partitions with their
+    triples, distinct subjects and objects, class partitions with their distinct instances
+    (IRI classes only) and the dataset summary.
+    With a `precision`, distinct counts are HyperLogLog estimates instead of exact counts over
+    sets, which bounds the memory per partition on very large graphs.
+    """
+
+    def __init__(self, precision=None):
+        self.precision = precision
+        self.triples = 0
+        self.subjects = self.distinct_counter()
+        self.property_triples = defaultdict(int)
+        self.property_subjects = defaultdict(self.distinct_counter)
+        self.property_objects = defaultdict(self.distinct_counter)
+        self.class_instances = defaultdict(self.distinct_counter)
+
+    @property
+    def approximate(self):
+        return self.precision is not None
+
+    def distinct_counter(self):
+        if self.approximate:
+            # n3 keeps literals apart from IRIs with the same lexical form
+            return HyperLogLog(self.precision, key=lambda term: term.n3())
+        return set()
+
+    def estimate_triples(self):
+        """ Flags the distinct counts of a dataset or partition as estimates """
+        if not self.approximate:
+            return ""
+        relative_error = HyperLogLog(self.precision).relative_error
+        return (f" ;\n    ext:approximate {sparql_escape_bool(True)} ;\n"
+                f'    ext:relativeError "{relative_error:.4f}"^^xsd:decimal')
+
+    def add(self, triples):
+        for (s, p, o) in triples:
+            self.triples += 1
+            self.subjects.add(s)
+            self.property_triples[p] += 1
+            self.property_subjects[p].add(s)
+            self.property_objects[p].add(o)
+            if p == RDF.type and isinstance(o, URIRef):
+                self.class_instances[o].add(s)
+        return self
+
+    def void_triples(self, dataset):
+        """ The VoID description of `dataset` as Turtle-like statements, with new partition URIs """
+        dataset_uri = sparql_escape_uri(dataset)
+        statements = [
+            f"{dataset_uri} void:triples {sparql_escape_int(self.triples)} ;\n"
+            f"    void:entities {sparql_escape_int(len(self.subjects))} ;\n"
+            f"    void:classes {sparql_escape_int(len(self.class_instances))} ;\n"
+            f"    void:properties {sparql_escape_int(len(self.property_triples))}{self.estimate_triples()} ."
+        ]
+        for p, triples in self.property_triples.items():
+            pp = sparql_escape_uri(str(dataset) + "_property" + generate_uuid())
+            statements.append(
+                f"{dataset_uri} void:propertyPartition {pp} .\n"
+                f"{pp} a void:Dataset ;\n"
+                f"    void:property {sparql_escape_uri(p)} ;\n"
+                f"    void:triples {sparql_escape_int(triples)} ;\n"
+                f"    void:distinctSubjects {sparql_escape_int(len(self.property_subjects[p]))} ;\n"
+                f"    void:distinctObjects {sparql_escape_int(len(self.property_objects[p]))}{self.estimate_triples()} ."
+            )
+        for c, instances in self.class_instances.items():
+            cp = sparql_escape_uri(str(dataset) + "_class" + generate_uuid())
+            statements.append(
+                f"{dataset_uri} void:classPartition {cp} .\n"
+                f"{cp} a void:Dataset ;\n"
+                f"    void:class {sparql_escape_uri(c)} ;\n"
+                f"    void:entities {sparql_escape_int(len(instances))}{self.estimate_triples()} ."
+            )
+        return "\n".join(statements)
+
+
+def delete_void_query(dataset, graph):
+    """ Delete the summary values and partitions of the VoID description of `dataset`, keeping its rdf:type """
+    query_template = Template("""
+PREFIX void: <http://rdfs.org/ns/void#>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+DELETE {
+    GRAPH $void_graph {
+        $dataset ?summaryP ?summaryO .
+        $dataset void:classPartition ?cp .
+        ?cp ?cpp ?cpo .
+        $dataset void:propertyPartition ?pp .
+        ?pp ?ppp ?ppo .
+    }
+}
+WHERE {
+    {
+        VALUES ?summaryP { void:triples void:entities void:classes void:properties ext:approximate ext:relativeError }
+        GRAPH $void_graph {
+            $dataset ?summaryP ?summaryO .
+        }
+    }
+    UNION
+    {
+        GRAPH $void_graph {
+            $dataset void:classPartition ?cp .
+            ?cp ?cpp ?cpo .
+        }
+    }
+    UNION
+    {
+        GRAPH $void_graph {
+            $dataset void:propertyPartition ?pp .
+            ?pp ?ppp ?ppo .
+        }
+    }
+}""")
+    return query_template.substitute(
+        dataset=sparql_escape_uri(dataset),
+        void_graph=sparql_escape_uri(graph),
+    )
+
+
+def replace_void_query(stats, dataset, graph):
+    """
+    Swap the VoID description of `dataset` for the one of `stats` in a single request: a DELETE
+    of the summary values and partitions, followed by an INSERT DATA of the new description.
+    Keeping the insert out of the DELETE's template makes sure it's applied once, rather than
+    once per deleted triple. Like `deleteVoID`, the rdf:type of the dataset is kept.
+    """
+    query_template = Template("""$delete_void ;
+
+PREFIX void: <http://rdfs.org/ns/void#>
+PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+PREFIX ext: <http://mu.semte.ch/vocabularies/ext/>
+
+INSERT DATA {
+    GRAPH $void_graph {
+$void_triples
+    }
+}
+""")
+    return query_template.substitute(
+        delete_void=delete_void_query(dataset, graph),
+        void_graph=sparql_escape_uri(graph),
+        void_triples=stats.void_triples(dataset)
+    )
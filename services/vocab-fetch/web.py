@@ -1,5 +1,6 @@
+import hashlib
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from string import Template
 import threading
 
@@ -10,28 +11,46 @@ from helpers import generate_uuid, logger
 from helpers import query, update
 from sudo_query import query_sudo, update_sudo
 
-from rdflib import Graph, URIRef, Literal
-from void import generateVoID, deleteVoID
+from rdflib import URIRef, Literal
+from void import VOID_MODE, generateVoID, replaceVoID
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from file import file_to_shared_uri, shared_uri_to_path
 from file import construct_get_file_query, construct_insert_file_query
-from task import find_actionable_task_of_type, run_task, find_actionable_task, create_download_task
+from file import (
+    construct_insert_file_reference_query,
+    construct_physical_file_exists_query,
+    construct_get_referenced_physical_files_query,
+)
+from dump_storage import partial_file_name, store_blob, collect_garbage
+from compression import available_compression, compression_suffix, open_compressed, gunzip_chunks
+from task import find_actionable_task_of_type, run_task, find_actionable_task, create_download_task, SCHEDULED_DUMP_CREATOR
+from task import mark_job_source_unchanged, is_job_source_unchanged
 from dataset import get_dataset, update_dataset_download, get_dataset_by_uuid
-from ldes_dump import query_all_ldes_datasets, query_outdated_dump_ldes_datasets
-from sparql_util import binding_results, serialize_graph_to_sparql, graph_to_file, MU_VIRTUOSO_ENDPOINT
+from dataset import get_download_validators, update_download_validators
+from ldes_dump import query_ldes_dataset_watermarks, query_graph_watermark, update_dataset_watermark
+from sparql_util import binding_results, stream_file_triples, graph_to_file, MU_VIRTUOSO_ENDPOINT
+from sparql_writer import SparqlWriter
+from sparql_client import SparqlClient
 from format_to_mime import FORMAT_TO_MIME_EXT
+from staging import (
+    staging_graph_uri,
+    file_checksum,
+    get_file_checksum,
+    is_staging_graph_loaded,
+    set_file_checksum,
+    set_staging_graph,
+    get_outdated_staging_graphs,
+    remove_staging_graph_markers,
+)
 
 def drop_graph_virtuoso(graph_uri):
     """Drop graph using direct virtuoso endpoint"""
-    import requests
     query = f"DROP SILENT GRAPH {sparql_escape_uri(graph_uri)}"
     logger.debug(f"Dropping graph via virtuoso: {query}")
-    response = requests.post(MU_VIRTUOSO_ENDPOINT, data={'update': query})
-    response.raise_for_status()
-    return response
+    return SparqlClient(MU_VIRTUOSO_ENDPOINT).request({'update': query})
 
 # Maybe make these configurable
 TASKS_GRAPH = "http://mu.semte.ch/graphs/public"
@@ -46,19 +65,35 @@ VOCAB_DOWNLOAD_JOB = "http://lblod.data.gift/id/jobs/concept/JobOperation/vocab-
 LDES_TYPE = "http://vocabsearch.data.gift/dataset-types/LDES"
 
 UPDATE_DATASET_DUMP_CRON_PATTERN = os.environ.get("UPDATE_DATASET_DUMP_CRON_PATTERN")
-
-
-def load_dataset_file(uri: str, graph: str = MU_APPLICATION_GRAPH):
+# Send the ETag/Last-Modified of the previous download along, and keep the existing dump when
+# the source didn't change (304 Not Modified, or a download with the same content)
+CONDITIONAL_DOWNLOADS = os.environ.get("CONDITIONAL_DOWNLOADS", "true").lower() == "true"
+# unreferenced dumps younger than this are kept by the garbage collection, see `collect_garbage`
+DUMP_GC_MIN_AGE_S = int(os.environ.get("DUMP_GC_MIN_AGE_S", "3600"))
+# compression of the stored dumps: gzip, zstd (when zstandard is installed) or none
+DUMP_COMPRESSION = available_compression(os.environ.get("DUMP_COMPRESSION", "gzip"))
+# LDES changes are unified incrementally by content-unification, the nightly LDES downloads
+# (and the full unifications they trigger) are then skipped
+INCREMENTAL_LDES_UNIFICATION = os.environ.get("INCREMENTAL_LDES_UNIFICATION", "false").lower() == "true"
+# staging graphs of superseded dumps are kept this long for the unifications still reading them
+STAGING_GRAPH_RETENTION_S = int(os.environ.get("STAGING_GRAPH_RETENTION_S", "86400"))
+
+
+def stream_dataset_file(uri: str, graph: str = MU_APPLICATION_GRAPH):
+    """ Yield the triples of a dataset file in batches, see `stream_file_triples` """
     query_string = construct_get_file_query(uri, graph)
     file_result = query_sudo(query_string)["results"]["bindings"][0]
 
-    g = Graph()
-    g.parse(shared_uri_to_path(file_result["physicalFile"]["value"]))
+    return stream_file_triples(shared_uri_to_path(file_result["physicalFile"]["value"]))
 
-    return g
 
-
-def download_dataset_file(url: str, format: str, graph: str = MU_APPLICATION_GRAPH):
+def download_dataset_file(url: str, format: str, graph: str = MU_APPLICATION_GRAPH,
+                          validators=None, previous_checksum=None):
+    """
+    Download a dataset file, returns the file uri and the validators (ETag, Last-Modified) of the response.
+    With the `validators` of the previous download, the request is conditional. The file uri is
+    None when the server reports the file as not modified, or when it has `previous_checksum`.
+    """
     mime_type, file_extension = FORMAT_TO_MIME_EXT[format]
     accept_string = ", ".join(
         value[0] + (";q=1.0" if key == format else ";q=0.1")
@@ -67,28 +102,55 @@ def download_dataset_file(url: str, format: str, graph: str = MU_APPLICATION_GRA
     upload_resource_uuid = generate_uuid()
     upload_resource_uri = f"{FILE_RESOURCE_BASE}{upload_resource_uuid}"
     file_resource_uuid = generate_uuid()
-    file_resource_name = f"{file_resource_uuid}.{file_extension}"
-
-    file_resource_uri = file_to_shared_uri(file_resource_name)
+    partial_path = shared_uri_to_path(file_to_shared_uri(partial_file_name(f"{file_resource_uuid}.{file_extension}")))
 
     headers = {"Accept": accept_string}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
 
     with requests.get(url, headers=headers, stream=True) as res:
         if res.url != url:
             logger.info("You've been redirected. Probably want to replace url in db.")
 
+        if res.status_code == 304:
+            logger.info(f"{url} not modified since the previous download")
+            return None, validators
+
         assert res.ok
+        new_validators = {
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+        }
 
         # TODO: better handling + negociating
         logger.info(f'Content-Type: {res.headers["Content-Type"]}')
         logger.info(f"MIME-Type: {mime_type}")
 
-        with open(shared_uri_to_path(file_resource_uri), "wb") as f:
-            for chunk in res.iter_content(chunk_size=None):
-                f.write(chunk)
+        # the checksum is computed over the uncompressed content, so that it doesn't depend on the compression
+        sha256 = hashlib.sha256()
+        if DUMP_COMPRESSION == "gzip" and res.headers.get("Content-Encoding") == "gzip":
+            # stored as received, without decompressing and compressing again
+            with open(partial_path, "wb") as f:
+                for chunk, data in gunzip_chunks(res.raw.stream(1024 * 1024, decode_content=False)):
+                    f.write(chunk)
+                    sha256.update(data)
+        else:
+            with open_compressed(partial_path, "wb", DUMP_COMPRESSION) as f:
+                for chunk in res.iter_content(chunk_size=None):
+                    f.write(chunk)
+                    sha256.update(chunk)
+        file_size = os.path.getsize(partial_path)
+
+    if sha256.hexdigest() == previous_checksum:
+        logger.info(f"{url} has the same content as the previous download")
+        os.remove(partial_path)
+        return None, new_validators
 
-            f.seek(0, 2)
-            file_size = f.tell()
+    file_resource_uri, deduplicated = store_blob(partial_path, sha256.hexdigest(),
+                                                 file_extension + compression_suffix(DUMP_COMPRESSION))
+    file_resource_name = os.path.basename(shared_uri_to_path(file_resource_uri))
 
     file = {
         "uri": upload_resource_uri,
@@ -98,6 +160,8 @@ def download_dataset_file(url: str, format: str, graph: str = MU_APPLICATION_GRA
         "created": datetime.now(),
         "size": file_size,
         "extension": file_extension,
+        "sha256": sha256.hexdigest(),
+        "compression": DUMP_COMPRESSION,
     }
     physical_file = {
         "uri": file_resource_uri,
@@ -105,12 +169,59 @@ def download_dataset_file(url: str, format: str, graph: str = MU_APPLICATION_GRA
         "name": file_resource_name,
     }
 
-    query_string = construct_insert_file_query(file, physical_file, graph)
+    if deduplicated and query_sudo(construct_physical_file_exists_query(file_resource_uri, graph))["boolean"]:
+        logger.info(f"{url} has the same content as stored dump {file_resource_name}, reusing it")
+        query_string = construct_insert_file_reference_query(file, file_resource_uri, graph)
+    else:
+        query_string = construct_insert_file_query(file, physical_file, graph)
 
     # TODO Check query result before writing file to disk
     update_sudo(query_string)
 
-    return upload_resource_uri
+    return upload_resource_uri, new_validators
+
+
+def dump_checksum(file_uri):
+    checksum = query_sudo(get_file_checksum(file_uri, FILES_GRAPH))["results"]["bindings"]
+    if checksum:
+        return checksum[0]["checksum"]["value"]
+    # dumps downloaded before checksums were recorded
+    file_result = query_sudo(construct_get_file_query(file_uri, FILES_GRAPH))["results"]["bindings"][0]
+    checksum = file_checksum(shared_uri_to_path(file_result["physicalFile"]["value"]))
+    update_sudo(set_file_checksum(file_uri, checksum, FILES_GRAPH))
+    return checksum
+
+
+def load_staging_graph(dataset_uri, file_uri):
+    """
+    Make sure the content of a data dump is loaded in the staging graph of its checksum, and
+    return that graph. The graph is only (re)loaded when no dump with the same content was
+    loaded before.
+    """
+    staging_graph = staging_graph_uri(dump_checksum(file_uri))
+    if query_sudo(is_staging_graph_loaded(staging_graph, FILES_GRAPH))["boolean"]:
+        logger.info(f"Dump <{file_uri}> is unchanged, reusing staging graph <{staging_graph}>")
+    else:
+        logger.info(f"Loading dump <{file_uri}> into staging graph <{staging_graph}>")
+        # a load that was interrupted before it was marked as complete may have left triples
+        drop_graph_virtuoso(staging_graph)
+        with SparqlWriter(update_sudo) as writer:
+            writer.write(stream_dataset_file(file_uri, FILES_GRAPH), staging_graph)
+        logger.info(f"Loaded {writer.triples} triples into staging graph <{staging_graph}>")
+    update_sudo(set_staging_graph(file_uri, staging_graph, FILES_GRAPH))
+    drop_outdated_staging_graphs(dataset_uri)
+    return staging_graph
+
+
+def drop_outdated_staging_graphs(dataset_uri):
+    """ Drop the staging graphs of earlier dumps of the dataset once they've been superseded for STAGING_GRAPH_RETENTION_S """
+    superseded_before = datetime.now() - timedelta(seconds=STAGING_GRAPH_RETENTION_S)
+    outdated = query_sudo(get_outdated_staging_graphs(dataset_uri, superseded_before, VOID_DATASET_GRAPH))["results"]["bindings"]
+    for binding in outdated:
+        outdated_graph = binding["stagingGraph"]["value"]
+        logger.info(f"Dropping outdated staging graph <{outdated_graph}>")
+        drop_graph_virtuoso(outdated_graph)
+        update_sudo(remove_staging_graph_markers(outdated_graph, FILES_GRAPH))
 
 
 def escape(binding):
@@ -141,7 +252,7 @@ SELECT DISTINCT ?task_uri WHERE {
     query_res = query(query_string)
     return query_res["results"]["bindings"][0]["task_uri"]["value"]
 
-def redownload_dataset(dataset_uri):
+def redownload_dataset(dataset_uri, task_uri=None):
     dataset_result = query_sudo(get_dataset(dataset_uri, VOID_DATASET_GRAPH))['results']['bindings'][0]
     _type = dataset_result['type']['value']
     if _type == LDES_TYPE:
@@ -154,14 +265,46 @@ def redownload_dataset(dataset_uri):
         dataset_graph = dataset_result['dataset_graph']['value']
         if not dataset_graph:
             raise ValueError(f"LDES-graph not found for dataset {dataset_uri}")
+        # the data up to this watermark is processed by the rest of the job
+        update_sudo(update_dataset_watermark(dataset_uri, query_graph_watermark(dataset_graph), VOID_DATASET_GRAPH))
     else:
         download_link = dataset_result['download_url']['value']
         file_format = dataset_result['format']['value']
-        file_uri = download_dataset_file(download_link, file_format, FILES_GRAPH)
-        update_sudo(update_dataset_download(dataset_uri, file_uri, VOID_DATASET_GRAPH))
+        previous_dump = dataset_result.get('data_dump', {}).get('value')
+        validators, previous_checksum = None, None
+        if CONDITIONAL_DOWNLOADS and previous_dump:
+            validators = query_sudo(get_download_validators(dataset_uri, VOID_DATASET_GRAPH))['results']['bindings']
+            validators = {key: binding['value'] for key, binding in validators[0].items()} if validators else None
+            previous_checksum = dump_checksum(previous_dump)
+        file_uri, validators = download_dataset_file(download_link, file_format, FILES_GRAPH,
+                                                     validators, previous_checksum)
+        if CONDITIONAL_DOWNLOADS:
+            update_sudo(update_download_validators(dataset_uri, validators or {}, VOID_DATASET_GRAPH))
+        if file_uri:
+            update_sudo(update_dataset_download(dataset_uri, file_uri, VOID_DATASET_GRAPH))
+            if VOID_MODE == "stream":
+                # the VoID statistics are computed from the dump itself and unification loads it into a
+                # temporary graph, nothing needs to be written to a staging graph
+                drop_outdated_staging_graphs(dataset_uri)
+            else:
+                load_staging_graph(dataset_uri, file_uri)
+        else:
+            # keep the existing dump, the metadata extraction and unification of this job are skipped
+            logger.info(f"Dataset <{dataset_uri}> is unchanged, keeping dump <{previous_dump}>")
+            if task_uri:
+                update_sudo(mark_job_source_unchanged(task_uri, TASKS_GRAPH))
     return dataset_uri
 
 
+@app.route("/dump-gc", methods=["POST"])
+def run_dump_garbage_collection():
+    """ Remove the stored dumps no file references anymore """
+    referenced = query_sudo(construct_get_referenced_physical_files_query(FILES_GRAPH))
+    result = collect_garbage(set(binding_results(referenced, "physicalFile")), DUMP_GC_MIN_AGE_S)
+    logger.info(f"Removed {len(result['removed'])} unreferenced dumps, freeing {result['freed_bytes']} bytes")
+    return result
+
+
 @app.route("/dataset-download-task/<task_uuid>/run", methods=["POST"])
 def run_dataset_download_route(task_uuid: str):
     try:
@@ -173,7 +316,7 @@ def run_dataset_download_route(task_uuid: str):
     run_task(
         task_uri,
         TASKS_GRAPH,
-        lambda sources: [redownload_dataset(sources[0])],
+        lambda sources: [redownload_dataset(sources[0], task_uri)],
         query_sudo,
         update_sudo,
     )
@@ -182,7 +325,17 @@ def run_dataset_download_route(task_uuid: str):
 
 
 
-def generate_dataset_structural_metadata(dataset_uri, should_return_vocab):
+def dataset_task_result(dataset_uri, dataset_res, should_return_vocab):
+    if should_return_vocab:
+        vocab_uri = dataset_res.get("vocab", {}).get("value")
+        logger.info(f"Returning vocab URI: {vocab_uri}")
+        return vocab_uri
+    else:
+        logger.info(f"Returning dataset URI: {dataset_uri}")
+        return dataset_uri
+
+
+def generate_dataset_structural_metadata(dataset_uri, should_return_vocab, source_unchanged=False):
     try:
         logger.info(f"Starting metadata generation for dataset: {dataset_uri}")
         dataset_res = query_sudo(get_dataset(dataset_uri, VOID_DATASET_GRAPH))["results"][
@@ -195,53 +348,38 @@ def generate_dataset_structural_metadata(dataset_uri, should_return_vocab):
 
         logger.info(f"dataset <{dataset_uri}> with type: {dataset_type} | Dataset graph: {dataset_graph} | Data dump: {data_dump}")
 
+        if source_unchanged:
+            logger.info(f"dataset <{dataset_uri}> wasn't changed by the download, keeping its VoID metadata")
+            return dataset_task_result(dataset_uri, dataset_res, should_return_vocab)
+
         # We update dataset metadata by purging old and re-loadind new data (instead of applying the diff)
         # This has some unexpected consequences, since ldes consumer-manager triggers on addition and
         # removal of void:Datasets. Since our actual intention isn't to remove the whole object (including type), but
         # rather to update more detailed properties, we exclude the `rdf:type` predicate from the removal process.
-        logger.info(f"Deleting existing VoID metadata for <{dataset_uri}>")
-        deleteVoID(dataset_uri, VOID_DATASET_GRAPH)
+        # The old VoID metadata is replaced atomically, in the same request that inserts the new one.
         if dataset_graph:
             # Graph-based dataset (from LDES-consumer)
             logger.info(f"Processing graph-based dataset <{dataset_uri}> with graph: {dataset_graph}")
             generateVoID(dataset_graph, dataset_uri, VOID_DATASET_GRAPH)
 
+        elif data_dump and VOID_MODE == "stream":
+            # File-based dataset: count the triples while parsing the dump, nothing is written to the triplestore
+            logger.info(f"Processing file-based dataset <{dataset_uri}> from data dump: {data_dump}")
+            replaceVoID(stream_dataset_file(data_dump, FILES_GRAPH), dataset_uri, VOID_DATASET_GRAPH)
+
         elif data_dump:
-            # File-based dataset: load file into temporary graph for analysis
-            temp_graph_uri = f"http://temp.vocabsearch.com/graph/{generate_uuid()}"
-            logger.info(f"Processing file-based dataset <{dataset_uri}> with data dump: {data_dump} | Loading into temporary graph: {temp_graph_uri}")
+            # File-based dataset: use the staging graph of the dump, shared with unification
+            staging_graph = dataset_res.get("staging_graph", {}).get("value")
+            if not staging_graph:
+                staging_graph = load_staging_graph(dataset_uri, data_dump)
+            logger.info(f"Processing file-based dataset <{dataset_uri}> with data dump: {data_dump} | Staging graph: {staging_graph}")
+            generateVoID(staging_graph, dataset_uri, VOID_DATASET_GRAPH)
 
-            try:
-                # Load file content into temporary graph in triplestore
-                file_graph = load_dataset_file(data_dump, FILES_GRAPH)
-                logger.info(f"dataset <{dataset_uri}>: Loaded {len(file_graph)} triples from file to local graph")
-
-                # Serialize to temporary graph in triplestore
-                for query_string in serialize_graph_to_sparql(file_graph, temp_graph_uri):
-                    update_sudo(query_string)
-
-                logger.info(f"dataset <{dataset_uri}>: File data loaded into temporary graph <{temp_graph_uri}> in triplestore, generating VoID metadata")
-                # Generate VoID from temporary graph
-                generateVoID(temp_graph_uri, dataset_uri, VOID_DATASET_GRAPH)
-
-            finally:
-                # Clean up temporary graph (unification will reload from file when needed)
-                try:
-                    drop_graph_virtuoso(temp_graph_uri)
-                    logger.info(f"dataset <{dataset_uri}>: Cleaned up temporary graph: {temp_graph_uri}")
-                except Exception as cleanup_error:
-                    logger.warning(f"dataset <{dataset_uri}>: Failed to cleanup temporary graph {temp_graph_uri}: {cleanup_error}")
         else:
             # Neither graph nor file dump available
             raise ValueError(f"Dataset {dataset_uri} has neither dataset_graph nor data_dump. Cannot generate metadata.")
 
-        if should_return_vocab:
-            vocab_uri = dataset_res.get("vocab", {}).get("value")
-            logger.info(f"Returning vocab URI: {vocab_uri}")
-            return vocab_uri
-        else:
-            logger.info(f"Returning dataset URI: {dataset_uri}")
-            return dataset_uri
+        return dataset_task_result(dataset_uri, dataset_res, should_return_vocab)
     except Exception as e:
         logger.error(f"Error in generate_dataset_structural_metadata for {dataset_uri}: {str(e)}")
         logger.error(f"Exception type: {type(e).__name__}")
@@ -256,6 +394,15 @@ METADATA_EXTRACTION_OPERATION = (
 running_tasks_lock = threading.Lock()
 
 
+def log_queue_wait(task_uri, priority, created):
+    try:
+        created = datetime.fromisoformat(created.replace("Z", "+00:00"))
+    except ValueError:
+        return
+    wait = (datetime.now(created.tzinfo) - created).total_seconds()
+    logger.info(f"Starting {priority} task {task_uri} after waiting {round(wait, 1)} s")
+
+
 def run_tasks():
     # run this function only once at a time to avoid overloading the service
     acquired = running_tasks_lock.acquire(blocking=False)
@@ -271,19 +418,20 @@ def run_tasks():
             )
             task_res = query_sudo(task_q)
             if task_res["results"]["bindings"]:
-                (task_uri, task_operation, job_operation) = binding_results(
-                    task_res, ("uri", "operation", "job_operation")
+                (task_uri, task_operation, job_operation, priority, created) = binding_results(
+                    task_res, ("uri", "operation", "job_operation", "priority", "created")
                 )[0]
             else:
                 logger.debug("No more tasks found")
                 return
+            log_queue_wait(task_uri, priority, created)
             try:
                 if task_operation == VOCAB_DOWNLOAD_OPERATION:
                     logger.debug(f"Running task {task_uri}, operation {task_operation}")
                     run_task(
                         task_uri,
                         TASKS_GRAPH,
-                        lambda sources: [redownload_dataset(sources[0])],
+                        lambda sources: [redownload_dataset(sources[0], task_uri)],
                         query_sudo,
                         update_sudo,
                     )
@@ -295,11 +443,12 @@ def run_tasks():
                     # Maybe better to create an extra task "metadata_extraction_before_unification"
                     # which can be used in the VOCAB_DOWNLOAD job
                     should_return_vocab = (job_operation == VOCAB_DOWNLOAD_JOB)
+                    source_unchanged = query_sudo(is_job_source_unchanged(task_uri, TASKS_GRAPH))["boolean"]
                     run_task(
                         task_uri,
                         TASKS_GRAPH,
                         lambda sources: [
-                            generate_dataset_structural_metadata(sources[0], should_return_vocab)
+                            generate_dataset_structural_metadata(sources[0], should_return_vocab, source_unchanged)
                         ],
                         query_sudo,
                         update_sudo,
@@ -312,19 +461,23 @@ def run_tasks():
         running_tasks_lock.release()
 
 def update_ldes_dataset_dump():
+    # With incremental unification, the dump tasks still refresh the watermark and VoID of the
+    # datasets, content-unification only skips re-unifying them while it receives LDES deltas.
     logger.info("querying for LDES datasets with updates (requiring an update of their file-dump)")
-    # TODO: LDES have no dumps anymore. This should maybe check the last unification job instead.
-    # for now just create download task for every LDES dataset
-    # datasets = query_outdated_dump_ldes_datasets()
-    datasets = query_all_ldes_datasets()
-    if datasets:
-        logger.info("LDES datasets needing dump update: " + str(datasets))
-    else:
-        logger.info("No LDES datasets requiring a dump update found.")
-    for dataset in datasets:
-        logger.info(f"Creating dump task for dataset {dataset}")
-        qs = create_download_task(dataset, TASKS_GRAPH)
+    # LDES have no dumps anymore, instead the change watermark of the dataset graph is compared
+    # with the one stored by the last download task of the dataset
+    skipped = 0
+    for dataset, dataset_graph, stored_watermark in query_ldes_dataset_watermarks():
+        watermark = query_graph_watermark(dataset_graph)
+        # graphs without member dates have no watermark, they're dumped every time
+        if any(watermark) and watermark == stored_watermark:
+            logger.debug(f"Dataset {dataset} unchanged since its last download {watermark}")
+            skipped += 1
+            continue
+        logger.info(f"Creating dump task for dataset {dataset}, watermark moved from {stored_watermark} to {watermark}")
+        qs = create_download_task(dataset, TASKS_GRAPH, SCHEDULED_DUMP_CREATOR, INCREMENTAL_LDES_UNIFICATION)
         update_sudo(qs)
+    logger.info(f"Skipped {skipped} unchanged LDES datasets")
 
 @app.route("/run-update-ldes-dataset-check", methods=["POST"])
 def run_update_ldes_dataset_check():